@@ -0,0 +1,211 @@
+"""
+Benchmarks of the mani_rain hot paths
+
+Every case runs on a synthetic station and elevation distribution with
+fixed seeds, so no GODOT files or network access are needed. Run as
+
+    python benchmarks/bench_hotpaths.py -o results.json
+    python benchmarks/bench_hotpaths.py -o new.json --compare results.json
+
+to store the best time per call of every case as JSON, and to compare
+it against an earlier run, e.g. of another commit. The mani_rain of this
+tree is benchmarked, from any working directory.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import numpy as np
+
+import bench_import
+
+sys.path.insert(0, bench_import.ROOT)
+
+SEED = 20240501
+N_ARRAY = 100_000
+
+
+def _station(lat: float = 40.45, lon: float = -4.37):
+    from mani_rain._core import station_t
+    station = station_t(lat, lon, 0.767, 32, 55.8, 35, 0.65)
+    rng = np.random.default_rng(SEED)
+    # Elevations of passes seen from a mid latitude station
+    elevations = np.degrees(np.arcsin(rng.uniform(np.sin(np.radians(5)),
+                                                  1, 1_000_000)))
+    station.gen_el_dist(elevations, res=0.1)
+    return station
+
+
+def _markov(station):
+    from mani_rain import rain
+    from mani_rain.rain import markov_rain
+    model = rain.aau_model
+    model.rng = np.random.default_rng(SEED)
+    model.state = 0
+    return markov_rain(station, model)
+
+
+def setup():
+    """Objects shared by the cases, built once"""
+    from mani_rain.rain.itu import rain_itu
+    from mani_rain.linkbudget import link_budget_itu, link_budget_markov
+    from mani_rain._dvbs2 import dvbs2
+
+    station = _station()
+    markov = _markov(station)
+    rng = np.random.default_rng(SEED)
+    env = {
+        "station": station,
+        "stations": [station, _station(-33.02, -69.05),
+                     _station(-31.02, 116.2), _station(57.01, 9.99)],
+        "markov": markov,
+        "itu": rain_itu(station, 0.01),
+        "link_itu": link_budget_itu(station, 10e6),
+        "link_markov": link_budget_markov(station, markov, 10e6),
+        "dvb": dvbs2(10e6),
+        "dist": rng.uniform(3.6e8, 4.1e8, N_ARRAY),
+        "elevation": np.degrees(np.arcsin(rng.uniform(0.1, 1, N_ARRAY))),
+        "rain_rate": rng.exponential(2.0, N_ARRAY),
+        "esno": rng.uniform(-5, 18, N_ARRAY),
+    }
+    return env
+
+
+def _rain_itu_new(env):
+    from mani_rain.rain import itu_cache
+    from mani_rain.rain.itu import rain_itu
+    itu_cache.cache.clear()
+    return rain_itu(env["station"], 0.01)
+
+
+def _eqv_attenuation_itu(env):
+    from mani_rain.rain import itu_cache
+    itu_cache.cache.clear()
+    return env["itu"].eqv_attenuation_itu(0.01)
+
+
+def _eqv_attenuation_curves(env):
+    from mani_rain.rain import itu_cache
+    from mani_rain.rain.itu import eqv_attenuation_curves
+    itu_cache.cache.clear()
+    return eqv_attenuation_curves(env["stations"], np.logspace(-3, 0.5, 100),
+                                  workers=1)
+
+
+def _find_best_modcod(env):
+    dvb = env["dvb"]
+    for esno in env["esno"][:1000]:
+        try:
+            dvb.find_best_modcod(esno)
+        except ValueError:
+            pass
+
+
+cases = {
+    # name: (function of the shared objects, calls per run)
+    "markov_base.draw_rain scalar":
+        (lambda env: env["markov"].rain_model.draw_rain(), 1),
+    "markov_base.draw_rain array":
+        (lambda env: env["markov"].rain_model.draw_rain(N_ARRAY), 1),
+    "markov_rain.attenuation_saunders scalar":
+        (lambda env: env["markov"].attenuation_saunders(30.0), 1),
+    "markov_rain.attenuation_saunders array":
+        (lambda env: env["markov"].attenuation_saunders(
+            env["elevation"], env["rain_rate"]), 1),
+    "_rain_core.eqv_attenuation scalar":
+        (lambda env: env["markov"].eqv_attenuation(5.0), 1),
+    "_rain_core.eqv_attenuation array":
+        (lambda env: env["markov"].eqv_attenuation(env["rain_rate"]), 1),
+    "link_budget_itu.snr_eqv scalar":
+        (lambda env: env["link_itu"].snr_eqv(3.8e8), 1),
+    "link_budget_itu.snr_at_t scalar":
+        (lambda env: env["link_itu"].snr_at_t(3.8e8, 30.0), 1),
+    "link_budget_itu.snr_at_t array":
+        (lambda env: env["link_itu"].snr_at_t(
+            env["dist"], env["elevation"], env["rain_rate"]), 1),
+    "link_budget_markov.snr_at_t scalar":
+        (lambda env: env["link_markov"].snr_at_t(3.8e8, 30.0), 1),
+    "link_budget_markov.snr_batch array":
+        (lambda env: env["link_markov"].snr_batch(
+            env["dist"], env["elevation"]), 1),
+    "dvbs2.find_best_modcod scalar":
+        (_find_best_modcod, 1000),
+    "dvbs2.rate_at_esno array":
+        (lambda env: env["dvb"].rate_at_esno(env["esno"]), 1),
+    "rain_itu construction":
+        (_rain_itu_new, 1),
+    "rain_itu.eqv_attenuation_itu":
+        (_eqv_attenuation_itu, 1),
+    "eqv_attenuation_curves 4 stations x 100 p":
+        (_eqv_attenuation_curves, 1),
+}
+
+
+def time_case(func, env, calls: int = 1, repeat: int = 5) -> float:
+    """Best wall time in seconds of one call of `func(env)`"""
+    timer = timeit.Timer(lambda: func(env))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+    return best / calls
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True,
+                              cwd=bench_import.ROOT).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(select: str = "", repeat: int = 5) -> dict:
+    """Time every case whose name contains `select`"""
+    env = setup()
+    results = {}
+    for name, (func, calls) in cases.items():
+        if select in name:
+            results[name] = time_case(func, env, calls, repeat)
+    if select in "import mani_rain":
+        results["import mani_rain"] = bench_import.time_startup(
+            "import mani_rain", repeat)
+    return {"commit": _commit(), "python": platform.python_version(),
+            "numpy": np.__version__, "seed": SEED, "results": results}
+
+
+def compare(new: dict, old: dict):
+    """Print the ratio of new to old time of every common case"""
+    print(f"{'case':<42} {'old':>10} {'new':>10} {'ratio':>7}")
+    for name, seconds in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before = old["results"][name]
+        print(f"{name:<42} {before*1e6:8.1f}us {seconds*1e6:8.1f}us "
+              f"{seconds/before:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-o", "--output", help="JSON file of the results")
+    parser.add_argument("-k", "--select", default="",
+                        help="Only run cases containing this string")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    args = parser.parse_args(argv)
+
+    report = run(args.select, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    else:
+        for name, seconds in report["results"].items():
+            print(f"{name:<42} {seconds*1e6:10.1f} us")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Start up benchmark of mani_rain
+
+Every case is timed in a fresh interpreter, run as
+`python benchmarks/bench_import.py` to print the times. The mani_rain of
+this tree is imported, from any working directory.
+"""
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+"""Directory holding the mani_rain package of this tree"""
+
+cases = {
+    "import numpy": "import numpy",
+    "import mani_rain": "import mani_rain",
+    "import mani_rain, dvbs2 rate":
+        "import mani_rain\n"
+        "from mani_rain._dvbs2 import dvbs2\n"
+        "dvbs2(100e6).rate_at_esno(5.0)",
+    "import mani_rain, markov model":
+        "import mani_rain\n"
+        "mani_rain.rain.aau_model.draw_rain()",
+    "import mani_rain, itur (eager baseline)":
+        "import mani_rain\n"
+        "import itur",
+}
+
+
+def time_startup(code: str, repeat: int = 5) -> float:
+    """Best wall time in seconds of running `code` in a new interpreter"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # `-c` puts the working directory first on the path
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=ROOT)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    results = {name: time_startup(code) for name, code in cases.items()}
+    for name, seconds in results.items():
+        print(f"{name:<40} {seconds*1e3:8.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    main()
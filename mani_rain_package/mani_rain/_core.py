@@ -2,6 +2,7 @@ import pickle
 import numpy as np
 C = 3e8 # Speed of light
 k_boltz = 1.3806e-23 # Boltzmanns constant
+_block_size = 1 << 20 # Samples processed at a time from long series
 class station_t:
     """Class, for ground station instance"""
 
@@ -37,35 +38,94 @@ class station_t:
         self.lat = lat
         self.lon = lon
         self.height = height
-        self.el_distribution = None
-        """"Elevation distribution"""
+        self._el_distribution = None
+        self._el_cache = {}
         self.freq = frequency 
         self.diameter = diamaeter
         self.gt = gt
         self.eff = eff
         self.tb = tb_est
         self.gain = self._est_gain()
-        self.t_sys = self._est_system_temp()
+        self._t_sys = None
+        self._t_sys_key = None
     
+    @property
+    def t_sys(self) -> float:
+        """Estimated system temperature, see `_est_system_temp`, kept
+        until the gain, G/T or brightness temperature change. A value
+        set is kept the same way."""
+        key = (self.gain, self.gt, self.tb)
+        if key != self._t_sys_key:
+            self._t_sys = self._est_system_temp()
+            self._t_sys_key = key
+        return self._t_sys
+
+    @t_sys.setter
+    def t_sys(self, t_sys: float):
+        self._t_sys = t_sys
+        self._t_sys_key = (self.gain, self.gt, self.tb)
+
+    @property
+    def el_distribution(self):
+        """Elevation distribution, as (elevations [deg], probability)"""
+        return self._el_distribution
+
+    @el_distribution.setter
+    def el_distribution(self, distribution):
+        self._el_distribution = distribution
+        self._el_cache = {}
+
+    def el_cached(self, key, func):
+        """Value derived from the elevation distribution.
+
+        `func(elevations, probability)` is only evaluated the first time
+        `key` is requested, and the cached value is dropped whenever
+        `el_distribution` is replaced, e.g. by `gen_el_dist`.
+        """
+        if self._el_distribution is None:
+            raise ValueError("Missing elevation distribution from station")
+        if key not in self._el_cache:
+            self._el_cache[key] = func(*self._el_distribution)
+        return self._el_cache[key]
+
+    @property
+    def inv_sin_el(self) -> float:
+        """Mean of 1/sin(elevation) over the elevation distribution,
+        the mean slant path length through a layer of unit height."""
+        return self.el_cached("inv_sin_el", lambda el, prob:
+                              np.sum(prob / np.sin(np.radians(el))))
+
     def gen_el_dist(self, el_arr: np.ndarray = None,
                 file: str = "", res = 0.1):
         """Generate a Elevation distribution from pickled Godot file w.
-        resolution `res` in [Deg]"""
+        resolution `res` in [Deg]
+
+        `.npy` files are memory mapped, and the histogram is built in
+        blocks, so long elevation series are never fully loaded."""
 
         if el_arr is None:
             if file == "":
                 raise ValueError("Missing Data")
-            with open(file, "rb") as f:
-                el_arr = pickle.loads(f.read())
-                
-        bin_count = int((el_arr.max() - el_arr.min())/res)
-        val, bins = np.histogram(el_arr, bin_count,
-                                 weights=np.ones_like(el_arr)/len(el_arr))
-        self.el_distribution = (bins[:-1], val)
-
-    def _est_gain(self):
-        """"Estimated gain for a parabolic reflector."""
-        wave_len = C / (self.freq*1e9)
+            if file.endswith(".npy"):
+                el_arr = np.load(file, mmap_mode="r")
+            else:
+                with open(file, "rb") as f:
+                    el_arr = pickle.loads(f.read())
+
+        el_min, el_max = el_arr.min(), el_arr.max()
+        bin_count = int((el_max - el_min)/res)
+        bins = np.linspace(el_min, el_max, bin_count + 1)
+        counts = np.zeros(bin_count)
+        for start in range(0, len(el_arr), _block_size):
+            counts += np.histogram(el_arr[start:start + _block_size], bins)[0]
+        self.el_distribution = (bins[:-1], counts/len(el_arr))
+
+    def _est_gain(self, freq=None):
+        """"Estimated gain for a parabolic reflector, at `freq` GHz
+        which defaults to the carrier frequency."""
+        if freq is None:
+            freq = self.freq
+        wave_len = C / (np.asarray(freq)*1e9)
         g_max = ((np.pi*self.diameter)**2)/wave_len**2
         g_lin = g_max * self.eff
         return 10*np.log10(g_lin)
@@ -80,11 +140,14 @@ class station_t:
         sys_temp = g_lin/gt_lin
         return sys_temp - self.tb
     
-    def eff_gt(self, t_ant: float):
+    def eff_gt(self, t_ant: float, gain=None):
         """Calculates the equivalent G/T, for another brightness/
-        antenna temperature"""
-        g_lin = 10**(self.gain/10)
-        t_sys = t_ant + self._est_system_temp()
+        antenna temperature, and optionally another gain in dB, e.g.
+        `_est_gain` of another frequency"""
+        if gain is None:
+            gain = self.gain
+        g_lin = 10**(gain/10)
+        t_sys = t_ant + self.t_sys
         
         gt_eqv_lin = g_lin / t_sys
         return 10*np.log10(gt_eqv_lin)
@@ -1,4 +1,5 @@
 #%%
+from bisect import bisect_left
 from typing import Literal
 import numpy as np
 
@@ -57,35 +58,86 @@ class dvbs2:
         dvb_modcod_t("32APSK", 8/9,  4.397854,   15.69),
         dvb_modcod_t("32APSK", 9/10, 4.453027,   16.05)
     ]
+
+    # Structure of arrays view of `_modcods`, indexed as `_modcods`
+    _esno = np.array([m.esno for m in _modcods])
+    _spectral_eff = np.array([m.spectral_eff for m in _modcods])
+    _code_rate = np.array([m.code_rate for m in _modcods])
+    _modulation = np.array([
+        ("QPSK", "8PSK", "16APSK", "32APSK").index(m.modulation)
+        for m in _modcods], dtype=np.uint8)
+
+    # Es/N0 thresholds in ascending order, and for each the index of
+    # the most efficient modcod at or below that threshold.
+    _order = np.argsort(_esno, kind="stable")
+    _thresholds = _esno[_order]
+    _best_index = _order[np.maximum.accumulate(np.where(
+        _spectral_eff[_order] == np.maximum.accumulate(_spectral_eff[_order]),
+        np.arange(len(_order)), 0))]
+    # Plain lists of the same, for scalar lookups without numpy overhead
+    _threshold_list = _thresholds.tolist()
+    _best_list = _best_index.tolist()
+    _spectral_eff_list = _spectral_eff.tolist()
+
     def __init__(self, bw: int, rolloff = 0.1):
         self._bw = bw
         self.rolloff = rolloff
         self.eff_bw = bw/(1+rolloff)
 
+    @classmethod
+    def best_modcod_index(cls, esno):
+        """Index into `_modcods` of the modcod with the best spectral
+        efficiency for each esno, -1 where esno is below the minimum
+        threshold or NaN. +inf gives the best modcod. A Python scalar
+        gives an int."""
+        if isinstance(esno, (float, int)):
+            if esno != esno:
+                return -1
+            pos = bisect_left(cls._threshold_list, esno) - 1
+            # The slowest modcod is also usable exactly at its threshold
+            if esno == cls._threshold_list[0]:
+                pos = 0
+            return cls._best_list[pos] if pos >= 0 else -1
+
+        esno = np.asarray(esno)
+        pos = np.searchsorted(cls._thresholds, esno, side="left") - 1
+        pos = np.where(esno == cls._thresholds[0], 0, pos)
+        # NaN sorts after every threshold, -inf already falls below
+        pos = np.where(np.isnan(esno), -1, pos)
+        return np.where(pos < 0, -1, cls._best_index[np.maximum(pos, 0)])
+
     def find_best_modcod(self, esno: float) -> dvb_modcod_t:
         """Find the modcod with the best spectral efficiency
         for a given esno."""
-        
-        best_modcod = self._modcods[0] #Default to slowest
-        if best_modcod.esno > esno:
+        idx = self.best_modcod_index(esno)
+        if idx < 0:
             raise ValueError(f"{esno} is below the minimum threshold "
-                             f"of {self._modcods[0].esno}")
+                             f"of {self._thresholds[0]}")
+        return self._modcods[idx]
+
+    def rate_at_esno(self, esno):
+        """Highest rate for each esno, 0 where the link is in outage."""
+        idx = self.best_modcod_index(esno)
+        if isinstance(idx, int):
+            return self._spectral_eff_list[idx]*self.eff_bw if idx >= 0 else 0.0
+        rate = self._spectral_eff[idx] * self.eff_bw
+        return np.where(idx < 0, 0.0, rate)
 
-        for modcod in self._modcods:
-            if esno > modcod.esno:
-                if best_modcod.spectral_eff < modcod.spectral_eff:
-                    best_modcod = modcod
+    def _modcod_index_at_rate(self, rate) -> int:
+        target_eff = rate/self.eff_bw
+        return int(np.argmin(np.abs(self._spectral_eff - target_eff)))
 
-        return best_modcod
-    
     def modcod_at_rate(self, rate: int) -> dvb_modcod_t:
         """Find the modcod closest to the target rate"""
-        spectral_eff = np.array([i.spectral_eff for i in self._modcods])
+        return self._modcods[self._modcod_index_at_rate(rate)]
 
-        target_eff = rate/self.eff_bw
-        idx = np.argmin(np.abs(spectral_eff - target_eff))
-        return self._modcods[idx]
+    def fixed_rate(self, esno, target_rate):
+        """Rate of the modcod closest to `target_rate` for each esno,
+        0 where esno is below the threshold of that modcod."""
+        idx = self._modcod_index_at_rate(target_rate)
+        rate = self._spectral_eff[idx] * self.eff_bw
+        return np.where(self._esno[idx] <= np.asarray(esno), rate, 0.0)
 
     def rate(self, modcod: dvb_modcod_t) -> float:
         """Calculate the rate for a given modcod"""
-        return modcod.spectral_eff * self.eff_bw
\ No newline at end of file
+        return modcod.spectral_eff * self.eff_bw
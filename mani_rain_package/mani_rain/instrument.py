@@ -0,0 +1,206 @@
+"""
+Instrumentation module
+
+Opt-in counters of call counts and wall time per stage of the link
+budget, e.g.
+
+    with instrument.profile() as prof:
+        link.snr_batch(dist, elevation)
+    print(prof.to_json())
+
+The stages are timed by wrapping the functions in `stages` while
+profiling is enabled, and the original functions are restored when it
+is disabled, so there is no cost at all while it is off. Copies of these
+functions held by other classes or modules of `mani_rain`, e.g. methods
+reused as class attributes, are wrapped as well. Calls nested
+in a call of the same stage are not counted again, while stages may
+nest, e.g. the time of `snr` includes `gt`. The counters are not
+thread safe, profile one thread at a time.
+"""
+import json
+import sys
+import time
+from functools import wraps
+
+
+def _targets():
+    from mani_rain._core import station_t
+    from mani_rain._dvbs2 import dvbs2
+    from mani_rain.linkbudget import _link_budget
+    from mani_rain.network import _link_stack
+    from mani_rain.rain import itu_cache
+    from mani_rain.rain._rain_core import _rain_core
+    from mani_rain.rain._rain_markov import markov_base, markov_rain
+    from mani_rain.rain.itu import rain_itu
+    return {
+        "itu": [(itu_cache, "rain_height"), (itu_cache, "rainfall_rate"),
+                (itu_cache, "rain_attenuation")],
+        "markov": [(markov_base, "draw_rain"), (markov_base, "draw_runs"),
+                   (markov_base, "draw_states")],
+        "attenuation": [(_rain_core, "attenuation_saunders"),
+                        (_rain_core, "eqv_attenuation"),
+                        (markov_rain, "attenuation_saunders"),
+                        (markov_rain, "eqv_attenuation"),
+                        (rain_itu, "attenuation_saunders"),
+                        (rain_itu, "eqv_attenuation"),
+                        (rain_itu, "attenuation_itu"),
+                        (rain_itu, "eqv_attenuation_itu"),
+                        (_link_stack, "attenuation")],
+        "gt": [(station_t, "eff_gt")],
+        "snr": [(_link_budget, "_snr"), (_link_stack, "snr")],
+        "modcod": [(dvbs2, "best_modcod_index"), (dvbs2, "find_best_modcod"),
+                   (dvbs2, "rate_at_esno"), (dvbs2, "fixed_rate")],
+    }
+
+
+def _label(owner, name: str) -> str:
+    return f"{owner.__name__.rsplit('.', 1)[-1]}.{name}"
+
+
+def _aliases(targets: dict) -> dict:
+    """`targets` and every other attribute of the loaded `mani_rain`
+    modules and their classes holding one of the target functions"""
+    stage_of = {id(owner.__dict__[name]): stage
+                for stage, pairs in targets.items() for owner, name in pairs}
+    known = {(id(owner), name) for pairs in targets.values()
+             for owner, name in pairs}
+    found = {stage: list(pairs) for stage, pairs in targets.items()}
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not module_name.startswith("mani_rain"):
+            continue
+        owners = [module] + [value for value in vars(module).values()
+                             if isinstance(value, type)
+                             and value.__module__ == module_name]
+        for owner in owners:
+            for name, value in list(vars(owner).items()):
+                stage = stage_of.get(id(value))
+                if stage is not None and (id(owner), name) not in known:
+                    known.add((id(owner), name))
+                    found[stage].append((owner, name))
+    return found
+
+
+stages = ("itu", "markov", "attenuation", "gt", "snr", "modcod")
+"""Stages recorded by `profile`"""
+
+
+class profile:
+    """Records calls and wall time per stage while active, use as a
+    context manager or with `start` and `stop`."""
+
+    def __init__(self):
+        self.calls = {}
+        """Calls per stage and function"""
+        self.seconds = {}
+        """Cumulative wall time in seconds per stage and function"""
+        self._depth = dict.fromkeys(stages, 0)
+        self._stage_of = {}
+        self._patched = []
+        self._cache_start = None
+        self._cache_stats = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._patched)
+
+    def start(self):
+        """Enable profiling"""
+        global _active
+        if _active is not None:
+            raise RuntimeError("Another profile is already active")
+        from mani_rain.rain import itu_cache
+        _active = self
+        self._cache_start = itu_cache.cache.stats()
+        for stage, targets in _aliases(_targets()).items():
+            for owner, name in targets:
+                raw = owner.__dict__[name]
+                setattr(owner, name, self._wrap(stage, owner, name, raw))
+                self._patched.append((owner, name, raw))
+                self._stage_of[_label(owner, name)] = stage
+
+    def stop(self):
+        """Disable profiling and restore the original functions"""
+        global _active
+        for owner, name, raw in reversed(self._patched):
+            setattr(owner, name, raw)
+        self._patched = []
+        if _active is self:
+            _active = None
+        if self._cache_start is not None:
+            self._cache_stats = self._cache_delta()
+
+    def _cache_delta(self) -> dict:
+        from mani_rain.rain import itu_cache
+        end = itu_cache.cache.stats()
+        return {key: end[key] - self._cache_start[key]
+                for key in ("hits", "disk_hits", "misses")}
+
+    def _wrap(self, stage: str, owner, name: str, raw):
+        label = _label(owner, name)
+        func = raw.__func__ if isinstance(raw, (classmethod, staticmethod)) else raw
+        depth = self._depth
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if depth[stage]:
+                return func(*args, **kwargs)
+            depth[stage] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[label] = (self.seconds.get(label, 0.0)
+                                       + time.perf_counter() - start)
+                self.calls[label] = self.calls.get(label, 0) + 1
+                depth[stage] -= 1
+
+        return type(raw)(timed) if func is not raw else timed
+
+    def report(self) -> dict:
+        """Counters per stage and function, and the itu cache hit rate"""
+        report = {stage: {"calls": 0, "seconds": 0.0, "functions": {}}
+                  for stage in stages}
+        for label, calls in self.calls.items():
+            entry = report[self._stage_of[label]]
+            entry["calls"] += calls
+            entry["seconds"] += self.seconds[label]
+            entry["functions"][label] = {"calls": calls,
+                                         "seconds": self.seconds[label]}
+
+        cache = self._cache_delta() if self.active else self._cache_stats
+        if cache is not None:
+            cache = dict(cache)
+            lookups = sum(cache.values())
+            cache["hit_rate"] = ((cache["hits"] + cache["disk_hits"])/lookups
+                                 if lookups else None)
+        report["itu_cache"] = cache
+        return report
+
+    def to_json(self, **kwargs) -> str:
+        """`report` as a JSON string"""
+        return json.dumps(self.report(), **kwargs)
+
+
+_active = None
+
+
+def enable() -> profile:
+    """Start a global profile, e.g. for a whole job, see `profile`"""
+    prof = profile()
+    prof.start()
+    return prof
+
+
+def disable() -> profile:
+    """Stop the global profile and return it, None if none is active"""
+    prof = _active
+    if prof is not None:
+        prof.stop()
+    return prof
@@ -28,17 +28,21 @@ class _link_budget:
     def link_margin(self, margin):
         self._link_margin = margin
 
-    def _fspl(self, dist: float):
-        """Calculates FSPL in dB"""
-        freq = self.station.freq * 1e9
-        lin = ((4*np.pi*dist*freq)/C)**2
-        return 10*np.log10(lin)
+    def _fspl(self, dist: float, freq=None):
+        """Calculates FSPL in dB, at `freq` GHz which defaults to the
+        frequency of the station"""
+        if freq is None:
+            freq = self.station.freq
+        else:
+            freq = np.asarray(freq)
+        # Split in dB, only the distance needs a logarithm per sample
+        return 20*np.log10(dist) + 20*np.log10(4*np.pi*freq*1e9/C)
         
     def _antenna_temperature(self, attenuation, physical_temp = 290):
-        att_lin = 10**(-attenuation/10)
-        t_atmosphere = physical_temp*(1 - att_lin)
-        t_b_eff = self.tb * att_lin
-        return t_b_eff + t_atmosphere
+        # exp is cheaper than a power of 10 on arrays
+        att_lin = np.exp(attenuation*(-np.log(10)/10))
+        # tb att_lin + physical_temp (1 - att_lin)
+        return physical_temp + (self.tb - physical_temp)*att_lin
 
     def shannon_cap(self, snr_db: float):
         """Calculate the shannon rate for a given SNR"""
@@ -53,22 +57,111 @@ class _link_budget:
     
     def dvb_s2_cap(self, snr_db: float):
         """Calculate the highest achievable rate using DVB-S2 with 
-        a given snr: `snr_db`"""
-        try:
-            best_modcod = self.dvb.find_best_modcod(snr_db)
-        except ValueError:
-            return 0
-        return self.dvb.rate(best_modcod)
+        a given snr: `snr_db`, which may be an array.
+        Returns 0 where the link is in outage."""
+        rate = self.dvb.rate_at_esno(snr_db)
+        return rate if getattr(rate, "ndim", 0) else float(rate)
 
     def dvb_s2_fixed_rate(self, snr_db: float, target_rate: float) -> float:
         """Finds the closest rate to the target rate, and checks if
         the link is strong enough if not it will return 0"""
-        modcod = self.dvb.modcod_at_rate(target_rate)
-        if modcod.esno <= snr_db:
-            return self.dvb.rate(modcod)
+        rate = self.dvb.fixed_rate(snr_db, target_rate)
+        return rate if rate.ndim else float(rate)
+
+    def _snr(self, dist, rain_att, freq=None):
+        """SNR in dB for distance `dist` and rain attenuation `rain_att`,
+        both may be arrays, optionally at `freq` GHz."""
+        fspl = self._fspl(dist, freq)
+        gain = None if freq is None else self.station._est_gain(freq)
+        gt = self.station.eff_gt(self._antenna_temperature(rain_att), gain)
+
+        # Summed in dB, the noise power only offsets the received power
+        noise = 10*np.log10(k_boltz*self.bw)
+        return (self.constant - self.link_margin - noise) + gt - fspl \
+            - rain_att
+
+    def _batch_rain_rate(self, shape):
+        """Rain rates used by `snr_batch` when none are given"""
+        raise NotImplementedError()
+
+    def snr_batch(self, dist, elevation, rain_rate = None):
+        """Calculate the snr for arrays of samples in one evaluation
+
+        `dist`, `elevation` and `rain_rate` are broadcast against each
+        other, giving the same result as calling `snr_at_t` per sample.
+
+        Parameters
+        ----
+        dist : array_like
+          Distance from GS to SC in metres
+        elevation : array_like
+          Elevation angle in degree
+        rain_rate : None | array_like
+          Rain rate in mmhr⁻¹, if None the default of the rain model
+          is used for every sample.
+
+        Returns
+        -----
+        snr : np.ndarray
+          snr in dB, with the broadcast shape of the inputs
+        """
+        if rain_rate is None:
+            dist, elevation = np.broadcast_arrays(dist, elevation)
+            rain_rate = self._batch_rain_rate(elevation.shape)
+        else:
+            dist, elevation, rain_rate = np.broadcast_arrays(
+                dist, elevation, rain_rate)
+
+        rain_att = self.rain_model.attenuation_saunders(elevation, rain_rate)
+        return self._snr(dist, rain_att)
+
+    def snr_bands(self, dist, elevation, freq, rain_rate = None,
+                  constants = None):
+        """Calculate the snr of several frequency bands in one evaluation
+
+        Like `snr_batch`, with the bands along a new last axis. All
+        bands see the same rain, so a markov rain sample is drawn once
+        per element and shared by the bands. The rain attenuation of
+        every band uses the ITU-R P.838 coefficients of its frequency,
+        and the gain of the station is scaled to it, keeping the system
+        temperature of the station.
+
+        Parameters
+        ----
+        dist : array_like
+          Distance from GS to SC in metres
+        elevation : array_like
+          Elevation angle in degree
+        freq : array_like
+          Carrier frequency of each band in GHz
+        rain_rate : None | array_like
+          Rain rate in mmhr⁻¹, if None the default of the rain model
+          is used for every sample.
+        constants : None | array_like
+          Sum of the link constants of each band in dB, defaults to
+          those of the link
+
+        Returns
+        -----
+        snr : np.ndarray
+          snr in dB, with the broadcast shape of the inputs and the
+          bands as last axis
+        """
+        freq = np.atleast_1d(np.asarray(freq, dtype=float))
+        if rain_rate is None:
+            dist, elevation = np.broadcast_arrays(dist, elevation)
+            rain_rate = self._batch_rain_rate(elevation.shape)
         else:
-            return 0
+            dist, elevation, rain_rate = np.broadcast_arrays(
+                dist, elevation, rain_rate)
 
+        rain_att = self.rain_model.attenuation_saunders(
+            np.asarray(elevation)[..., None],
+            np.asarray(rain_rate)[..., None], freq)
+        snr = self._snr(np.asarray(dist)[..., None], rain_att, freq)
+        if constants is not None:
+            snr = snr + np.asarray(constants, dtype=float) - self.constant
+        return snr
 
     def snr_at_t(self, dist, elevation, rain_rate = None):
         """Calculate the snr at time t
@@ -123,28 +216,113 @@ class link_budget_itu(_link_budget):
             rain_model = rain_itu(station, 0.01)
         self.rain_model = rain_model
 
+    def _batch_rain_rate(self, shape):
+        return np.full(shape, self.rain_model.rain_rate)
+
     def snr_eqv(self, dist, rain_rate = None):
-        fspl = self._fspl(dist)
         rain_att = self.rain_model.eqv_attenuation(rain_rate)
-        gt = self.station.eff_gt(self._antenna_temperature(rain_att))
-
-        power_t = self.constant - self.link_margin + gt - fspl - rain_att
-        power_t_lin = 10**(power_t/10)
-
-        snr_lin = power_t_lin / (k_boltz*self.bw)
-        return 10*np.log10(snr_lin)
+        return self._snr(dist, rain_att)
 
     def snr_at_t(self, dist, elevation, rain_rate = None):
-        fspl = self._fspl(dist)
         rain_att = self.rain_model.attenuation_saunders(elevation, rain_rate)
-        gt = self.station.eff_gt(self._antenna_temperature(rain_att))
+        return self._snr(dist, rain_att)
+    
+class snr_table:
+    """Precomputed SNR and DVB-S2 rate of a `link_budget_markov`, for
+    every markov state, elevation bin and distance grid point."""
+
+    def __init__(self, link: "link_budget_markov", dist_grid, elevations):
+        """Parameters
+        -----
+        link : link_budget_markov
+          Link budget the table is computed from
+        dist_grid : array_like
+          Distances in metres the tables are computed at
+        elevations : array_like
+          Lower edge of the elevation bins in degree
+        """
+        self.key = link._table_key()
+        self.dist_grid = np.asarray(dist_grid, dtype=float)
+        self.elevations = np.asarray(elevations, dtype=float)
+        self.dvb = link.dvb
+
+        self.snr = link.state_snr(self.dist_grid[:, None],
+                                  self.elevations[None, :])
+        """SNR in dB with shape (distance, elevation, state)"""
+        self.modcod = self.dvb.best_modcod_index(self.snr)
+        """Index into `dvbs2._modcods`, -1 during outage"""
+        self.rate = self.dvb.rate_at_esno(self.snr)
+        """DVB-S2 rate in bps with shape (distance, elevation, state)"""
+
+        self._flat_snr = self.snr[0].ravel()
+        steps = np.diff(self.elevations)
+        self._el_step = None
+        if len(steps) and np.allclose(steps, steps[0], rtol=1e-9):
+            self._el_step = steps[0]
+
+    def el_index(self, elevation) -> np.ndarray:
+        """Index of the elevation bin containing `elevation`"""
+        n_el = len(self.elevations)
+        if self._el_step is None:
+            idx = np.searchsorted(self.elevations, elevation, side="right") - 1
+            return np.clip(idx, 0, n_el - 1)
+
+        # Equally spaced bins, as made by `gen_el_dist`, are found
+        # arithmetically and corrected for rounding at the edges.
+        idx = (np.asarray(elevation) - self.elevations[0]) / self._el_step
+        idx = np.clip(idx.astype(np.intp), 0, n_el - 1)
+        idx -= (idx > 0) & (self.elevations[idx] > elevation)
+        upper = np.minimum(idx + 1, n_el - 1)
+        idx += (upper > idx) & (self.elevations[upper] <= elevation)
+        return idx
+
+    def lookup_snr(self, dist, elevation, state) -> np.ndarray:
+        """SNR in dB for broadcast arrays of distance, elevation and
+        markov state index.
+
+        Distance only enters the link budget through the FSPL, so the
+        SNR is affine in log distance. Interpolating linearly in log
+        distance therefore reduces to correcting the first grid point
+        by the FSPL difference, which also holds outside the grid.
+        """
+        n_states = self.snr.shape[2]
+        flat = self.el_index(elevation)*n_states + state
+        fspl_diff = 20*np.log10(np.asarray(dist) / self.dist_grid[0])
+        return self._flat_snr.take(flat) - fspl_diff
+
+    def lookup_rate(self, dist, elevation, state) -> np.ndarray:
+        """DVB-S2 rate in bps, see `lookup_snr`"""
+        return self.dvb.rate_at_esno(self.lookup_snr(dist, elevation, state))
+
+
+class run_result:
+    """Run length encoded link budget, constant over each run"""
+
+    def __init__(self, start, duration, rain_rate, snr, rate):
+        self.start = start
+        """First step of each run"""
+        self.duration = duration
+        """Number of steps in each run"""
+        self.rain_rate = rain_rate
+        """Rain rate in mmhr⁻¹"""
+        self.snr = snr
+        """SNR in dB"""
+        self.rate = rate
+        """DVB-S2 rate in bps"""
+
+    def data_volume(self, dt: float = 60) -> float:
+        """Data volume in bits, with steps of `dt` seconds"""
+        return np.sum(self.rate*self.duration)*dt
+
+    def outage_time(self, dt: float = 60) -> float:
+        """Time without link in seconds, with steps of `dt` seconds"""
+        return np.sum(self.duration[self.rate == 0])*dt
+
+    def expand(self, values) -> np.ndarray:
+        """Per step array of a per run quantity, e.g. `self.rate`"""
+        return np.repeat(values, self.duration)
 
-        power_t = self.constant - self.link_margin + gt - fspl - rain_att
-        power_t_lin = 10**(power_t/10)
 
-        snr_lin = power_t_lin / (k_boltz*self.bw)
-        return 10*np.log10(snr_lin)
-    
 class link_budget_markov(_link_budget):
     """Link budget class, based on experimental markov models"""
 
@@ -152,6 +330,11 @@ class link_budget_markov(_link_budget):
                  bw, constants = _core.mani_link, link_margin=3, tb=220):
         super().__init__(station, bw, constants, link_margin, tb)
         self.rain_model = rain_model
+        self._table = None
+
+    def _batch_rain_rate(self, shape):
+        """Draws a consecutive markov rain sample for every element"""
+        return self.rain_model.draw_rain(shape)
 
     def snr_eqv(self, dist, rain_rate = None):
         """Calculate the eqv snr, for a given rain_rate
@@ -172,15 +355,8 @@ class link_budget_markov(_link_budget):
         snr : float
           Eqv. SNR in dB
         """
-        fspl = self._fspl(dist)
         rain_att = self.rain_model.eqv_attenuation(rain_rate)
-        gt = self.station.eff_gt(self._antenna_temperature(rain_att))
-
-        power_t = self.constant - self.link_margin + gt - fspl - rain_att
-        power_t_lin = 10**(power_t/10)
-
-        snr_lin = power_t_lin / (k_boltz*self.bw)
-        return 10*np.log10(snr_lin)
+        return self._snr(dist, rain_att)
     
     def snr_at_t(self, dist, elevation, rain_rate=None):
         """Calculate the snr at time t
@@ -200,14 +376,127 @@ class link_budget_markov(_link_budget):
         snr : float
           snr in dB
         """
-        fspl = self._fspl(dist)
         rain_att = self.rain_model.attenuation_saunders(elevation, rain_rate)
-        gt = self.station.eff_gt(self._antenna_temperature(rain_att))
+        return self._snr(dist, rain_att)
 
-        power_t = self.constant - self.link_margin + gt - fspl - rain_att
-        power_t_lin = 10**(power_t/10)
+    def state_snr(self, dist, elevation):
+        """SNR in dB for every state of the markov model, with the
+        states along a new last axis of the broadcast `dist` and
+        `elevation`."""
+        rain_rates = self.rain_model.rain_model.states * 60
+        return self.snr_batch(np.asarray(dist)[..., None],
+                              np.asarray(elevation)[..., None], rain_rates)
 
-        snr_lin = power_t_lin / (k_boltz*self.bw)
-        return 10*np.log10(snr_lin)
-            
-        
\ No newline at end of file
+    def _state_distribution(self, n):
+        markov = self.rain_model.rain_model
+        if n is None:
+            return markov.stationary()
+        return markov.distribution(n)
+
+    def expected_rate(self, dist, elevation, n: int = None):
+        """Expected DVB-S2 rate without sampling the markov model
+
+        Parameters
+        -----
+        dist : array_like
+          Distance from GS to SC in metres
+        elevation : array_like
+          Elevation angle in degree
+        n : None | int
+          Steps ahead of the current markov state, if None the
+          stationary distribution of the model is used
+
+        Returns
+        -----
+        rate : float | np.ndarray
+          Expected rate in bps
+        """
+        rate = self.dvb.rate_at_esno(self.state_snr(dist, elevation))
+        return rate @ self._state_distribution(n)
+
+    def outage_probability(self, dist, elevation, n: int = None):
+        """Probability of the DVB-S2 link being in outage, see
+        `expected_rate`"""
+        outage = self.dvb.best_modcod_index(self.state_snr(dist, elevation)) < 0
+        return outage @ self._state_distribution(n)
+
+    def _table_key(self) -> tuple:
+        """Everything an `snr_table` depends on besides its grids"""
+        return (self.link_margin, self.bw, self.constant, self.tb,
+                self.station.freq, self.station.gain, self.station.t_sys,
+                self.rain_model.rain_model.base, self.rain_model.a,
+                self.rain_model.b, self.rain_model.tau,
+                self.rain_model.h_rain)
+
+    def lookup_table(self, dist_grid, elevations=None) -> snr_table:
+        """Lookup table of SNR and DVB-S2 rate over markov states and
+        elevation bins, see `snr_table`.
+
+        The table is kept and only rebuilt when the grids, the link
+        margin, or the model or other parameters of the link change.
+        `elevations` defaults to the bins of the station elevation
+        distribution.
+        """
+        if elevations is None:
+            elevations = self.station.el_cached("bins", lambda el, _: el)
+        table = self._table
+        if (table is None or table.key != self._table_key()
+                or not np.array_equal(table.dist_grid, dist_grid)
+                or not np.array_equal(table.elevations, elevations)):
+            table = self._table = snr_table(self, dist_grid, elevations)
+        return table
+
+    def simulate_runs(self, dist, elevation, n_steps: int = None,
+                      ephemeris_start=None) -> run_result:
+        """Event driven simulation over `n_steps` markov steps
+
+        The time spent in each markov state is drawn as a single run,
+        and the link budget is only evaluated where the rain or the
+        ephemeris changes, instead of at every step.
+
+        Parameters
+        -----
+        dist : array_like
+          Distance from GS to SC in metres
+        elevation : array_like
+          Elevation angle in degree
+        n_steps : None | int
+          Number of markov steps, defaults to the length of the
+          ephemeris when it is given per step. Required with
+          `ephemeris_start`, as it ends the last ephemeris sample.
+        ephemeris_start : None | array_like
+          Step at which each ephemeris sample starts to apply, the first
+          being 0. If None the ephemeris is given per step, and repeated
+          samples are merged, e.g. elevations quantised to the
+          `el_distribution` bins.
+
+        Returns
+        -----
+        runs : run_result
+        """
+        dist, elevation = np.broadcast_arrays(np.atleast_1d(dist),
+                                              np.atleast_1d(elevation))
+        if ephemeris_start is None:
+            if n_steps is None:
+                n_steps = len(elevation)
+            if len(elevation) == 1:
+                dist = np.broadcast_to(dist, n_steps)
+                elevation = np.broadcast_to(elevation, n_steps)
+            changed = (np.diff(dist) != 0) | (np.diff(elevation) != 0)
+            ephemeris_start = np.concatenate([[0], np.flatnonzero(changed) + 1])
+            dist = dist[ephemeris_start]
+            elevation = elevation[ephemeris_start]
+        elif n_steps is None:
+            raise ValueError("n_steps is required with ephemeris_start")
+        ephemeris_start = np.asarray(ephemeris_start)
+
+        rain_start, _, rain_rate = self.rain_model.draw_runs(n_steps)
+        start = np.union1d(rain_start, ephemeris_start[ephemeris_start < n_steps])
+        duration = np.diff(np.append(start, n_steps))
+        rain_idx = np.searchsorted(rain_start, start, side="right") - 1
+        eph_idx = np.searchsorted(ephemeris_start, start, side="right") - 1
+
+        snr = self.snr_batch(dist[eph_idx], elevation[eph_idx],
+                             rain_rate[rain_idx])
+        return run_result(start, duration, rain_rate[rain_idx], snr,
+                          self.dvb_s2_cap(snr))
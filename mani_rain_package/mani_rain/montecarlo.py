@@ -0,0 +1,152 @@
+"""
+Monte Carlo data volume module
+
+Runs many markov rain realisations of a pass through a
+`link_budget_markov`, split across a process pool.
+"""
+#%%
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from mani_rain.linkbudget import link_budget_markov
+
+
+class mc_result:
+    """Result of `data_volume_mc`, one entry per realisation"""
+
+    def __init__(self, data_volume: np.ndarray, outage_time: np.ndarray,
+                 modcod_time: np.ndarray, rates: np.ndarray):
+        self.data_volume = data_volume
+        """Data volume of each realisation in bits"""
+        self.outage_time = outage_time
+        """Time without link in each realisation in seconds"""
+        self.modcod_time = modcod_time
+        """Time spent at each rate summed over all realisations, with
+        outage as the first entry"""
+        self.rates = rates
+        """Rate in bps of each entry of `modcod_time`"""
+
+    @property
+    def rate_histogram(self) -> np.ndarray:
+        """Fraction of time spent at each rate in `rates`"""
+        return self.modcod_time / np.sum(self.modcod_time)
+
+    def quantile(self, q):
+        """Data volume quantile(s) over the realisations"""
+        return np.quantile(self.data_volume, q)
+
+
+# Set in every worker by `_init_worker`, so the link and the pass are
+# only sent once per process.
+_worker_args = None
+
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args or None
+
+
+def _run_realisations(seeds):
+    (link, dist, elevation, dt, steps_per_draw, initial_state,
+     stats) = _worker_args
+    markov = link.rain_model.rain_model
+    n_samples = len(elevation)
+    n_draws = -(-n_samples // steps_per_draw)
+    n_modcods = len(link.dvb._modcods)
+
+    data_volume = np.empty(len(seeds))
+    outage_time = np.empty(len(seeds))
+    modcod_count = np.zeros(n_modcods + 1, dtype=np.int64)
+    if stats is not None:
+        stats = stats.empty()
+    for i, seed in enumerate(seeds):
+        rain = markov.draw_trajectory(n_draws, 1, seed=seed,
+                                      initial_state=initial_state)[0]
+        rain = np.repeat(rain, steps_per_draw)[:n_samples]
+
+        snr = link.snr_batch(dist, elevation, rain)
+        idx = link.dvb.best_modcod_index(snr)
+        rate = link.dvb_s2_cap(snr)
+
+        data_volume[i] = np.sum(rate*dt)
+        outage_time[i] = np.sum(np.where(idx < 0, dt, 0))
+        modcod_count += np.bincount(idx + 1, minlength=n_modcods + 1)
+        if stats is not None:
+            # Realisations are independent, ModCods are entered anew
+            stats.update(snr, rate, idx, dt, continued=False)
+    return data_volume, outage_time, modcod_count, stats
+
+
+def data_volume_mc(link: link_budget_markov, dist, elevation,
+                   n_realisations: int, seed=None, dt: float = 1,
+                   steps_per_draw: int = 1, initial_state: int = None,
+                   workers: int = None, stats=None) -> mc_result:
+    """Monte Carlo estimate of the data volume of a pass
+
+    Every realisation draws its own rain trajectory from a stream
+    spawned from `seed`, independent of the worker it runs on, so the
+    result is identical for any number of workers. The state of the
+    markov model in `link` is not changed.
+
+    Parameters
+    -----
+    link : link_budget_markov
+      Link budget with the markov rain model to sample
+    dist : array_like
+      Distance from GS to SC in metres, at each timestep of the pass
+    elevation : array_like
+      Elevation angle in degree, at each timestep of the pass
+    n_realisations : int
+      Number of realisations of the pass
+    seed : None | int | np.random.SeedSequence
+      Master seed of the realisations
+    dt : float
+      Duration of a timestep in seconds
+    steps_per_draw : int
+      Timesteps per markov step, e.g. 60 for a 1 s pass and a 1 min model
+    initial_state : None | int
+      Markov state at the start of the pass, defaults to the models
+      current state
+    workers : None | int
+      Number of processes, defaults to the CPU count. With 1 everything
+      runs in this process.
+    stats : None | stats.link_stats
+      Statistics updated with every sample of every realisation, each
+      worker fills its own which are then merged
+
+    Returns
+    -----
+    result : mc_result
+    """
+    dist, elevation = np.broadcast_arrays(np.asarray(dist, dtype=float),
+                                          np.asarray(elevation, dtype=float))
+    if initial_state is None:
+        initial_state = link.rain_model.rain_model.state
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(n_realisations)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, n_realisations))
+
+    template = None if stats is None else stats.empty()
+    args = (link, dist, elevation, dt, steps_per_draw, initial_state,
+            template)
+    chunks = np.array_split(np.arange(n_realisations), workers*4)
+    chunks = [[seeds[i] for i in chunk] for chunk in chunks if len(chunk)]
+    if workers == 1:
+        _init_worker(*args)
+        results = [_run_realisations(chunk) for chunk in chunks]
+        _init_worker()
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=args) as pool:
+            results = list(pool.map(_run_realisations, chunks))
+
+    data_volume, outage_time, modcod_count, partial = zip(*results)
+    if stats is not None:
+        for part in partial:
+            stats.merge(part)
+    rates = np.concatenate([[0.0], link.dvb._spectral_eff*link.dvb.eff_bw])
+    return mc_result(np.concatenate(data_volume), np.concatenate(outage_time),
+                     np.sum(modcod_count, axis=0)*dt, rates)
@@ -0,0 +1,276 @@
+"""
+Ground station network module
+
+Evaluates a pass schedule against several ground stations at once, each
+with its own link budget and rain model, and selects the station used
+at every timestep.
+"""
+#%%
+import numpy as np
+from mani_rain._core import C, k_boltz
+from mani_rain.pipeline import _held_rain
+
+
+class network_result:
+    """Link budget of every station and the station selected at every
+    timestep"""
+
+    def __init__(self, visible, snr, rate, station, dt):
+        self.visible = visible
+        """Station is above its elevation mask, shape (station, time)"""
+        self.snr = snr
+        """SNR in dB, shape (station, time), -inf where not visible"""
+        self.rate = rate
+        """DVB-S2 rate in bps, shape (station, time)"""
+        self.station = station
+        """Index of the selected station, -1 where none is visible"""
+        self.dt = dt
+        """Duration of a timestep in seconds"""
+
+    @property
+    def selected_rate(self) -> np.ndarray:
+        """DVB-S2 rate of the selected station in bps"""
+        idx = np.maximum(self.station, 0)
+        rate = np.take_along_axis(self.rate, idx[None, :], axis=0)[0]
+        return np.where(self.station >= 0, rate, 0.0)
+
+    @property
+    def data_volume(self) -> float:
+        """Data volume of the network in bits"""
+        return np.sum(self.selected_rate)*self.dt
+
+    @property
+    def station_time(self) -> np.ndarray:
+        """Time in seconds each station is selected"""
+        n_stations = self.rate.shape[0]
+        counts = np.bincount(self.station[self.station >= 0],
+                             minlength=n_stations)
+        return counts*self.dt
+
+    @property
+    def handovers(self) -> int:
+        """Number of switches between two stations"""
+        used = self.station[self.station >= 0]
+        return int(np.count_nonzero(np.diff(used)))
+
+    def coverage_gaps(self):
+        """Periods without link, either as no station is visible or the
+        selected station is in outage
+
+        Returns
+        -----
+        start : np.ndarray
+          First timestep of each gap
+        duration : np.ndarray
+          Duration of each gap in seconds
+        """
+        gap = np.concatenate([[False], self.selected_rate == 0, [False]])
+        edges = np.flatnonzero(np.diff(gap.astype(np.int8)))
+        start, stop = edges[::2], edges[1::2]
+        return start, (stop - start)*self.dt
+
+    @property
+    def gap_time(self) -> float:
+        """Total time without link in seconds"""
+        return np.count_nonzero(self.selected_rate == 0)*self.dt
+
+
+def _column(values) -> np.ndarray:
+    """Per station values as a column, to broadcast along time"""
+    return np.asarray(values, dtype=float)[:, None]
+
+
+class _link_stack:
+    """Link budgets of several stations as columns along a leading
+    station axis. The terms are those of `_link_budget._snr` and
+    `_rain_core.attenuation_saunders`, with the constant parts summed
+    per station once."""
+
+    def __init__(self, links: list):
+        stations = [link.station for link in links]
+        self.rain_models = [link.rain_model for link in links]
+        # Constants, margin and noise power in dB
+        self.offset = _column([link.constant - link.link_margin
+                               - 10*np.log10(k_boltz*link.bw)
+                               for link in links])
+        # Frequency term of the FSPL in dB
+        self.fspl_freq = _column([20*np.log10(4*np.pi*station.freq*1e9/C)
+                                  for station in stations])
+        self.tb = _column([link.tb for link in links])
+        self.gain = _column([station.gain for station in stations])
+        self.t_sys = _column([station.t_sys for station in stations])
+        self.rain_height = _column([link.rain_model.h_rain - station.height
+                                    for link, station in zip(links,
+                                                             stations)])
+
+    def coefficients(self, elevation: np.ndarray) -> tuple:
+        """P.838 or Saunders coefficients (k, α) of every station, which
+        may depend on the elevation for non circular polarisation"""
+        coefficients = [model.coefficients(el)
+                        for model, el in zip(self.rain_models, elevation)]
+        if all(np.ndim(c[0]) == 0 for c in coefficients):
+            return tuple(_column([c[i] for c in coefficients])
+                         for i in (0, 1))
+        return tuple(np.stack([np.broadcast_to(c[i], elevation.shape[1:])
+                               for c in coefficients]) for i in (0, 1))
+
+    def attenuation(self, elevation: np.ndarray, rain_rate) -> np.ndarray:
+        """Saunders rain attenuation in dB, shape (station, time)"""
+        k, alpha = self.coefficients(elevation)
+        slant_range = self.rain_height / np.sin(np.radians(elevation))
+        return k*rain_rate**alpha*slant_range
+
+    def snr(self, dist: np.ndarray, rain_att: np.ndarray) -> np.ndarray:
+        """SNR in dB, shape (station, time)"""
+        att_lin = np.exp(rain_att*(-np.log(10)/10))
+        t_ant = 290 + (self.tb - 290)*att_lin
+        gt = self.gain - 10*np.log10(t_ant + self.t_sys)
+        return self.offset + gt - (20*np.log10(dist) + self.fspl_freq) \
+            - rain_att
+
+
+class link_network:
+    """Network of ground stations, each with its own link budget"""
+
+    def __init__(self, links: list, min_elevation=5):
+        """
+        Parameters
+        -----
+        links : list
+          `link_budget_itu` or `link_budget_markov` of every station.
+          Rain is drawn independently for every link, unless links share
+          a rain model object.
+        min_elevation : float | array_like
+          Elevation mask in degree, for all or for every station
+        """
+        self.links = list(links)
+        self.min_elevation = np.broadcast_to(
+            np.asarray(min_elevation, dtype=float), (len(self.links),))
+
+    def snr_batch(self, dist, elevation, rain_rate=None):
+        """SNR in dB of every station, for arrays with shape
+        (station, time), see `_link_budget.snr_batch`. Samples below the
+        elevation mask are -inf."""
+        dist, elevation = np.broadcast_arrays(np.asarray(dist, dtype=float),
+                                              np.asarray(elevation, dtype=float))
+        visible = elevation >= self.min_elevation[:, None]
+        if rain_rate is None:
+            rain_rate = [None]*len(self.links)
+
+        # Rain is drawn for every timestep, so a markov chain also
+        # evolves while the station is not visible.
+        rain = np.empty(elevation.shape)
+        for i, link in enumerate(self.links):
+            rain[i] = (link._batch_rain_rate(elevation[i].shape)
+                       if rain_rate[i] is None else rain_rate[i])
+
+        # All stations are evaluated at once along the first axis, in
+        # blocks of time which keep the temporaries in cache
+        el = np.where(visible, elevation, 90.0)
+        stack = _link_stack(self.links)
+        snr = np.empty(el.shape)
+        n_time = el.shape[1]
+        block = max(1, self._BLOCK_SIZE // max(len(self.links), 1))
+        for start in range(0, n_time, block):
+            cols = slice(start, min(start + block, n_time))
+            rain_att = stack.attenuation(el[:, cols], rain[:, cols])
+            snr[:, cols] = np.where(visible[:, cols],
+                                    stack.snr(dist[:, cols], rain_att),
+                                    -np.inf)
+        return snr
+
+    _BLOCK_SIZE = 1 << 17
+    """Samples of all stations evaluated at a time by `snr_batch`"""
+
+    def evaluate(self, dist, elevation, dt: float = 1,
+                 steps_per_draw: int = 1, hysteresis: float = None,
+                 rain_rate=None) -> network_result:
+        """Evaluate the network and select a station at every timestep
+
+        The station with the highest DVB-S2 rate is selected, and ties
+        are broken by the SNR. With `hysteresis`, the selected station
+        is kept while it is visible, its SNR is at most `hysteresis` dB
+        below the best station, and it has a link whenever another
+        station has.
+
+        Parameters
+        -----
+        dist : array_like
+          Distance from every GS to SC in metres, shape (station, time)
+        elevation : array_like
+          Elevation angle in degree, shape (station, time)
+        dt : float
+          Duration of a timestep in seconds
+        steps_per_draw : int
+          Timesteps per rain draw, e.g. 60 for 1 s ephemeris and a 1 min
+          markov model
+        hysteresis : None | float
+          Handover hysteresis in dB
+        rain_rate : None | array_like
+          Rain rate in mmhr⁻¹ with shape (station, time), drawn from the
+          rain models if None
+
+        Returns
+        -----
+        result : network_result
+        """
+        dist, elevation = np.broadcast_arrays(np.asarray(dist, dtype=float),
+                                              np.asarray(elevation, dtype=float))
+        if rain_rate is None:
+            n = elevation.shape[1]
+            rain_rate = [_held_rain(link._batch_rain_rate, steps_per_draw)(n)
+                         for link in self.links]
+        snr = self.snr_batch(dist, elevation, rain_rate)
+        visible = np.isfinite(snr)
+        modcod = self.links[0].dvb.best_modcod_index(snr)
+        eff_bw = _column([link.dvb.eff_bw for link in self.links])
+        rate = np.where(modcod < 0, 0.0,
+                        self.links[0].dvb._spectral_eff[modcod]*eff_bw)
+
+        station = self._best_station(snr, rate)
+        if hysteresis is not None:
+            station = self._hysteresis(station, snr, rate, visible,
+                                       hysteresis)
+        return network_result(visible, snr, rate, station, dt)
+
+    @staticmethod
+    def _best_station(snr, rate) -> np.ndarray:
+        best_rate = np.max(rate, axis=0)
+        candidate = (rate == best_rate) & np.isfinite(snr)
+        station = np.argmax(np.where(candidate, snr, -np.inf), axis=0)
+        return np.where(np.any(candidate, axis=0), station, -1)
+
+    @staticmethod
+    def _hysteresis(best, snr, rate, visible, hysteresis) -> np.ndarray:
+        """Keep the current station until it is not visible, falls more
+        than `hysteresis` dB below `best`, or is in outage while `best`
+        is not, found blockwise so the work is proportional to the
+        length of the schedule"""
+        n = len(best)
+        idx = np.maximum(best, 0)
+        best_snr = np.take_along_axis(snr, idx[None, :], axis=0)[0]
+        best_up = np.take_along_axis(rate, idx[None, :], axis=0)[0] > 0
+        station = np.empty(n, dtype=best.dtype)
+
+        t = 0
+        while t < n:
+            current = best[t]
+            end, block = t + 1, 1024
+            while end < n:
+                stop = min(end + block, n)
+                if current < 0:
+                    keep = best[end:stop] < 0
+                else:
+                    keep = (visible[current, end:stop]
+                            & (snr[current, end:stop]
+                               >= best_snr[end:stop] - hysteresis)
+                            & ((rate[current, end:stop] > 0)
+                               | ~best_up[end:stop]))
+                if not keep.all():
+                    end += int(np.argmin(keep))
+                    break
+                end = stop
+                block *= 2
+            station[t:end] = current
+            t = end
+        return station
@@ -0,0 +1,169 @@
+"""
+Streaming pipeline module
+
+Pushes ephemeris time series of (time, distance, elevation) through a
+link budget in fixed size blocks, so memory use does not grow with the
+length of the mission.
+"""
+#%%
+from itertools import islice
+import numpy as np
+from mani_rain._core import _block_size
+from mani_rain.linkbudget import _link_budget
+
+
+class link_block:
+    """Link budget results of one block of ephemeris"""
+
+    def __init__(self, time, dist, elevation, rain_rate, attenuation,
+                 snr, modcod, rate, data_volume):
+        self.time = time
+        self.dist = dist
+        self.elevation = elevation
+        self.rain_rate = rain_rate
+        """Rain rate in mmhr⁻¹"""
+        self.attenuation = attenuation
+        """Rain attenuation in dB"""
+        self.snr = snr
+        """SNR in dB"""
+        self.modcod = modcod
+        """Index into `dvbs2._modcods`, -1 during outage"""
+        self.rate = rate
+        """DVB-S2 rate in bps"""
+        self.data_volume = data_volume
+        """Data volume in bits, from the start of the stream to the end
+        of the block"""
+
+
+def read_ephemeris(source, block_size: int = _block_size,
+                   skiprows: int = 0, delimiter: str = ","):
+    """Read ephemeris in blocks of `block_size` samples
+
+    Parameters
+    -----
+    source : str | np.ndarray | tuple
+      A `.npy` file or array with the columns (time, distance,
+      elevation), which is memory mapped, a CSV file with these
+      columns, or a tuple of the three column arrays.
+    block_size : int
+      Number of samples in each block
+    skiprows : int
+      Header lines to skip in CSV files
+    delimiter : str
+      Column delimiter of CSV files
+
+    Yields
+    -----
+    time, dist, elevation : np.ndarray
+      Columns of the block
+    """
+    if isinstance(source, str) and not source.endswith(".npy"):
+        with open(source, "r") as f:
+            lines = islice(f, skiprows, None)
+            while True:
+                chunk = list(islice(lines, block_size))
+                if not chunk:
+                    return
+                data = np.loadtxt(chunk, delimiter=delimiter,
+                                  usecols=(0, 1, 2), ndmin=2)
+                yield data[:, 0], data[:, 1], data[:, 2]
+
+    if isinstance(source, str):
+        source = np.load(source, mmap_mode="r")
+    if isinstance(source, np.ndarray):
+        source = (source[:, 0], source[:, 1], source[:, 2])
+
+    time, dist, elevation = source
+    for start in range(0, len(time), block_size):
+        block = slice(start, start + block_size)
+        yield (np.asarray(time[block], dtype=float),
+               np.asarray(dist[block], dtype=float),
+               np.asarray(elevation[block], dtype=float))
+
+
+class _held_rain:
+    """Rain rates held for `steps_per_draw` samples, carried over
+    between blocks"""
+
+    def __init__(self, draw, steps_per_draw: int):
+        self.draw = draw
+        self.steps_per_draw = steps_per_draw
+        self.value = 0.0
+        self.left = 0
+
+    def __call__(self, n: int) -> np.ndarray:
+        head = min(self.left, n)
+        self.left -= head
+        rain = [np.full(head, self.value)]
+
+        rest = n - head
+        n_draws = -(-rest // self.steps_per_draw)
+        if n_draws:
+            draws = np.asarray(self.draw(n_draws), dtype=float)
+            rain.append(np.repeat(draws, self.steps_per_draw)[:rest])
+            self.value = draws[-1]
+            self.left = n_draws*self.steps_per_draw - rest
+        return np.concatenate(rain)
+
+
+def link_stream(link: _link_budget, blocks, dt: float = 1,
+                steps_per_draw: int = 1, store=None, station: int = 0,
+                stats=None):
+    """Run ephemeris blocks through the rain model, SNR and DVB-S2
+
+    The rain model is advanced continuously across blocks, so a markov
+    chain carries its state from one block to the next.
+
+    Parameters
+    -----
+    link : link_budget_itu | link_budget_markov
+      Link budget to evaluate
+    blocks : iterable
+      Blocks of (time, dist, elevation), e.g. from `read_ephemeris`
+    dt : float
+      Duration of a sample in seconds
+    steps_per_draw : int
+      Samples per rain draw, e.g. 60 for 1 s ephemeris and a 1 min
+      markov model
+    store : None | store.result_store
+      Store every block is appended to
+    station : int
+      Station index written to `store`
+    stats : None | stats.link_stats
+      Statistics updated with every block
+
+    Yields
+    -----
+    block : link_block
+    """
+    rain_source = _held_rain(link._batch_rain_rate, steps_per_draw)
+    data_volume = 0.0
+    for time, dist, elevation in blocks:
+        rain_rate = rain_source(len(elevation))
+        attenuation = link.rain_model.attenuation_saunders(elevation,
+                                                           rain_rate)
+        snr = link._snr(dist, attenuation)
+        modcod = link.dvb.best_modcod_index(snr)
+        rate = link.dvb_s2_cap(snr)
+        data_volume += np.sum(rate)*dt
+        block = link_block(time, dist, elevation, rain_rate, attenuation,
+                           snr, modcod, rate, data_volume)
+        if store is not None:
+            store.append_block(link, block, station)
+        if stats is not None:
+            stats.update(snr, rate, modcod, dt)
+        yield block
+
+
+def stream_data_volume(link: _link_budget, source, dt: float = 1,
+                       steps_per_draw: int = 1,
+                       block_size: int = _block_size, store=None,
+                       stats=None, **kwargs) -> float:
+    """Total data volume in bits of the ephemeris in `source`, see
+    `read_ephemeris` and `link_stream`"""
+    data_volume = 0.0
+    blocks = read_ephemeris(source, block_size, **kwargs)
+    for block in link_stream(link, blocks, dt, steps_per_draw, store,
+                             stats=stats):
+        data_volume = block.data_volume
+    return data_volume
@@ -1,18 +1,26 @@
-from ._rain_markov import markov_base, markov_rain
+from ._rain_markov import markov_base, markov_chain, markov_rain
 
-aau_model = markov_base.from_file(
-    f"{__path__[0]}/models/aau_model.npy",
-    f"{__path__[0]}/models/aau_states.npy"
-)
-nn_model = markov_base.from_file(
-    f"{__path__[0]}/models/nn_model.npy",
-    f"{__path__[0]}/models/nn_states.npy"
-)
-aau_ma_model = markov_base.from_file(
-    f"{__path__[0]}/models/aau_ma_model.npy",
-    f"{__path__[0]}/models/aau_ma_states.npy"
-)
-nn_ma_model = markov_base.from_file(
-    f"{__path__[0]}/models/nn_model_ma.npy",
-    f"{__path__[0]}/models/nn_states_ma.npy"
-)
\ No newline at end of file
+_bundled_models = {
+    "aau_model": ("aau_model.npy", "aau_states.npy"),
+    "nn_model": ("nn_model.npy", "nn_states.npy"),
+    "aau_ma_model": ("aau_ma_model.npy", "aau_ma_states.npy"),
+    "nn_ma_model": ("nn_model_ma.npy", "nn_states_ma.npy"),
+}
+"""Markov models shipped in `models/`, loaded on first access"""
+
+
+def __getattr__(name):
+    if name not in _bundled_models:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    model_file, states_file = _bundled_models[name]
+    model = markov_base.from_file(
+        f"{__path__[0]}/models/{model_file}",
+        f"{__path__[0]}/models/{states_file}"
+    )
+    globals()[name] = model
+    return model
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_bundled_models))
@@ -2,19 +2,32 @@
 Base class for rain attenuation
 """
 import numpy as np
-import itur
 from mani_rain._core import station_t
+from mani_rain.rain import itu_cache
 
 
 class _rain_core:
-    def __init__(self, station: station_t, a = 0.187, b = 1.099):
+    def __init__(self, station: station_t, a = 0.187, b = 1.099, tau = 45):
+        """Parameters
+        -----
+        station : station_t
+            Station object
+        a, b : float | None
+            Saunders coefficients of the specific attenuation a R^b,
+            fitted at the frequency of the station. If None the ITU-R
+            P.838 coefficients are used.
+        tau : float
+            Polarisation tilt in degree for P.838, 45 for circular
+        """
         self.station = station
-        self.h_rain = itur.models.itu839.rain_height(
+        self.h_rain = itu_cache.rain_height(
             self.station.lat,
             self.station.lon
-        ).value
+        )
         self.a = a
         self.b = b
+        self.tau = tau
+        self._band_cache = {}
         
     def _rain_path_len(self, elevation: float):
         """Calculate the rain path lenght at elevation
@@ -27,26 +40,77 @@ class _rain_core:
         el_rad = np.radians(elevation)
         return (self.h_rain - self.station.height) / np.sin(el_rad)
 
-    def attenuation_saunders(self, elevation: float, rain_rate):
-        """Calculation attenuation based on, equations in Saunders."""
-        if self.a is None or self.b is None:
-            raise ValueError("You need to set a and b constants")
-        
+    def coefficients(self, elevation, freq=None):
+        """Coefficients (k, α) of the specific attenuation k R^α
+
+        Parameters
+        -----
+        elevation : float | np.ndarray
+            Elevation in degrees
+        freq : None | float | np.ndarray
+            Frequency in GHz. If None `a` and `b` are used, unless
+            they are None, then P.838 at the frequency of the station.
+        """
+        if freq is None:
+            if self.a is not None and self.b is not None:
+                return self.a, self.b
+            freq = self.station.freq
+        if self.tau != 45:
+            return itu_cache.rain_coefficients(freq, elevation, self.tau)
+
+        # Circular polarisation does not depend on the elevation, so
+        # the coefficients of every band are kept on the model
+        if np.ndim(freq) == 0:
+            return self._band_coefficients(float(freq))
+        freq = np.asarray(freq, dtype=float)
+        k, alpha = np.array([self._band_coefficients(band)
+                             for band in freq.ravel().tolist()]).T
+        return k.reshape(freq.shape), alpha.reshape(freq.shape)
+
+    def _band_coefficients(self, freq: float) -> tuple:
+        """Circular P.838 coefficients (k, α) at `freq` GHz"""
+        if freq not in self._band_cache:
+            self._band_cache[freq] = itu_cache.rain_coefficients(freq, 90, 45)
+        return self._band_cache[freq]
+
+    def attenuation_saunders(self, elevation: float, rain_rate, freq=None):
+        """Calculation attenuation based on, equations in Saunders.
+
+        With `freq` in GHz the P.838 coefficients of each frequency are
+        used, broadcast against `elevation` and `rain_rate`.
+        """
         slant_range = self._rain_path_len(elevation)
+        k, alpha = self.coefficients(elevation, freq)
         
-        att_pr_km = self.a*rain_rate**(self.b)
+        att_pr_km = k*rain_rate**(alpha)
         return att_pr_km*slant_range
     
 
-    def eqv_attenuation(self, rain_rate):
+    def eqv_attenuation(self, rain_rate, freq=None):
         """Find eqv attenuation across all elevations of the ground
         station.
+
+        As the attenuation is linear in the slant range, it is found
+        from the cached mean of 1/sin(elevation) of the station, and
+        `rain_rate` may be an array of rain rates. P.838 coefficients
+        only depend on the elevation for non circular polarisation,
+        which is then summed over the elevation bins.
         """
+        rain_rate = np.asarray(rain_rate)
+        height = self.h_rain - self.station.height
+        circular = self.tau == 45 or (freq is None and self.a is not None
+                                      and self.b is not None)
+        if circular:
+            k, alpha = self.coefficients(90, freq)
+            return k*rain_rate**alpha*height*self.station.inv_sin_el
+
         if self.station.el_distribution is None:
             raise ValueError("Missing elevation distribution from station")
-        
-        elevations, percentages = self.station.el_distribution
-
-        attenuations = np.array([
-            self.attenuation_saunders(i, rain_rate) for i in elevations])
-        return np.sum(attenuations*percentages)
\ No newline at end of file
+        elevations, prob = self.station.el_distribution
+        # Bands and rain rates broadcast, the elevation bins trail
+        freq, rain_rate = np.broadcast_arrays(np.asarray(
+            self.station.freq if freq is None else freq, dtype=float),
+            rain_rate)
+        k, alpha = self.coefficients(elevations, freq[..., None])
+        weight = prob/np.sin(np.radians(elevations))
+        return np.sum(weight*k*rain_rate[..., None]**alpha, axis=-1)*height
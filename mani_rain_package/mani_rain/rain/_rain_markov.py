@@ -1,55 +1,753 @@
+import threading
+from bisect import bisect_right
+from math import log, log1p
 import numpy as np
 import mani_rain
 from mani_rain.rain._rain_core import _rain_core
 
 class markov_base:
-    def __init__(self, model: np.ndarray, states: np.ndarray):
+    """Markov rain model
+
+    The transition tables are read only once built and may be shared by
+    any number of threads. The `state` and `rng` of the model itself
+    make it a single chain, which must not be drawn from concurrently,
+    use a handle from `chain` per caller instead.
+    """
+
+    def __init__(self, model: np.ndarray, states: np.ndarray,
+                 csr: tuple = None):
+        """Parameters
+        -----
+        model : np.ndarray | None
+            Dense transition matrix, may be None if `csr` is given
+        states : np.ndarray
+            Rain rate of each state in mm per minute
+        csr : None | tuple
+            Sparse transition table as (row pointers, column indices,
+            cumulative probabilities) like written by `save_sparse`
+        """
         self.state = 0
-        self.states = states
-        self.model = model
+        self.states = _read_only(states)
+        self._model = model
         self.s_range = np.arange(len(self.states))
         self.rng = np.random.default_rng()
+        if csr is None:
+            csr = self._dense_to_csr(model)
+        # Plain array views, slicing memory maps is much slower
+        self._indptr, self._indices, self._cdf = (_read_only(i) for i in csr)
+        self._run_table_cache = None
+        self._flat_cdf_cache = None
+        self._analysis_cache = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def base(self) -> "markov_base":
+        """The model itself, see `markov_chain.base`"""
+        return self
+
+    def chain(self, seed=None, initial_state: int = 0) -> "markov_chain":
+        """New chain drawing from this model, with its own state and
+        generator, see `markov_chain`"""
+        return markov_chain(self, seed, initial_state)
 
     @staticmethod
-    def from_file(model_path:str, states_path: str) -> "markov_base":
+    def from_file(model_path:str, states_path: str,
+                  mmap_mode: str = None) -> "markov_base":
         """"Import model from external .npy files."""
-        model = np.load(model_path)
+        model = np.load(model_path, mmap_mode=mmap_mode)
         states = np.load(states_path)
 
         return markov_base(model, states)
 
-    def draw_rain(self):
+    @staticmethod
+    def from_sparse(prefix: str, states_path: str,
+                    mmap_mode: str = "r") -> "markov_base":
+        """Import a model written by `save_sparse`, the tables are memory
+        mapped by default, so only the rows visited are read."""
+        csr = tuple(np.load(f"{prefix}_{name}.npy", mmap_mode=mmap_mode)
+                    for name in ("indptr", "indices", "cdf"))
+        states = np.load(states_path)
+
+        return markov_base(None, states, csr)
+
+    def save(self, model_path: str, states_path: str):
+        """Write the model in the .npy format of `rain/models`"""
+        np.save(model_path, np.asarray(self.model, dtype=np.float32))
+        np.save(states_path, self.states)
+
+    @classmethod
+    def fit(cls, rain_series, window: int = 6, rounding: int = 2,
+            time: np.ndarray = None, step: float = 60) -> "markov_base":
+        """Train a model from a rain gauge series.
+
+        The series is smoothed with a moving average over `window`
+        samples and rounded to `rounding` decimals, every distinct
+        value becomes a state, and the transitions between consecutive
+        samples are counted and normalised per row.
+
+        Parameters
+        -----
+        rain_series : np.ndarray | iterable
+            Rain per sample in mm, e.g. per minute to match the bundled
+            models. Either one array, or an iterable of chunks which
+            are each an array or a (time, values) tuple.
+        window : int
+            Moving average window in samples
+        rounding : int
+            Decimals the moving average is rounded to
+        time : None | np.ndarray
+            Timestamps of `rain_series` in seconds. Missing samples on
+            the `step` grid are filled with 0, as DMI does not report
+            1 minute values while it is dry.
+        step : float
+            Sample period in seconds, used for the gap filling
+
+        Returns
+        -----
+        model : markov_base
+        """
+        if isinstance(rain_series, np.ndarray):
+            rain_series = [rain_series if time is None
+                           else (time, rain_series)]
+
+        scale = 10**rounding
+        tail = np.zeros(0)
+        next_idx = None
+        prev_key = None
+        transitions = []
+        for values in rain_series:
+            if isinstance(values, tuple):
+                chunk_time, values = (np.asarray(i) for i in values)
+                idx = np.rint(chunk_time / step).astype(np.int64)
+                if len(idx) == 0:
+                    continue
+                if next_idx is None:
+                    next_idx = idx[0]
+                keep = idx >= next_idx
+                values = values[keep]
+                idx = idx[keep] - next_idx
+                if len(idx) == 0:
+                    continue
+                filled = np.zeros(idx[-1] + 1)
+                filled[idx] = values
+                next_idx += len(filled)
+                values = filled
+
+            values = np.concatenate([tail, np.asarray(values, dtype=float)])
+            tail = values[max(len(values) - (window - 1), 0):]
+            if len(values) < window:
+                continue
+            mean = np.convolve(values, np.ones(window)/window, mode="valid")
+            keys = np.rint(mean*scale).astype(np.int64)
+
+            if prev_key is not None:
+                transitions.append((np.array([prev_key]), keys[:1],
+                                    np.ones(1, dtype=np.int64)))
+            prev_key = keys[-1]
+
+            local, inverse = np.unique(keys, return_inverse=True)
+            n_local = len(local)
+            counts = np.bincount(inverse[:-1]*n_local + inverse[1:],
+                                 minlength=n_local*n_local)
+            pairs = np.flatnonzero(counts)
+            transitions.append((local[pairs // n_local],
+                                local[pairs % n_local], counts[pairs]))
+
+        if prev_key is None:
+            raise ValueError("Rain series is shorter than the window")
+
+        src, dst, counts = (np.concatenate(i) for i in zip(*transitions))
+        keys = np.unique(np.concatenate([src, dst, [prev_key]]))
+        n_states = len(keys)
+        pair = np.searchsorted(keys, src)*n_states + np.searchsorted(keys, dst)
+        model = np.bincount(pair, weights=counts,
+                            minlength=n_states*n_states).reshape(n_states,
+                                                                n_states)
+        total = model.sum(axis=1, keepdims=True)
+        model = np.divide(model, total, out=np.zeros_like(model),
+                          where=total > 0)
+
+        return cls(model.astype(np.float32), keys / scale)
+
+    def save_sparse(self, prefix: str):
+        """Write the sparse transition table as `<prefix>_indptr.npy`,
+        `<prefix>_indices.npy` and `<prefix>_cdf.npy`.
+
+        Converting a dense model is done by
+        `markov_base.from_file(model, states).save_sparse(prefix)`.
+        """
+        np.save(f"{prefix}_indptr.npy", self._indptr)
+        np.save(f"{prefix}_indices.npy", self._indices)
+        np.save(f"{prefix}_cdf.npy", self._cdf)
+
+    @staticmethod
+    def _dense_to_csr(model: np.ndarray) -> tuple:
+        """Sparse cumulative transition table of a dense matrix.
+
+        Rows are normalised to sum to exactly 1, rows without any
+        transitions are treated as absorbing.
+        """
+        model = np.asarray(model, dtype=np.float64)
+        n_states = len(model)
+        total = model.sum(axis=1)
+        empty = total <= 0
+        if np.any(empty):
+            model = model.copy()
+            model[empty, np.flatnonzero(empty)] = 1.0
+            total[empty] = 1.0
+
+        rows, indices = np.nonzero(model)
+        prob = model[rows, indices] / total[rows]
+        counts = np.bincount(rows, minlength=n_states)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        cumulative = np.cumsum(prob)
+        row_start = np.concatenate([[0.0], cumulative])[indptr[:-1]]
+        cdf = cumulative - np.repeat(row_start, counts)
+        cdf[indptr[1:] - 1] = 1.0
+        return indptr, indices.astype(np.int32), cdf
+
+    @property
+    def model(self) -> np.ndarray:
+        """Dense transition matrix, built from the sparse table if the
+        model was loaded with `from_sparse`"""
+        if self._model is None:
+            self._model = self.transition
+        return self._model
+
+    @property
+    def transition(self) -> np.ndarray:
+        """Dense transition matrix with rows normalised to 1, as it is
+        sampled"""
+        if "transition" not in self._analysis_cache:
+            n_states = len(self.states)
+            transition = np.zeros((n_states, n_states))
+            transition[self._row_of_entry(), self._indices] = self._entry_prob()
+            self._analysis_cache["transition"] = transition
+        return self._analysis_cache["transition"]
+
+    def _row_of_entry(self) -> np.ndarray:
+        """Row index of every entry of the sparse table"""
+        return np.repeat(self.s_range, np.diff(self._indptr))
+
+    def _entry_prob(self) -> np.ndarray:
+        """Transition probability of every entry of the sparse table"""
+        prob = np.diff(self._cdf, prepend=0.0)
+        prob[self._indptr[:-1]] = self._cdf[self._indptr[:-1]]
+        return prob
+
+    def stationary(self) -> np.ndarray:
+        """Stationary distribution of the states, the long run fraction
+        of time spent in each state. Computed once per model."""
+        if "stationary" not in self._analysis_cache:
+            n_states = len(self.states)
+            system = self.transition.T - np.eye(n_states)
+            system[-1] = 1.0
+            rhs = np.zeros(n_states)
+            rhs[-1] = 1.0
+            dist = np.linalg.lstsq(system, rhs, rcond=None)[0]
+            dist = np.clip(dist, 0, None)
+            self._analysis_cache["stationary"] = dist / dist.sum()
+        return self._analysis_cache["stationary"]
+
+    def _matrix_power(self, n: int) -> np.ndarray:
+        """Transition matrix to the power `n` by repeated squaring, the
+        squares are cached"""
+        squares = self._analysis_cache.setdefault("squares",
+                                                  [self.transition])
+        result = np.eye(len(self.states))
+        bit = 0
+        while n:
+            if bit >= len(squares):
+                with self._lock:
+                    while bit >= len(squares):
+                        squares.append(squares[-1] @ squares[-1])
+            if n & 1:
+                result = result @ squares[bit]
+            n >>= 1
+            bit += 1
+        return result
+
+    def distribution(self, n: int, initial=None) -> np.ndarray:
+        """State distribution after `n` steps
+
+        Parameters
+        -----
+        n : int
+            Number of steps
+        initial : None | int | np.ndarray
+            Start state or distribution, defaults to the current state
+
+        Returns
+        -----
+        dist : np.ndarray
+            Probability of each state
+        """
+        if initial is None:
+            initial = self.state
+        if np.ndim(initial) == 0:
+            initial = np.eye(len(self.states))[initial]
+        return initial @ self._matrix_power(n)
+
+    def mean_sojourn(self) -> np.ndarray:
+        """Expected number of consecutive steps spent in each state once
+        entered, inf for absorbing states"""
+        stay = np.diag(self.transition)
+        with np.errstate(divide="ignore"):
+            return 1 / (1 - stay)
+
+    def mean_first_passage(self, target) -> np.ndarray:
+        """Expected number of steps from each state until the chain
+        first enters a state in `target`, 0 for the target states
+        themselves and inf where a target can not be reached."""
+        target = np.isin(self.s_range, target)
+        other = ~target
+        steps = np.zeros(len(self.states))
+
+        # States that can reach the target, found by backwards search
+        reach = target.copy()
+        while True:
+            grown = reach | (self.transition[:, reach].sum(axis=1) > 0)
+            if np.array_equal(grown, reach):
+                break
+            reach = grown
+        steps[~reach] = np.inf
+
+        solve = other & reach
+        system = np.eye(solve.sum()) - self.transition[np.ix_(solve, solve)]
+        steps[solve] = np.linalg.solve(system, np.ones(solve.sum()))
+        return steps
+
+    def lump(self, groups) -> "markov_base":
+        """Model of the chain observed through groups of states
+
+        The transitions of a group are those of its states weighted by
+        their stationary probability, so every group keeps the
+        stationary probability and mean sojourn time it has in the full
+        chain. The rain rate of a group is the stationary mean of the
+        rain rates of its states.
+
+        Parameters
+        -----
+        groups : array_like
+            Group of every state, numbered from 0
+
+        Returns
+        -----
+        model : markov_base
+            Model with a state per group
+        """
+        groups = np.asarray(groups, dtype=np.intp)
+        n_groups = groups.max() + 1
+        stationary = self.stationary()
+        # Groups never visited in the long run use the plain mean of
+        # their rows, to still give a valid model
+        visited = np.bincount(groups, stationary, minlength=n_groups) > 0
+        weight = np.where(visited[groups], stationary, 1.0)
+        total = np.bincount(groups, weight, minlength=n_groups)
+
+        rows = self._row_of_entry()
+        pair = groups[rows]*n_groups + groups[self._indices]
+        model = np.bincount(pair, weight[rows]*self._entry_prob(),
+                            minlength=n_groups*n_groups)
+        model = model.reshape(n_groups, n_groups) / total[:, None]
+        states = np.bincount(groups, weight*self.states,
+                             minlength=n_groups) / total
+        return markov_base(model, states)
+
+    def reduce(self, link, elevation: float = 30, dist: float = None,
+               tol: float = 0.1, by: str = "attenuation"):
+        """Merge states with the same effect on a link, see `lump`
+
+        States are merged in order of rain rate, as long as the effect
+        of every state in a group is within `tol` of the lightest one.
+
+        Parameters
+        -----
+        link : link_budget_markov | link_budget_itu
+            Link the effect is evaluated on, any model of the link is
+            ignored as the rain rates of the states are used
+        elevation : float
+            Reference elevation in degree
+        dist : None | float
+            Reference distance from GS to SC in metres, needed for
+            `by="modcod"`, and with it the report includes the outage
+            probability and expected rate
+        tol : float
+            Largest difference of rain attenuation in dB
+        by : str
+            "attenuation" to merge by rain attenuation at `elevation`,
+            "modcod" to merge states with the same DVB-S2 ModCod at
+            `elevation` and `dist`
+
+        Returns
+        -----
+        model : markov_base
+            Reduced model, write it with `save`
+        report : dict
+            Size of the models and the error of the reduction
+        """
+        rain_rate = self.states * 60
+        attenuation = link.rain_model.attenuation_saunders(elevation,
+                                                           rain_rate)
+        if by == "attenuation":
+            effect = attenuation
+        elif by == "modcod":
+            if dist is None:
+                raise ValueError("dist is needed to merge by ModCod")
+            snr = link.snr_batch(dist, elevation, rain_rate)
+            effect, tol = link.dvb.best_modcod_index(snr), 0
+        else:
+            raise ValueError(f"Unknown effect {by!r}")
+
+        order = np.argsort(rain_rate, kind="stable")
+        groups = np.empty(len(order), dtype=np.intp)
+        group, first = 0, order[0]
+        for state in order:
+            if abs(effect[state] - effect[first]) > tol:
+                group, first = group + 1, state
+            groups[state] = group
+        reduced = self.lump(groups)
+
+        stationary = self.stationary()
+        group_prob = np.bincount(groups, stationary)
+        # Mean sojourn of every group in the full chain, the
+        # probability of the group over the flow leaving it
+        leave = (groups[self._row_of_entry()] != groups[self._indices])
+        outflow = np.bincount(groups[self._row_of_entry()],
+                              stationary[self._row_of_entry()]
+                              * self._entry_prob()*leave,
+                              minlength=len(group_prob))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sojourn = group_prob / outflow
+            sojourn_error = np.abs(reduced.mean_sojourn()/sojourn - 1)
+        reduced_att = link.rain_model.attenuation_saunders(
+            elevation, reduced.states * 60)
+        att_error = np.abs(attenuation - reduced_att[groups])
+
+        report = {
+            "states": len(self.states),
+            "reduced_states": len(reduced.states),
+            "max_attenuation_error": float(np.max(att_error)),
+            "mean_attenuation_error": float(att_error @ stationary),
+            "stationary_error": float(np.max(np.abs(reduced.stationary()
+                                                    - group_prob))),
+            "sojourn_error": float(np.nanmax(np.where(np.isfinite(sojourn),
+                                                      sojourn_error, 0))),
+        }
+        if dist is not None:
+            for model, key in ((self, ""), (reduced, "reduced_")):
+                snr = link.snr_batch(dist, elevation, model.states * 60)
+                prob = model.stationary()
+                report[key + "outage_probability"] = float(
+                    (link.dvb.best_modcod_index(snr) < 0) @ prob)
+                report[key + "expected_rate"] = float(
+                    link.dvb.rate_at_esno(snr) @ prob)
+        return reduced, report
+
+    @property
+    def _run_tables(self):
+        """Tables of the run length sampler.
+
+        The log of the self transition probability of every state, and
+        for every state the cumulative exit distribution (the row
+        without its diagonal) with the states it leads to. Absorbing
+        states have a log stay probability of 0.
+        """
+        if self._run_table_cache is None:
+            indptr, indices, cdf = self._indptr, self._indices, self._cdf
+            rows = self._row_of_entry()
+
+            prob = self._entry_prob()
+            diagonal = indices == rows
+            stay = np.zeros(len(self.states))
+            stay[rows[diagonal]] = prob[diagonal]
+
+            exits = []
+            log_stay = []
+            for state in self.s_range:
+                row = slice(indptr[state], indptr[state + 1])
+                leave = ~diagonal[row]
+                leave_prob = prob[row][leave]
+                leave_total = leave_prob.sum()
+                if leave_total <= 0:
+                    exits.append(([1.0], [int(state)]))
+                    log_stay.append(0.0)
+                    continue
+                exit_cdf = np.cumsum(leave_prob) / leave_total
+                exit_cdf[-1] = 1.0
+                exits.append((exit_cdf.tolist(),
+                               indices[row][leave].tolist()))
+                log_stay.append(log(stay[state]) if stay[state] > 0
+                                else float("-inf"))
+            self._run_table_cache = (log_stay, exits)
+        return self._run_table_cache
+
+    @property
+    def _flat_cdf(self) -> np.ndarray:
+        """Sparse cumulative table with every row offset by its index"""
+        if self._flat_cdf_cache is None:
+            self._flat_cdf_cache = self._cdf + self._row_of_entry()
+        return self._flat_cdf_cache
+
+    def draw_rain(self, n: int = None):
         """Draw next sample from the markov model
         
+        Parameters
+        -----
+        n : None | int
+            Number of consecutive samples to draw. If None a single
+            sample is drawn.
+
         Returns
         -----
-        rain_rate_mmhr : float
-            Rain rate in mmhr⁻¹
+        rain_rate_mmhr : float | np.ndarray
+            Rain rate in mmhr⁻¹, an array of length `n` if `n` is given
         """
-        rain_state = self.rng.choice(self.s_range,
-                                        p=self.model[self.state])
-        
-        self.state = rain_state
-        rain_rate_mmhr = self.states[rain_state] * 60
-        return rain_rate_mmhr
+        if n is None:
+            row = slice(self._indptr[self.state],
+                        self._indptr[self.state + 1])
+            pos = np.searchsorted(self._cdf[row], self.rng.random(),
+                                  side="right")
+            rain_state = int(self._indices[row.start + pos])
 
-    
+            self.state = rain_state
+            rain_rate_mmhr = self.states[rain_state] * 60
+            return rain_rate_mmhr
+
+        states, lengths = self.draw_runs(n)
+        return np.repeat(self.states[states] * 60, lengths)
+
+    def draw_runs(self, n: int):
+        """Draw the next `n` samples run length encoded, continuing
+        the chain like `draw_rain`.
+
+        Returns
+        -----
+        states : np.ndarray
+            State of each run, consecutive runs differ in state
+        lengths : np.ndarray
+            Number of samples in each run, summing to `n`
+        """
+        states, lengths = self._draw_runs(n, self.state, self.rng)
+        if n > 0:
+            self.state = int(states[-1])
+        return states, lengths
+
+    def draw_trajectory(self, n_steps: int, n_chains: int = 1,
+                        seed=None, initial_state: int = None) -> np.ndarray:
+        """Draw independent rain trajectories from the markov model
+
+        The chains all start in `initial_state` and are advanced in
+        lockstep. The state of the model itself is left untouched.
+
+        Parameters
+        -----
+        n_steps : int
+            Number of samples in each trajectory
+        n_chains : int
+            Number of independent chains
+        seed : None | int | np.random.SeedSequence | np.random.Generator
+            Seed for the draw, if None the model's own generator is used
+        initial_state : None | int
+            Start state of the chains, defaults to the current state
+
+        Returns
+        -----
+        rain_rate_mmhr : np.ndarray
+            Rain rates in mmhr⁻¹ with shape (n_chains, n_steps)
+        """
+        rain_states = self.draw_states(n_steps, n_chains,
+                                              seed, initial_state)
+        return self.states[rain_states] * 60
+
+    def draw_states(self, n_steps: int, n_chains: int = 1, seed=None,
+                    initial_state: int = None) -> np.ndarray:
+        """State indices of `draw_trajectory`, shape (n_chains, n_steps)"""
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        if initial_state is None:
+            initial_state = self.state
+
+        rain_states = np.empty((n_chains, n_steps), dtype=np.intp)
+        if n_chains == 1 or n_steps > self._LOCKSTEP_STEPS:
+            # Long chains are faster to draw run by run
+            for chain in range(n_chains):
+                states, lengths = self._draw_runs(n_steps, initial_state, rng)
+                rain_states[chain] = np.repeat(states, lengths)
+            return rain_states
+
+        # Every row is offset by its index, so a single searchsorted over
+        # the flattened table samples all chains from their own rows.
+        flat_cdf = self._flat_cdf
+        indices = self._indices
+
+        state = np.full(n_chains, initial_state, dtype=np.intp)
+        block = max(1, self._BLOCK_SIZE // max(n_chains, 1))
+        for start in range(0, n_steps, block):
+            uniforms = rng.random((min(block, n_steps - start), n_chains))
+            for step, u in enumerate(uniforms, start):
+                pos = np.searchsorted(flat_cdf, state + u, side="right")
+                state = indices[pos]
+                rain_states[:, step] = state
+        return rain_states
+
+    _LOCKSTEP_STEPS = 512
+    """Longest trajectory for which chains are advanced in lockstep"""
+    _BLOCK_SIZE = 1 << 20
+    """Number of uniforms drawn at a time by the lockstep sampler"""
+
+    def _draw_runs(self, n: int, state: int, rng: np.random.Generator):
+        """Advance the chain `n` steps from `state`.
+
+        Instead of drawing every step, the number of steps the chain
+        stays in its current state is drawn from the geometric
+        distribution given by the diagonal, followed by the state it
+        leaves to. This is exact, and only costs work at state changes.
+
+        Returns
+        -----
+        states : np.ndarray
+            State of each run
+        lengths : np.ndarray
+            Number of steps in each run, summing to `n`
+        """
+        log_stay, exits = self._run_tables
+        states = []
+        lengths = []
+
+        state = int(state)
+        filled = 0
+        run = 0
+        block = 32
+        while filled < n:
+            # Runs are usually long, so start with a small block of draws
+            block = min(2*block, 4096)
+            uniforms = iter(rng.random(2*block).tolist())
+            for u_stay, u_exit in zip(uniforms, uniforms):
+                if log_stay[state] == 0:
+                    run = n - filled
+                else:
+                    run += int(log1p(-u_stay) / log_stay[state])
+
+                if filled + run >= n:
+                    states.append(state)
+                    lengths.append(n - filled)
+                    filled = n
+                    break
+                if run > 0:
+                    states.append(state)
+                    lengths.append(run)
+                    filled += run
+
+                exit_cdf, exit_states = exits[state]
+                state = exit_states[bisect_right(exit_cdf, u_exit)]
+                run = 1
+
+        return np.array(states, dtype=np.intp), np.array(lengths, dtype=np.intp)
+
+
+def _read_only(array) -> np.ndarray:
+    """Read only view of `array`, the array itself is left writeable"""
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
+
+
+class markov_chain:
+    """Chain drawing from a shared `markov_base`
+
+    Holds only the current state and a generator, the tables are those
+    of the model. Chains of the same model may be drawn from in
+    different threads at the same time, while each chain is used by one
+    thread. Every other attribute is read from the model, so a chain
+    can be used in place of the model, e.g. in `markov_rain`.
+    """
+
+    def __init__(self, base: markov_base, seed=None, initial_state: int = 0):
+        """Parameters
+        -----
+        base : markov_base
+            Model to draw from
+        seed : None | int | np.random.SeedSequence | np.random.Generator
+            Seed of the generator of the chain
+        initial_state : int
+            State the chain starts in
+        """
+        self.base = base
+        self.state = int(initial_state)
+        self.rng = np.random.default_rng(seed)
+        # Tables used per draw, bound directly to skip the lookup
+        self.states = base.states
+        self._indptr, self._indices, self._cdf = (base._indptr, base._indices,
+                                                  base._cdf)
+
+    def __getattr__(self, name):
+        if name == "base" or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def chain(self, seed=None, initial_state: int = None) -> "markov_chain":
+        """New chain of the same model, by default in the current state
+        of this chain"""
+        if initial_state is None:
+            initial_state = self.state
+        return markov_chain(self.base, seed, initial_state)
+
+    # The samplers of the model, run on the state and generator of the
+    # chain
+    draw_rain = markov_base.draw_rain
+    draw_runs = markov_base.draw_runs
+    draw_trajectory = markov_base.draw_trajectory
+    draw_states = markov_base.draw_states
+    distribution = markov_base.distribution
 
 
 class markov_rain(_rain_core):
     def __init__(self, station, 
-                 rain_model: markov_base,
-                 a=0.187, b=1.099):
-        super().__init__(station, a, b)
+                 rain_model: "markov_base | markov_chain",
+                 a=0.187, b=1.099, tau=45):
+        super().__init__(station, a, b, tau)
         self.rain_model = rain_model
 
-    def attenuation_saunders(self, elevation, rain_rate = None):
+    def attenuation_saunders(self, elevation, rain_rate = None, freq=None):
         if rain_rate is None:
             rain_rate = self.rain_model.draw_rain()
-        return super().attenuation_saunders(elevation, rain_rate)
+        return super().attenuation_saunders(elevation, rain_rate, freq)
     
-    def eqv_attenuation(self, rain_rate = None):
+    def draw_rain(self, shape=None):
+        """Draw consecutive rain rates from the markov chain, filling an
+        array of `shape` in C order."""
+        if shape is None:
+            return self.rain_model.draw_rain()
+        return self.rain_model.draw_rain(int(np.prod(shape))).reshape(shape)
+
+    def eqv_attenuation(self, rain_rate = None, freq=None):
         if rain_rate is None:
             rain_rate = self.rain_model.draw_rain()
             
-        return super().eqv_attenuation(rain_rate)
+        return super().eqv_attenuation(rain_rate, freq)
+
+    def draw_runs(self, n: int):
+        """Draw `n` consecutive samples as runs of constant rain
+
+        Returns
+        -----
+        start : np.ndarray
+            First sample of each run
+        duration : np.ndarray
+            Number of samples in each run
+        rain_rate : np.ndarray
+            Rain rate of each run in mmhr⁻¹
+        """
+        states, lengths = self.rain_model.draw_runs(n)
+        start = np.cumsum(lengths) - lengths
+        return start, lengths, self.rain_model.states[states] * 60
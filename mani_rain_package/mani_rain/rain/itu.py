@@ -3,14 +3,160 @@ Rain attenuation models based upon ITU models
 
 """
 #%%
+import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import Literal
 import numpy as np
-import itur
 from mani_rain._core import station_t
+from mani_rain.rain import itu_cache
 from mani_rain.rain._rain_core import _rain_core
 
+class itu_surrogate:
+    """Interpolation of the ITU-R P.618 rain attenuation of one station
+    over elevation and outage probability.
+
+    The attenuation is tabulated once on a grid uniform in sqrt(el)
+    and log(p), and interpolated bilinearly in log(A). This follows the
+    elevation and probability dependence of P.618 closely, and is
+    monotone in both elevation and p between grid points, like the
+    exact model. P.618 rises steeply in the last fraction of a degree
+    below zenith, so the grid stops at 89.5°. Points outside the grid
+    are evaluated with the exact model.
+    """
+
+    def __init__(self, station: station_t, el_range=None,
+                 p_range=(1e-3, 5), shape=(97, 64)):
+        """
+        Parameters
+        -----
+        station : station_t
+          Station object
+        el_range : None | tuple
+          Elevation range in degree covered by the grid, defaults to
+          the range of the station's elevation distribution, or 5° to
+          89.5° without one, and never extends above 89.5°
+        p_range : tuple
+          Range of p in % covered by the grid
+        shape : tuple
+          Number of grid points along elevation and p
+        """
+        self.station = station
+        if el_range is None:
+            el_range = self.default_el_range(station)
+        el_range = (float(el_range[0]), min(float(el_range[1]), 89.5))
+        self.el_range = el_range
+        self.p_range = p_range
+        n_el, n_p = shape
+        self._x = np.linspace(*np.sqrt(el_range), n_el)
+        self._y = np.linspace(*np.log(p_range), n_p)
+        self._dx = self._x[1] - self._x[0]
+        self._dy = self._y[1] - self._y[0]
+
+        self._log_att = self._log_exact(self._x, self._y)
+
+        self.max_error, self.max_rel_error = self._check()
+        """Bound of the absolute error in dB, and of the relative
+        error, against the exact model. The error inside a cell is
+        bounded by the errors at the midpoints of its edges along
+        elevation and along p, which holds while the curvature of
+        log(A) varies little within a cell. Points outside the grid are
+        exact."""
+
+    @staticmethod
+    def default_el_range(station: station_t) -> tuple:
+        """Elevation range of the station's elevation distribution from
+        0.5°, or 5° to 89.5° without one"""
+        if station.el_distribution is None:
+            return (5, 89.5)
+        return station.el_cached("surrogate_el_range", lambda el, prob:
+                                 (max(float(np.min(el)), 0.5),
+                                  float(np.max(el))))
+
+    @property
+    def elevations(self) -> np.ndarray:
+        """Elevations of the grid in degree"""
+        return self._x**2
+
+    @property
+    def ps(self) -> np.ndarray:
+        """p of the grid in %"""
+        return np.exp(self._y)
+
+    def _exact(self, elevation, p):
+        return itu_cache.rain_attenuation(
+            self.station.lat, self.station.lon, self.station.freq,
+            elevation, self.station.height, p)
+
+    def _log_exact(self, x, y) -> np.ndarray:
+        """log(A) of the exact model on the grid of sqrt(el) `x` and
+        log(p) `y`, with shape (x, y)"""
+        # itur evaluates the (p, elevation) grid in a single call, and
+        # drops the axes of length 1
+        att = np.reshape(self._exact(x**2, np.exp(y)), (len(y), len(x)))
+        return np.log(np.maximum(att.T, 1e-12))
+
+    def _check(self) -> tuple:
+        x = (self._x[1:] + self._x[:-1])/2
+        y = (self._y[1:] + self._y[:-1])/2
+        z = self._log_att
+        # Errors in log(A) at the midpoints of the edges along elevation,
+        # and along p
+        error_x = np.abs((z[1:] + z[:-1])/2 - self._log_exact(x, self._y))
+        error_y = np.abs((z[:, 1:] + z[:, :-1])/2 - self._log_exact(self._x, y))
+        bound = (np.maximum(error_x[:, 1:], error_x[:, :-1])
+                 + np.maximum(error_y[1:], error_y[:-1]))
+        corner = np.exp(np.maximum(np.maximum(z[1:, 1:], z[1:, :-1]),
+                                   np.maximum(z[:-1, 1:], z[:-1, :-1])))
+        rel_error = np.expm1(bound)
+        return float(np.max(corner*rel_error)), float(np.max(rel_error))
+
+    def __call__(self, elevation, p):
+        """Rain attenuation in dB exceeded for `p` % of the time.
+
+        `elevation` and `p` are broadcast against each other. Values
+        outside `el_range` or `p_range` are evaluated with the exact
+        model, one itur call per distinct p among them.
+        """
+        elevation, p = np.broadcast_arrays(np.asarray(elevation, dtype=float),
+                                           np.asarray(p, dtype=float))
+        el = np.clip(elevation, *self.el_range)
+        p_grid = np.clip(p, *self.p_range)
+        fx = (np.sqrt(el) - self._x[0])/self._dx
+        fy = (np.log(p_grid) - self._y[0])/self._dy
+        i = np.clip(fx.astype(int), 0, len(self._x) - 2)
+        j = np.clip(fy.astype(int), 0, len(self._y) - 2)
+        tx = np.clip(fx - i, 0, 1)
+        ty = np.clip(fy - j, 0, 1)
+
+        z = self._log_att
+        log_att = ((1 - tx)*((1 - ty)*z[i, j] + ty*z[i, j + 1])
+                   + tx*((1 - ty)*z[i + 1, j] + ty*z[i + 1, j + 1]))
+        att = np.asarray(np.exp(log_att))
+
+        outside = (el != elevation) | (p_grid != p)
+        if np.any(outside):
+            att[outside] = _attenuation_618(self.station, elevation[outside],
+                                            p[outside])
+        return float(att) if att.ndim == 0 else att
+
+
+def _attenuation_618(station: station_t, elevation, p) -> np.ndarray:
+    """Exact P.618 attenuation of `station` with `elevation` and `p`
+    broadcast against each other, one itur call per distinct p"""
+    elevation, p = np.broadcast_arrays(np.asarray(elevation, dtype=float),
+                                       np.asarray(p, dtype=float))
+    att = np.full(elevation.shape, np.nan)
+    for value in np.unique(p):
+        point = p == value
+        att[point] = np.reshape(itu_cache.rain_attenuation(
+            station.lat, station.lon, station.freq, elevation[point],
+            station.height, value), -1)
+    return att
+
+
 class rain_itu(_rain_core):
-    def __init__(self, station: station_t, p: float, a = 0.187, b = 1.099 ):
+    def __init__(self, station: station_t, p: float, a = 0.187, b = 1.099,
+                 tau = 45):
         """
         Parameters
         -----
@@ -22,17 +168,21 @@ class rain_itu(_rain_core):
           Rain probability Constant
         b : float | None
           Rain probability constant.        
+        tau : float
+          Polarisation tilt in degree, used if `a` and `b` are None
         """
-        super().__init__(station, a, b)
+        super().__init__(station, a, b, tau)
         self._p = p
+        self._surrogate = None
+        self._surrogate_key = None
         self.rain_rate = self._itu_rainrate()
         
     def _itu_rainrate(self):
-        return itur.models.itu837.rainfall_rate(
+        return itu_cache.rainfall_rate(
             self.station.lat,
             self.station.lon,
             self._p
-        ).value
+        )
 
     @property
     def p(self):
@@ -43,26 +193,38 @@ class rain_itu(_rain_core):
         self._p = p
         self.rain_rate = self._itu_rainrate()
     
-    def attenuation_itu(self, elevation: float, p=None):
+    @property
+    def surrogate(self) -> itu_surrogate:
+        """Interpolation surrogate of `attenuation_itu`, built on first
+        use and again when the position, frequency or elevation
+        distribution of the station change"""
+        station = self.station
+        key = (station.lat, station.lon, station.freq, station.height,
+               itu_surrogate.default_el_range(station))
+        if key != self._surrogate_key:
+            self._surrogate = itu_surrogate(station)
+            self._surrogate_key = key
+        return self._surrogate
+
+    def attenuation_itu(self, elevation: float, p=None, exact: bool = True):
         """Calculate Rain attenuation, for a given elevation, with the
         option for Saunders or itu.
         
-        if `rainrate` is left as None the average exceeded rate for p is used, 
+        if `p` is left as None `self.p` is used. `elevation` and `p` are
+        broadcast against each other. With `exact=False` the
+        attenuation is interpolated by `surrogate`, which is accurate
+        to `surrogate.max_error` dB.
         """
         if p is None:
             p = self._p
+        if not exact:
+            return self.surrogate(elevation, p)
 
-        att = itur.models.itu618.rain_attenuation(
-            self.station.lat,
-            self.station.lon,
-            self.station.freq,
-            elevation,
-            self.station.height,
-            p
-        ).value
-        return att
+        att = _attenuation_618(self.station, elevation, p)
+        return float(att) if att.ndim == 0 else att
         
-    def attenuation_saunders(self, elevation: float, rain_rate=None):
+    def attenuation_saunders(self, elevation: float, rain_rate=None,
+                             freq=None):
         """Rain attenuation calculated, based on Saunders
         
         **Note** if `rain_rate=0`, the itu rain_rate based on
@@ -70,25 +232,99 @@ class rain_itu(_rain_core):
         """
         if rain_rate is None:
             rain_rate = self.rain_rate
-        return super().attenuation_saunders(elevation, rain_rate)
+        return super().attenuation_saunders(elevation, rain_rate, freq)
+
+    def eqv_attenuation(self, rain_rate=None, freq=None):
+        """Eqv. Saunders attenuation across all elevations of the
+        station, defaults to the itu rain_rate based on `self.p`."""
+        if rain_rate is None:
+            rain_rate = self.rain_rate
+        return super().eqv_attenuation(rain_rate, freq)
 
-    def eqv_attenuation_itu(self, p):
+    def eqv_attenuation_itu(self, p=None, exact: bool = True):
         """Find eqv attenuation across all elevations of the ground
         station.
         
         **Note** this is based on ITU 618, and the probability of
-        outage.
+        outage `p`, which defaults to `self.p`. See `attenuation_itu`
+        for `exact`.
         """
         if self.station.el_distribution is None:
             raise ValueError("Missing elevation distribution from station")
         
         elevations, percentages = self.station.el_distribution
+        if p is None:
+            p = self._p
+        if not exact:
+            att = self.surrogate(np.asarray(elevations)[None, :],
+                                 np.ravel(p)[:, None]) @ percentages
+        else:
+            att = _eqv_itu(self.station, np.ravel(p))
+        return float(att[0]) if np.ndim(p) == 0 else att.reshape(np.shape(p))
 
-        attenuations = np.array([
-            self.attenuation_itu(i) for i in elevations
-        ])
-            
-        return np.sum(attenuations*percentages)
-        
 
+def _eqv_itu(station: station_t, p: np.ndarray) -> np.ndarray:
+    """Eqv. P.618 attenuation of `station` at each of the 1-d `p`, from
+    a single itur call over the elevation bins and `p`"""
+    elevations, percentages = station.el_distribution
+    att = itu_cache.rain_attenuation(station.lat, station.lon, station.freq,
+                                     elevations, station.height, p)
+    # itur drops the axes of length 1
+    return np.reshape(att, (len(p), len(elevations))) @ percentages
+
+
+def _eqv_itu_task(args):
+    return _eqv_itu(*args)
+
+
+_POOL_MIN = 1 << 22
+"""Points of (station, p, elevation) from which `eqv_attenuation_curves`
+uses a process pool by default, as each worker first loads the itur
+maps"""
+_P_BLOCK = 256
+"""Probabilities evaluated per task of the process pool"""
+
+
+def eqv_attenuation_curves(stations, p, workers: int = None):
+    """Eqv. ITU-R P.618 attenuation of several stations over outage
+    probabilities, e.g. for availability curves
+
+    Every station is evaluated over all its elevation bins and
+    probabilities with a single itur call. Large sweeps are split by
+    station and blocks of `p` over a process pool.
+
+    Parameters
+    -----
+    stations : list
+      Stations with elevation distributions
+    p : array_like
+      Outage probabilities in %
+    workers : None | int
+      Number of processes, by default a pool of the CPU count is only
+      used for more than `_POOL_MIN` points. With 1 everything runs in
+      this process.
+
+    Returns
+    -----
+    attenuation : np.ndarray
+      Eqv. attenuation in dB with shape (station, p)
+    """
+    p = np.atleast_1d(np.asarray(p, dtype=float)).ravel()
+    for station in stations:
+        if station.el_distribution is None:
+            raise ValueError("Missing elevation distribution from station")
+
+    tasks = [(station, p[start:start + _P_BLOCK]) for station in stations
+             for start in range(0, len(p), _P_BLOCK)]
+    if workers is None:
+        points = sum(len(block)*len(station.el_distribution[0])
+                     for station, block in tasks)
+        workers = (os.cpu_count() or 1) if points >= _POOL_MIN else 1
+    workers = max(1, min(workers, len(tasks)))
 
+    if workers == 1:
+        results = [_eqv_itu_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_eqv_itu_task, tasks))
+    return np.concatenate(results).reshape(len(stations), len(p))
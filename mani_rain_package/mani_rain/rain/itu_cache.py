@@ -0,0 +1,291 @@
+"""
+Memoization of itur model calls
+
+Results of the ITU-R models are kept in an in-process LRU cache, and
+optionally in an on-disk sqlite store shared between runs. The disk
+store is enabled with `enable_disk_cache`, or by setting the
+`MANI_RAIN_CACHE_DIR` environment variable.
+
+`itur` itself is only imported once a result is not found in the cache,
+as loading its maps dominates the start up time of the package.
+
+The cache may be used from several threads, every thread gets its own
+sqlite connection, and a forked process opens new ones.
+"""
+import os
+import sqlite3
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from importlib import metadata
+import importlib
+import numpy as np
+
+
+class itu_cache:
+    """LRU cache of itur results with an optional sqlite store."""
+
+    def __init__(self, maxsize: int = 4096, path: str = None,
+                 max_bytes: int = 64 << 20):
+        """Parameters
+        -----
+        maxsize : int
+          Number of results kept in memory
+        path : str | None
+          sqlite file of the disk store, None disables it
+        max_bytes : int
+          Size of stored results, above which the least recently
+          used results are evicted from the disk store
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._path = None
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        try:
+            self._version = metadata.version("itur")
+        except metadata.PackageNotFoundError:
+            self._version = "unknown"
+        if path is not None:
+            self.open(path)
+
+    def _reset(self):
+        """New lock and no connections, also run in a forked child, where
+        the connections of the parent must not be used"""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+
+    @property
+    def _db(self):
+        """sqlite connection of the calling thread, None without disk
+        store"""
+        if self._path is None:
+            return None
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Only used by this thread, but closed by any in `close`
+            db = sqlite3.connect(self._path, timeout=30,
+                                 check_same_thread=False)
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def open(self, path: str):
+        """Use the sqlite file at `path` as disk store"""
+        self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._db.execute("CREATE TABLE IF NOT EXISTS itur ("
+                         "key TEXT PRIMARY KEY, shape TEXT, "
+                         "value BLOB, used REAL)")
+        self._db.commit()
+
+    def close(self):
+        """Close the disk store of all threads, results stay in memory"""
+        with self._lock:
+            connections = self._connections
+            self._path = None
+            self._local = threading.local()
+            self._connections = []
+        for db in connections:
+            db.close()
+
+    def clear(self, disk: bool = False):
+        """Drop all results in memory, and on disk if `disk`"""
+        with self._lock:
+            self._memory.clear()
+        db = self._db
+        if disk and db is not None:
+            db.execute("DELETE FROM itur")
+            db.commit()
+
+    def stats(self) -> dict:
+        """Hit and miss counts of the cache"""
+        return {"hits": self.hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "size": len(self._memory)}
+
+    def _key(self, name: str, args: tuple) -> str:
+        parts = [name, self._version]
+        for arg in args:
+            if np.ndim(arg) == 0:
+                parts.append(repr(float(arg)))
+            else:
+                arr = np.asarray(arg, dtype=np.float64)
+                digest = hashlib.sha1(arr.tobytes()).hexdigest()
+                parts.append(f"{arr.shape}:{digest}")
+        return "|".join(parts)
+
+    def call(self, name: str, func, *args):
+        """Return `func(*args)`, memoized under `name` and `args`.
+
+        `func` must return a float or an array of floats.
+        """
+        key = self._key(name, args)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        value = self._load(key)
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            value = func(*args)
+            self._store(key, value)
+
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        with self._lock:
+            self._memory[key] = value
+            if len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+        return value
+
+    def _load(self, key: str):
+        db = self._db
+        if db is None:
+            return None
+        row = db.execute("SELECT shape, value FROM itur WHERE key = ?",
+                         (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE itur SET used = ? WHERE key = ?",
+                   (time.time(), key))
+        db.commit()
+        shape = tuple(int(i) for i in row[0].split(",") if i)
+        value = np.frombuffer(row[1], dtype=np.float64).reshape(shape)
+        return float(value) if shape == () else value.copy()
+
+    def _store(self, key: str, value):
+        db = self._db
+        if db is None:
+            return
+        arr = np.asarray(value, dtype=np.float64)
+        shape = ",".join(str(i) for i in arr.shape)
+        db.execute("INSERT OR REPLACE INTO itur VALUES (?, ?, ?, ?)",
+                   (key, shape, arr.tobytes(), time.time()))
+        self._evict(db)
+        db.commit()
+
+    def _evict(self, db):
+        """Drop least recently used results until below `max_bytes`"""
+        total, = db.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM itur").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = db.execute(
+            "SELECT key, LENGTH(value) FROM itur ORDER BY used").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        db.executemany("DELETE FROM itur WHERE key = ?", stale)
+
+
+def default_cache_path() -> str:
+    """sqlite file of the disk store in the user cache directory"""
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "mani_rain", "itur.sqlite")
+
+
+cache = itu_cache()
+"""Cache used by the rain models"""
+if os.environ.get("MANI_RAIN_CACHE_DIR"):
+    cache.open(os.path.join(os.environ["MANI_RAIN_CACHE_DIR"], "itur.sqlite"))
+
+
+def enable_disk_cache(path: str = None, max_bytes: int = 64 << 20):
+    """Persist itur results in `path`, defaults to `default_cache_path`"""
+    cache.max_bytes = max_bytes
+    cache.open(default_cache_path() if path is None else path)
+
+
+def disable_disk_cache():
+    """Only keep itur results in memory"""
+    cache.close()
+
+
+def _itur_call(model: str, name: str):
+    """Call `itur.models.<model>.<name>` and strip the astropy unit of
+    the result, shaped as the broadcast of the arguments unless itur
+    returns a grid over several array arguments."""
+    def call(*args):
+        func = getattr(importlib.import_module(f"itur.models.{model}"), name)
+        value = np.asarray(func(*args).value)
+        try:
+            value = value.reshape(np.broadcast(*args).shape)
+        except ValueError:
+            pass
+        return float(value) if value.ndim == 0 else value
+    return call
+
+
+def rain_height(lat, lon):
+    """ITU-R P.839 rain height in km"""
+    return cache.call("itu839.rain_height",
+                      _itur_call("itu839", "rain_height"), lat, lon)
+
+
+def rainfall_rate(lat, lon, p):
+    """ITU-R P.837 rain rate exceeded for p % of the time in mmhr⁻¹"""
+    return cache.call("itu837.rainfall_rate",
+                      _itur_call("itu837", "rainfall_rate"), lat, lon, p)
+
+
+def rain_attenuation(lat, lon, freq, elevation, height, p):
+    """ITU-R P.618 rain attenuation exceeded for p % of the time in dB
+
+    If both `elevation` and `p` are arrays, the result is the grid with
+    shape (p, elevation).
+    """
+    return cache.call("itu618.rain_attenuation",
+                      _itur_call("itu618", "rain_attenuation"),
+                      lat, lon, freq, elevation, height, p)
+
+
+def _rain_coefficients_hv(freq):
+    """P.838 (k_H, α_H, k_V, α_V) at `freq` GHz"""
+    func = getattr(importlib.import_module("itur.models.itu838"),
+                   "rain_specific_attenuation_coefficients")
+    k_h, alpha_h = func(freq, 0, 0)
+    k_v, alpha_v = func(freq, 0, 90)
+    return np.array([k_h, alpha_h, k_v, alpha_v], dtype=float)
+
+
+def rain_coefficients(freq, elevation, tau=45):
+    """ITU-R P.838 coefficients (k, α) of the specific rain attenuation
+    k R^α in dBkm⁻¹, for `freq` in GHz, and `elevation` and polarisation
+    tilt `tau` in degree, broadcast against each other.
+
+    Only the horizontal and vertical coefficients are looked up, once
+    per frequency, and combined for the elevation and tilt as in P.838.
+    """
+    freq, elevation, tau = np.broadcast_arrays(
+        np.asarray(freq, dtype=float), np.asarray(elevation, dtype=float),
+        np.asarray(tau, dtype=float))
+    bands, inverse = np.unique(freq, return_inverse=True)
+    hv = np.array([cache.call("itu838.coefficients_hv",
+                              _rain_coefficients_hv, band)
+                   for band in bands])
+    k_h, alpha_h, k_v, alpha_v = np.moveaxis(
+        hv[inverse.reshape(freq.shape)], -1, 0)
+
+    tilt = np.cos(np.radians(elevation))**2*np.cos(np.radians(2*tau))
+    k = (k_h + k_v + (k_h - k_v)*tilt)/2
+    alpha = (k_h*alpha_h + k_v*alpha_v + (k_h*alpha_h - k_v*alpha_v)*tilt)/(2*k)
+    if k.ndim == 0:
+        return float(k), float(alpha)
+    return k, alpha
@@ -0,0 +1,277 @@
+"""
+Rare event module
+
+Estimates rare outage probabilities and data volume tail quantiles of a
+pass through a `link_budget_markov`, with far fewer samples than plain
+Monte Carlo.
+
+Realisations are split into several weighted copies whenever they come
+closer to outage than before in the pass, measured in rain rates below
+the lightest rain causing outage at that step. Rare heavy rain at the
+critical part of the pass is so followed by many copies, while each
+uneventful realisation costs a single path. The number of copies made at
+every level is set from pilot runs, as the inverse of the probability
+of reaching it once the level below is reached. The start state is
+drawn with importance sampling, biased towards heavy rain in the same
+way and weighted by its likelihood ratio. Both keep the estimates
+unbiased.
+"""
+#%%
+import numpy as np
+from statistics import NormalDist
+from mani_rain._core import _block_size
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain._rain_markov import markov_base
+
+
+class rare_result:
+    """Weighted realisations of a pass, from `rare_outage`
+
+    Copies split from the same realisation are correlated, so the
+    confidence intervals are computed over the `n` independent
+    realisations, each summing its copies.
+    """
+
+    def __init__(self, root, weights, outage_time, data_volume, peak,
+                 n: int, duration: float, confidence: float):
+        self.root = root
+        """Independent realisation each copy was split from"""
+        self.weights = weights
+        """Weight of each copy"""
+        self.outage_time = outage_time
+        """Time without link of each copy in seconds"""
+        self.data_volume = data_volume
+        """Data volume of each copy in bits"""
+        self.peak = peak
+        """Highest splitting level reached by each copy, the last level
+        being outage"""
+        self.n = n
+        """Number of independent realisations"""
+        self.duration = duration
+        """Duration of the pass in seconds"""
+        self.confidence = confidence
+        """Level of the confidence intervals"""
+        self._z = NormalDist().inv_cdf((1 + confidence)/2)
+
+    def _mean(self, values):
+        """Estimate of the mean of `values` with the bounds of its
+        confidence interval"""
+        per_root = np.bincount(self.root, self.weights*values,
+                               minlength=self.n)
+        mean = np.mean(per_root)
+        half = self._z*np.std(per_root, ddof=1)/np.sqrt(self.n)
+        return mean, max(mean - half, 0.0), mean + half
+
+    def outage_probability(self):
+        """Fraction of the pass in outage
+
+        Returns
+        -----
+        estimate, lower, upper : float
+          Estimate and confidence interval
+        """
+        return self._mean(self.outage_time / self.duration)
+
+    def probability_of_outage(self, min_time: float = 0):
+        """Probability of more than `min_time` seconds of outage in the
+        pass, see `outage_probability`"""
+        return self._mean(self.outage_time > min_time)
+
+    def cdf(self, data_volume: float):
+        """Probability of a data volume of at most `data_volume` bits,
+        see `outage_probability`"""
+        return self._mean(self.data_volume <= data_volume)
+
+    def quantile(self, q: float):
+        """Data volume in bits not exceeded with probability `q`
+
+        The confidence interval is found by inverting the interval of
+        `cdf`, between the data volumes of the copies.
+
+        Returns
+        -----
+        estimate, lower, upper : float
+          Estimate and confidence interval
+        """
+        volume = np.unique(self.data_volume)
+
+        def first(bound):
+            # cdf is non decreasing in the data volume, so bisect
+            low, high = 0, len(volume) - 1
+            if self.cdf(volume[high])[bound] < q:
+                return np.inf
+            while low < high:
+                mid = (low + high) // 2
+                if self.cdf(volume[mid])[bound] >= q:
+                    high = mid
+                else:
+                    low = mid + 1
+            return volume[low]
+
+        return first(0), first(2), first(1)
+
+
+def _ranks(markov: markov_base) -> np.ndarray:
+    """Rank of the rain rate of every state, equal rates share a rank"""
+    return np.searchsorted(np.unique(markov.states), markov.states)
+
+
+class _splitter:
+    """Draws passes with splitting, see the module description"""
+
+    def __init__(self, markov: markov_base, volume, outage, max_copies: int):
+        self.markov = markov
+        self.volume = volume
+        self.outage = outage
+        self.max_copies = max_copies
+
+        # Level of every state at every step, the number of ranks the
+        # state is below the lightest rain in outage, counted up from 0
+        rank = _ranks(markov)
+        self.n_levels = rank.max() + 2
+        in_outage = np.zeros((len(outage), self.n_levels - 1), dtype=bool)
+        np.logical_or.at(in_outage, (slice(None), rank), outage > 0)
+        lightest = np.where(in_outage.any(axis=1),
+                            np.argmax(in_outage, axis=1), self.n_levels - 1)
+        self.level = np.clip(rank[None, :] - lightest[:, None]
+                             + self.n_levels - 1, 0, self.n_levels - 1)
+        self.set_copies(np.ones(self.n_levels))
+
+    def set_copies(self, copies):
+        """Copies made on first reaching each level"""
+        self.copies = np.asarray(copies, dtype=float)
+        # Copies made on first reaching level j with level i reached
+        # before are total[j]/total[i]
+        self.total = np.minimum(np.cumprod(self.copies), 1e300)
+
+        stationary = self.markov.stationary()
+        initial = stationary*self.total[self.level[0]]
+        self.initial = initial / initial.sum()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.initial_weight = np.where(self.initial > 0,
+                                           stationary/self.initial, 0.0)
+
+    def draw(self, n: int, rng, initial_state=None, first_root: int = 0):
+        """Copies of `n` passes as (root, weight, outage time, data
+        volume, peak level)"""
+        markov = self.markov
+        flat_cdf, indices = markov._flat_cdf, markov._indices
+        total = self.total
+
+        root = np.arange(first_root, first_root + n)
+        if initial_state is None:
+            state = rng.choice(len(markov.states), n, p=self.initial)
+            weight = self.initial_weight[state]
+        else:
+            state = np.full(n, initial_state, dtype=np.intp)
+            weight = np.ones(n)
+        peak = self.level[0][state]
+        volume = np.zeros(n)
+        outage = np.zeros(n)
+
+        for step, level in enumerate(self.level):
+            pos = np.searchsorted(flat_cdf, state + rng.random(len(state)),
+                                  side="right")
+            state = indices[pos]
+            volume += self.volume[step, state]
+            outage += self.outage[step, state]
+
+            higher = level[state] > peak
+            if np.any(higher):
+                # A fractional number of copies is rounded at random,
+                # and the weight divided by its expectation
+                ratio = np.ones(len(state))
+                ratio[higher] = np.clip(total[level[state[higher]]]
+                                        / total[peak[higher]],
+                                        1, self.max_copies)
+                copies = np.floor(ratio + rng.random(len(state)))
+                copies = copies.astype(np.intp)
+                peak = np.maximum(peak, level[state])
+                weight = np.repeat(weight / ratio, copies)
+                state, peak, root, volume, outage = (
+                    np.repeat(i, copies) for i in
+                    (state, peak, root, volume, outage))
+
+        return root, weight, outage, volume, peak
+
+
+def rare_outage(link: link_budget_markov, dist, elevation, n_paths: int,
+                dt: float = 1, steps_per_draw: int = 1, n_pilot: int = 2000,
+                pilot_rounds: int = 3, split: int = 10,
+                max_copies: int = 1000, initial_state: int = None,
+                seed=None, confidence: float = 0.95) -> rare_result:
+    """Rare event estimate of outage and data volume in a pass
+
+    Parameters
+    -----
+    link : link_budget_markov
+      Link budget with the markov rain model
+    dist : array_like
+      Distance from GS to SC in metres, at each timestep of the pass
+    elevation : array_like
+      Elevation angle in degree, at each timestep of the pass
+    n_paths : int
+      Number of independent realisations
+    dt : float
+      Duration of a timestep in seconds
+    steps_per_draw : int
+      Timesteps per markov step, e.g. 60 for a 1 s pass and a 1 min model
+    n_pilot : int
+      Realisations of every pilot run
+    pilot_rounds : int
+      Number of pilot runs setting the copies, with 0 this is plain
+      Monte Carlo
+    split : int
+      Copies made at levels not yet reached in the pilot runs
+    max_copies : int
+      Most copies made of a realisation in a single step
+    initial_state : None | int
+      Markov state before the pass, if None it is drawn from the
+      stationary distribution
+    seed : None | int | np.random.SeedSequence
+      Seed of the draw
+    confidence : float
+      Level of the confidence intervals
+
+    Returns
+    -----
+    result : rare_result
+    """
+    dist, elevation = np.broadcast_arrays(np.asarray(dist, dtype=float),
+                                          np.asarray(elevation, dtype=float))
+    markov = link.rain_model.rain_model
+
+    # Data volume and outage time of every state, summed over each
+    # markov step
+    rate = link.dvb.rate_at_esno(link.state_snr(dist, elevation))
+    draw_start = np.arange(0, len(elevation), steps_per_draw)
+    volume = np.add.reduceat(rate*dt, draw_start, axis=0)
+    outage = np.add.reduceat((rate == 0)*dt, draw_start, axis=0)
+
+    sampler = _splitter(markov, volume, outage, max_copies)
+    n_levels = sampler.n_levels
+    rng = np.random.default_rng(seed)
+    for _ in range(pilot_rounds):
+        _, weight, _, _, peak = sampler.draw(n_pilot, rng, initial_state)
+        # Probability of reaching each level in a pass, and of reaching
+        # it once the level below is reached
+        reach = np.cumsum(np.bincount(peak, weight,
+                                      minlength=n_levels)[::-1])[::-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = reach[1:] / reach[:-1]
+        copies = np.ones(n_levels)
+        seen = step > 0
+        copies[1:][seen] = np.maximum(1/step[seen], 1)
+        copies[1:][~seen] = split
+        sampler.set_copies(copies)
+
+    results = []
+    block = max(1, _block_size // max(len(volume), 1) // 4)
+    for start in range(0, n_paths, block):
+        results.append(sampler.draw(min(block, n_paths - start), rng,
+                                    initial_state, start))
+
+    root, weight, outage_time, data_volume, peak = (np.concatenate(i)
+                                                    for i in zip(*results))
+    return rare_result(root, weight, outage_time, data_volume, peak,
+                       n_paths, len(elevation)*dt, confidence)
@@ -0,0 +1,337 @@
+"""
+Local query service module
+
+Keeps link budgets, with their stations, ITU cache and markov tables,
+warm in one process and answers SNR and rate queries over HTTP on
+localhost or a Unix socket, so a planning tool does not pay the import
+and setup cost per request, e.g.
+
+    python -m mani_rain.service --port 8765
+
+    curl -d '{"link": "cebreros", "dist": [3.8e8], "elevation": [30]}' \\
+        localhost:8765/rate
+
+Queries arriving within `window` seconds of each other for the same
+link are coalesced into a single `snr_batch` evaluation. Requests
+without rain rates take the default of the rain model, for markov links
+these are consecutive draws of its chain in order of arrival. Give
+every markov link its own chain, see `markov_base.chain`, so the
+service does not share a chain with other code in the process.
+
+Endpoints
+-----
+GET /links
+  Names of the served links
+GET /stats
+  Number of requests, batches and samples evaluated
+POST /snr, POST /rate
+  JSON object with `link`, `dist` and `elevation`, and optionally
+  `rain_rate`, broadcast like `snr_batch`. Answers with the SNR in dB
+  and the DVB-S2 rate in bps.
+"""
+#%%
+import argparse
+import asyncio
+import http.client
+import ipaddress
+import json
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+
+def _is_local(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class link_service:
+    """Coalescing SNR and rate service of named link budgets"""
+
+    def __init__(self, links: dict, window: float = 0.002,
+                 max_batch: int = 1 << 20):
+        """
+        Parameters
+        -----
+        links : dict
+          Link budgets by name, `link_budget_itu` or `link_budget_markov`
+        window : float
+          Seconds a query waits for others to join its batch
+        max_batch : int
+          Samples after which a batch is evaluated without waiting
+        """
+        self.links = dict(links)
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {"requests": 0, "batches": 0, "samples": 0}
+        """Counters since the service was created"""
+        self._pending = {}
+        self._timers = {}
+        # Evaluations run one at a time off the event loop, so the
+        # chains of markov links are only ever drawn from one thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def query(self, link: str, dist, elevation, rain_rate=None):
+        """SNR and rate of `link`, evaluated with concurrent queries
+
+        Returns
+        -----
+        snr : np.ndarray
+          SNR in dB, with the broadcast shape of the inputs
+        rate : np.ndarray
+          DVB-S2 rate in bps
+        """
+        if link not in self.links:
+            raise ValueError(f"Unknown link {link!r}")
+        if rain_rate is None:
+            dist, elevation = np.broadcast_arrays(
+                np.asarray(dist, dtype=float),
+                np.asarray(elevation, dtype=float))
+        else:
+            dist, elevation, rain_rate = np.broadcast_arrays(
+                np.asarray(dist, dtype=float),
+                np.asarray(elevation, dtype=float),
+                np.asarray(rain_rate, dtype=float))
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(link, [])
+        pending.append((dist, elevation, rain_rate, future))
+        self.stats["requests"] += 1
+
+        if sum(i[0].size for i in pending) >= self.max_batch:
+            self._flush(link)
+        elif link not in self._timers:
+            self._timers[link] = loop.call_later(self.window, self._flush,
+                                                 link)
+        return await future
+
+    def _flush(self, link: str):
+        """Evaluate the pending queries of `link` as one batch"""
+        timer = self._timers.pop(link, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(link, [])
+        if not batch:
+            return
+        self.stats["batches"] += 1
+        self.stats["samples"] += sum(i[0].size for i in batch)
+
+        loop = asyncio.get_running_loop()
+        done = loop.run_in_executor(self._executor, self._evaluate,
+                                    self.links[link], batch)
+
+        def resolve(done):
+            futures = [i[3] for i in batch]
+            if done.exception() is not None:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(done.exception())
+                return
+            for future, result in zip(futures, done.result()):
+                if not future.done():
+                    future.set_result(result)
+
+        done.add_done_callback(resolve)
+
+    @staticmethod
+    def _evaluate(link, batch) -> list:
+        """(snr, rate) of every query in `batch` from one evaluation"""
+        rain_rate = [link._batch_rain_rate(dist.shape) if rain is None
+                     else rain for dist, _, rain, _ in batch]
+        snr = link.snr_batch(
+            np.concatenate([i[0].ravel() for i in batch]),
+            np.concatenate([i[1].ravel() for i in batch]),
+            np.concatenate([np.ravel(i) for i in rain_rate]))
+        rate = link.dvb.rate_at_esno(snr)
+
+        ends = np.cumsum([i[0].size for i in batch])
+        return [(s.reshape(query[0].shape), r.reshape(query[0].shape))
+                for query, s, r in zip(batch, np.split(snr, ends[:-1]),
+                                       np.split(rate, ends[:-1]))]
+
+    async def _respond(self, method: str, path: str, body: bytes):
+        """Status and JSON answer of a request"""
+        if method == "GET" and path == "/links":
+            return 200, {"links": sorted(self.links)}
+        if method == "GET" and path == "/stats":
+            return 200, self.stats
+        if method != "POST" or path not in ("/snr", "/rate"):
+            return 404, {"error": f"No endpoint {method} {path}"}
+
+        try:
+            request = json.loads(body)
+            snr, rate = await self.query(request["link"], request["dist"],
+                                         request["elevation"],
+                                         request.get("rain_rate"))
+        except KeyError as err:
+            return 400, {"error": f"Missing field {err}"}
+        except (ValueError, TypeError) as err:
+            return 400, {"error": str(err)}
+        return 200, {"snr": snr.tolist(), "rate": rate.tolist()}
+
+    async def _handle(self, reader, writer):
+        """Serve the HTTP/1.1 requests of one connection"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, answer = await self._respond(method, path, body)
+                except Exception:
+                    # Keeps serving, the request was read in full
+                    _log.exception("Failed to answer %s %s", method, path)
+                    status, answer = 500, {"error": "Internal error"}
+                payload = json.dumps(answer).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {http.client.responses[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ValueError, asyncio.IncompleteReadError,
+                ConnectionError):
+            pass
+        except Exception:
+            _log.exception("Connection failed")
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765,
+                    path: str = None):
+        """Start serving, on the Unix socket `path` if given, else on
+        TCP `host`:`port`, which must be a loopback address
+
+        Returns
+        -----
+        server : asyncio.base_events.Server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path)
+        if not _is_local(host):
+            raise ValueError(f"{host} is not a loopback address")
+        return await asyncio.start_server(self._handle, host, port)
+
+    def run(self, host: str = "127.0.0.1", port: int = 8765,
+            path: str = None):
+        """Serve until interrupted, see `start`"""
+        async def serve():
+            server = await self.start(host, port, path)
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._executor.shutdown()
+
+
+class _unix_connection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def query(address, link: str, dist, elevation, rain_rate=None,
+          timeout: float = 60) -> dict:
+    """Query a running `link_service`
+
+    Parameters
+    -----
+    address : tuple | str
+      (host, port) of the service, or the path of its Unix socket
+    link : str
+      Name of the link
+    dist, elevation, rain_rate
+      See `link_service.query`
+
+    Returns
+    -----
+    answer : dict
+      With `snr` in dB and `rate` in bps as nested lists
+    """
+    if isinstance(address, str):
+        conn = _unix_connection(address, timeout)
+    else:
+        conn = http.client.HTTPConnection(*address, timeout=timeout)
+    request = {"link": link, "dist": np.asarray(dist).tolist(),
+               "elevation": np.asarray(elevation).tolist()}
+    if rain_rate is not None:
+        request["rain_rate"] = np.asarray(rain_rate).tolist()
+    try:
+        conn.request("POST", "/rate", json.dumps(request),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        answer = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise ValueError(answer.get("error", response.reason))
+    return answer
+
+
+def default_links(bw: float = 10e6, p: float = 0.01) -> dict:
+    """ITU link budgets of the bundled stations, and a markov link of
+    Aalborg on its own chain of `aau_model`"""
+    from mani_rain import _core, rain
+    from mani_rain.linkbudget import link_budget_itu, link_budget_markov
+    from mani_rain.rain import markov_rain
+    from mani_rain.rain.itu import rain_itu
+
+    links = {}
+    for name in ("cebreros", "malargue", "new_norcia", "aalborg"):
+        station = getattr(_core, name)
+        links[name] = link_budget_itu(station, bw,
+                                      rain_model=rain_itu(station, p))
+    links["aalborg_markov"] = link_budget_markov(
+        _core.aalborg, markov_rain(_core.aalborg, rain.aau_model.chain()), bw)
+    return links
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Serve on this Unix socket instead")
+    parser.add_argument("--bw", type=float, default=10e6,
+                        help="Bandwidth of the links in Hz")
+    parser.add_argument("--p", type=float, default=0.01,
+                        help="Outage probability of the ITU links in %%")
+    parser.add_argument("--window", type=float, default=0.002,
+                        help="Coalescing window in seconds")
+    args = parser.parse_args(argv)
+
+    service = link_service(default_links(args.bw, args.p), args.window)
+    service.run(args.host, args.port, args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Streaming statistics module
+
+Accumulators of SNR, rate and data volume statistics, updated block by
+block in constant memory, e.g. from `pipeline.link_stream`. Every
+accumulator has a `merge`, so partial results of parallel workers can
+be combined, as done by `montecarlo.data_volume_mc`.
+
+Samples may be weighted, e.g. by their duration, so the statistics are
+over time rather than over samples.
+"""
+#%%
+import numpy as np
+
+
+def _weights(values: np.ndarray, weights) -> np.ndarray:
+    if weights is None:
+        return np.ones(values.shape)
+    return np.broadcast_to(np.asarray(weights, dtype=float),
+                           values.shape).ravel()
+
+
+class running_moments:
+    """Running weighted mean and variance, merged like Chan et al."""
+
+    def __init__(self):
+        self.weight = 0.0
+        """Sum of the weights"""
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _combine(self, weight, mean, m2):
+        total = self.weight + weight
+        if total <= 0:
+            return
+        delta = mean - self.mean
+        self.mean += delta*weight/total
+        self._m2 += m2 + delta**2*self.weight*weight/total
+        self.weight = total
+
+    def update(self, values, weights=None) -> "running_moments":
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return self
+        weights = _weights(values, weights)
+        weight = np.sum(weights)
+        mean = np.sum(weights*values)/weight
+        self._combine(weight, mean, np.sum(weights*(values - mean)**2))
+        self.min = min(self.min, np.min(values))
+        self.max = max(self.max, np.max(values))
+        return self
+
+    def merge(self, other: "running_moments") -> "running_moments":
+        self._combine(other.weight, other.mean, other._m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def var(self) -> float:
+        """Weighted variance"""
+        return self._m2/self.weight if self.weight > 0 else np.nan
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.var)
+
+
+class histogram:
+    """Histogram over fixed bin edges, with an underflow bin before the
+    first and an overflow bin after the last edge"""
+
+    def __init__(self, edges):
+        """
+        Parameters
+        -----
+        edges : array_like
+          Increasing bin edges, a value equal to an edge is counted in
+          the bin above it
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        if np.any(np.diff(self.edges) <= 0):
+            raise ValueError("Bin edges must be increasing")
+        self.counts = np.zeros(len(self.edges) + 1)
+        """Weight per bin, starting with the underflow bin"""
+
+    def update(self, values, weights=None) -> "histogram":
+        values = np.asarray(values, dtype=float).ravel()
+        idx = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(idx, _weights(values, weights),
+                                   minlength=len(self.counts))
+        return self
+
+    def merge(self, other: "histogram") -> "histogram":
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms have different bin edges")
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self) -> float:
+        return np.sum(self.counts)
+
+    def exceedance(self) -> np.ndarray:
+        """Fraction of the weight at or above each edge, e.g. the
+        availability at each SNR threshold"""
+        above = np.cumsum(self.counts[::-1])[::-1][1:]
+        return above/self.total if self.total > 0 else np.zeros(len(above))
+
+    def cdf(self) -> np.ndarray:
+        """Fraction of the weight below each edge"""
+        return 1 - self.exceedance()
+
+
+class quantile_digest:
+    """Mergeable quantile sketch, a t-digest
+
+    Samples are kept as weighted centroids, combined while their
+    cumulative weight stays within one unit of a scale function in the
+    log odds of the quantile, as the k2 scale of Dunning. Centroids are
+    so small in the tails and large around the median, keeping extreme
+    quantiles, e.g. of data volume, accurate to about a percent with
+    `compression` 200 and about 100 centroids.
+    """
+
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.min = np.inf
+        self.max = -np.inf
+        self._mean = np.zeros(0)
+        self._weight = np.zeros(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values, weights=None) -> "quantile_digest":
+        values = np.asarray(values, dtype=float).ravel()
+        weights = _weights(values, weights)
+        keep = ~np.isnan(values) & (weights > 0)
+        if not np.any(keep):
+            return self
+        values, weights = values[keep], weights[keep]
+        self.min = min(self.min, np.min(values))
+        self.max = max(self.max, np.max(values))
+        self._add(values, weights)
+        return self
+
+    def _add(self, means, weights):
+        self._buffer.append((means, weights))
+        self._buffered += len(means)
+        if self._buffered > 10*self.compression:
+            self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        mean = np.concatenate([self._mean] + [i[0] for i in self._buffer])
+        weight = np.concatenate([self._weight] + [i[1] for i in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(mean, kind="stable")
+        mean, weight = mean[order], weight[order]
+        cumulative = np.cumsum(weight)
+        total = cumulative[-1]
+        q = (cumulative - weight/2) / total
+        norm = 4*np.log(max(total/self.compression, 1)) + 24
+        k = self.compression/norm*np.log(q/(1 - q))
+        bucket = np.floor(k - k[0]).astype(np.intp)
+        # Buckets are increasing along the sorted centroids
+        bucket = np.concatenate([[0], np.cumsum(np.diff(bucket) > 0)])
+
+        self._weight = np.bincount(bucket, weight)
+        self._mean = np.bincount(bucket, weight*mean) / self._weight
+        # Rounding must not move a centroid outside the samples
+        self._mean = np.clip(self._mean, self.min, self.max)
+
+    def merge(self, other: "quantile_digest") -> "quantile_digest":
+        other._compress()
+        if len(other._weight):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._add(other._mean, other._weight)
+        return self
+
+    @property
+    def weight(self) -> float:
+        self._compress()
+        return np.sum(self._weight)
+
+    def _curve(self):
+        """Cumulative weight at the centroids, with the min and max"""
+        self._compress()
+        cumulative = np.cumsum(self._weight)
+        position = np.concatenate([[0], cumulative - self._weight/2,
+                                   [cumulative[-1]]])
+        value = np.concatenate([[self.min], self._mean, [self.max]])
+        return position / cumulative[-1], value
+
+    def quantile(self, q):
+        """Estimated value(s) not exceeded with probability `q`"""
+        if len(self._weight) == 0 and not self._buffer:
+            return np.full(np.shape(q), np.nan)[()]
+        position, value = self._curve()
+        return np.interp(q, position, value)
+
+    def cdf(self, x):
+        """Estimated probability of value(s) of at most `x`"""
+        if len(self._weight) == 0 and not self._buffer:
+            return np.full(np.shape(x), np.nan)[()]
+        position, value = self._curve()
+        return np.interp(x, value, position)
+
+
+class modcod_counter:
+    """Time spent in each ModCod, with outage as the first entry"""
+
+    def __init__(self, n_modcods: int):
+        self.time = np.zeros(n_modcods + 1)
+        """Time in each ModCod in seconds"""
+        self.entries = np.zeros(n_modcods + 1, dtype=np.int64)
+        """Number of times each ModCod is entered"""
+        self._last = None
+
+    def update(self, modcod, dt: float = 1,
+               continued: bool = True) -> "modcod_counter":
+        """Add consecutive samples of ModCod index `modcod`, -1 being
+        outage, each lasting `dt` seconds. If `continued` the samples
+        follow those of the last update, else they start a new series,
+        e.g. another realisation, and the first ModCod is always
+        entered."""
+        idx = np.asarray(modcod).ravel() + 1
+        if idx.size == 0:
+            return self
+        self.time += np.bincount(idx, minlength=len(self.time))*dt
+        last = self._last if continued else None
+        start = np.concatenate([[idx[0] != last], idx[1:] != idx[:-1]])
+        self.entries += np.bincount(idx[start], minlength=len(self.time))
+        self._last = idx[-1]
+        return self
+
+    def merge(self, other: "modcod_counter") -> "modcod_counter":
+        self.time += other.time
+        self.entries += other.entries
+        return self
+
+    def fraction(self) -> np.ndarray:
+        """Fraction of time in each ModCod"""
+        total = np.sum(self.time)
+        return self.time/total if total > 0 else np.zeros(len(self.time))
+
+    def mean_sojourn(self) -> np.ndarray:
+        """Mean time in seconds spent in each ModCod once entered"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.time / self.entries
+
+
+class link_stats:
+    """Time weighted SNR, rate and data volume statistics of a link"""
+
+    def __init__(self, rate_edges, snr_edges=None, n_modcods: int = None,
+                 compression: float = 200):
+        """
+        Parameters
+        -----
+        rate_edges : array_like
+          Bin edges of the rate histogram in bps
+        snr_edges : None | array_like
+          Bin edges of the SNR histogram in dB, defaults to 0.1 dB bins
+          from -10 to 40 dB
+        n_modcods : None | int
+          Number of ModCods, defaults to those of `dvbs2`
+        compression : float
+          Compression of the quantile digests
+        """
+        if snr_edges is None:
+            snr_edges = np.linspace(-10, 40, 501)
+        if n_modcods is None:
+            from mani_rain._dvbs2 import dvbs2
+            n_modcods = len(dvbs2._modcods)
+        self.snr = running_moments()
+        self.rate = running_moments()
+        self.snr_hist = histogram(snr_edges)
+        self.rate_hist = histogram(rate_edges)
+        self.snr_quantiles = quantile_digest(compression)
+        self.rate_quantiles = quantile_digest(compression)
+        self.modcod = modcod_counter(n_modcods)
+        self.data_volume = 0.0
+        """Data volume in bits"""
+
+    @staticmethod
+    def for_link(link, **kwargs) -> "link_stats":
+        """Statistics with a rate bin per ModCod of `link`"""
+        rates = np.unique(np.concatenate(
+            [[0.0], link.dvb._spectral_eff*link.dvb.eff_bw]))
+        return link_stats(rates, n_modcods=len(link.dvb._modcods), **kwargs)
+
+    def empty(self) -> "link_stats":
+        """New statistics with the same bins"""
+        return link_stats(self.rate_hist.edges, self.snr_hist.edges,
+                          len(self.modcod.time) - 1,
+                          self.snr_quantiles.compression)
+
+    @property
+    def time(self) -> float:
+        """Total time in seconds"""
+        return self.snr.weight
+
+    def update(self, snr, rate, modcod, dt: float = 1,
+               continued: bool = True) -> "link_stats":
+        """Add consecutive samples, each lasting `dt` seconds, see
+        `modcod_counter.update` for `continued`"""
+        snr = np.asarray(snr, dtype=float).ravel()
+        rate = np.asarray(rate, dtype=float).ravel()
+        self.snr.update(snr, dt)
+        self.rate.update(rate, dt)
+        self.snr_hist.update(snr, dt)
+        self.rate_hist.update(rate, dt)
+        self.snr_quantiles.update(snr, dt)
+        self.rate_quantiles.update(rate, dt)
+        self.modcod.update(modcod, dt, continued)
+        self.data_volume += np.sum(rate)*dt
+        return self
+
+    def merge(self, other: "link_stats") -> "link_stats":
+        for name in ("snr", "rate", "snr_hist", "rate_hist",
+                     "snr_quantiles", "rate_quantiles", "modcod"):
+            getattr(self, name).merge(getattr(other, name))
+        self.data_volume += other.data_volume
+        return self
+
+    def availability(self, snr_threshold) -> np.ndarray:
+        """Fraction of time with an SNR of at least `snr_threshold` dB,
+        with the thresholds rounded up to the next edge of the SNR
+        histogram"""
+        edges = self.snr_hist.edges
+        idx = np.clip(np.searchsorted(edges, snr_threshold), 0, len(edges) - 1)
+        return self.snr_hist.exceedance()[idx]
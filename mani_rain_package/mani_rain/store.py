@@ -0,0 +1,237 @@
+"""
+Result store module
+
+Columnar on-disk store of per timestep link budget results. Every column
+is a raw little endian file of fixed width values in a directory, next
+to `columns.json` holding the dtypes, the number of rows and the rows
+of every appended chunk. Results are appended block by block, e.g. from
+`pipeline.link_stream`, and read back as read only `np.memmap` without
+copying, e.g.
+
+    with result_store("run", "w", link_columns(link)) as store:
+        stream_data_volume(link, "ephemeris.npy", store=store)
+
+    store = result_store("run")
+    snr = store["snr"]
+
+dB quantities, elevation, distance and rate are stored as float32, the
+ModCod index as uint8 and the markov state as the smallest unsigned
+integer holding every state of the model. A -1, i.e. an outage or a
+sample without markov state, is stored as the largest value of the
+column's dtype, see `missing`.
+"""
+#%%
+import json
+import os
+import numpy as np
+
+
+def missing(dtype) -> int:
+    """Value stored for -1 in an unsigned integer column of `dtype`"""
+    return int(np.iinfo(dtype).max)
+
+
+MISSING = missing("u1")
+"""uint8 value of a ModCod index of -1 (outage) or an unknown state"""
+
+default_columns = {
+    "time": "<f8",
+    "station": "u1",
+    "dist": "<f4",
+    "elevation": "<f4",
+    "rain_rate": "<f4",
+    "attenuation": "<f4",
+    "snr": "<f4",
+    "modcod": "u1",
+    "state": "u1",
+    "rate": "<f4",
+}
+"""Columns of a new store and their dtypes"""
+
+
+def _markov_states(link):
+    """Rain rates of the markov states of `link`, None for other links"""
+    markov = getattr(link.rain_model, "rain_model", None)
+    return None if markov is None else markov.states * 60
+
+
+def state_dtype(n_states: int) -> np.dtype:
+    """Smallest unsigned dtype of a state column of `n_states` states,
+    keeping the largest value free for `missing`"""
+    for dtype in ("u1", "u2", "u4"):
+        if n_states <= missing(dtype):
+            return np.dtype(dtype)
+    return np.dtype("u8")
+
+
+def link_columns(link) -> dict:
+    """`default_columns` with the state column sized for the markov
+    model of `link`"""
+    columns = dict(default_columns)
+    rates = _markov_states(link)
+    if rates is not None:
+        columns["state"] = state_dtype(len(rates)).str
+    return columns
+
+
+def _state_of(rates: np.ndarray, rain_rate) -> np.ndarray:
+    """Index of the state with each rain rate"""
+    order = np.argsort(rates, kind="stable")
+    pos = np.searchsorted(rates[order], rain_rate)
+    return order[np.clip(pos, 0, len(rates) - 1)]
+
+
+class result_store:
+    """Columnar store of link budget results, see the module description"""
+
+    def __init__(self, path: str, mode: str = "r", columns: dict = None,
+                 attrs: dict = None):
+        """
+        Parameters
+        -----
+        path : str
+          Directory of the store
+        mode : str
+          "r" to read, "a" to append to an existing or new store, "w" to
+          replace any existing store
+        columns : None | dict
+          dtype of every column of a new store, defaults to
+          `default_columns`, see `link_columns` for markov models of
+          more than 255 states
+        attrs : None | dict
+          JSON serialisable metadata of a new store, e.g. the timestep
+        """
+        if mode not in ("r", "a", "w"):
+            raise ValueError(f"Unknown mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        meta_path = os.path.join(path, "columns.json")
+
+        if mode == "w" or (mode == "a" and not os.path.exists(meta_path)):
+            os.makedirs(path, exist_ok=True)
+            columns = default_columns if columns is None else columns
+            self._meta = {"columns": {name: np.dtype(dtype).str
+                                      for name, dtype in columns.items()},
+                          "length": 0, "chunks": [],
+                          "attrs": {} if attrs is None else dict(attrs)}
+            for name in self._meta["columns"]:
+                open(self._column_path(name), "wb").close()
+            self._write_meta()
+        else:
+            with open(meta_path) as f:
+                self._meta = json.load(f)
+            if mode == "a":
+                # Drop rows written after the last complete append
+                for name, dtype in self._meta["columns"].items():
+                    size = self._meta["length"]*np.dtype(dtype).itemsize
+                    with open(self._column_path(name), "r+b") as f:
+                        f.truncate(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _write_meta(self):
+        # Replaced at once, so readers never see a partial file
+        tmp = os.path.join(self.path, "columns.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, os.path.join(self.path, "columns.json"))
+
+    @property
+    def columns(self) -> dict:
+        """dtype of every column"""
+        return {name: np.dtype(dtype)
+                for name, dtype in self._meta["columns"].items()}
+
+    @property
+    def attrs(self) -> dict:
+        return self._meta["attrs"]
+
+    @property
+    def chunks(self) -> list:
+        """Number of rows of every append"""
+        return self._meta["chunks"]
+
+    def __len__(self) -> int:
+        return self._meta["length"]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._meta["columns"]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Column `name` memory mapped read only"""
+        dtype = self.columns[name]
+        if len(self) == 0:
+            return np.empty(0, dtype)
+        return np.memmap(self._column_path(name), dtype, mode="r",
+                         shape=(len(self),))
+
+    def chunk_slices(self):
+        """Slice of the rows of every append"""
+        start = 0
+        for length in self.chunks:
+            yield slice(start, start + length)
+            start += length
+
+    def append(self, **values):
+        """Append one chunk of rows
+
+        Every column of the store must be given, as arrays of the same
+        length or scalars. Integer columns are checked to fit their
+        dtype, in unsigned columns -1 is stored as `missing` of the
+        dtype, e.g. -1 of `modcod`, and no other value may be negative
+        or equal to it.
+        """
+        if self.mode == "r":
+            raise ValueError("Store is opened read only")
+        missing = set(self._meta["columns"]) - set(values)
+        unknown = set(values) - set(self._meta["columns"])
+        if missing or unknown:
+            raise ValueError(f"Missing columns {sorted(missing)}, unknown "
+                             f"columns {sorted(unknown)}")
+
+        length = max((np.size(i) for i in values.values()
+                      if np.ndim(i)), default=1)
+        data = {}
+        for name, dtype in self.columns.items():
+            value = np.broadcast_to(values[name], (length,))
+            if dtype.kind in "ui":
+                info = np.iinfo(dtype)
+                low, high = info.min, info.max
+                if dtype.kind == "u":
+                    # The largest value is taken by -1
+                    low, high = -1, info.max - 1
+                if length and (np.min(value) < low or np.max(value) > high):
+                    raise ValueError(f"Column {name} does not fit {dtype}, "
+                                     f"values must be in [{low}, {high}]")
+                if dtype.kind == "u":
+                    value = np.where(value == -1, info.max, value)
+            data[name] = np.ascontiguousarray(value, dtype=dtype)
+
+        for name, value in data.items():
+            with open(self._column_path(name), "ab") as f:
+                f.write(value.tobytes())
+        self._meta["length"] += length
+        self._meta["chunks"].append(length)
+        self._write_meta()
+
+    def append_block(self, link, block, station: int = 0):
+        """Append a `pipeline.link_block` of `link`, as station index
+        `station`. The markov state is recovered from the rain rate."""
+        values = {"time": block.time, "station": station,
+                  "dist": block.dist, "elevation": block.elevation,
+                  "rain_rate": block.rain_rate,
+                  "attenuation": block.attenuation, "snr": block.snr,
+                  "modcod": block.modcod, "rate": block.rate}
+        if "state" in self:
+            rates = _markov_states(link)
+            values["state"] = (-1 if rates is None
+                               else _state_of(rates, block.rain_rate))
+        self.append(**{name: value for name, value in values.items()
+                       if name in self})
@@ -0,0 +1,159 @@
+"""
+Parameter sweep module
+
+Evaluates a link budget over the Cartesian product of grids of
+bandwidth, rolloff, link margin, link constants, outage probability
+and distance. Every term is computed once on its own axes and combined
+by broadcasting, e.g. the FSPL once per distance and the rain
+attenuation and G/T once per outage probability.
+"""
+#%%
+import numpy as np
+from mani_rain._core import k_boltz
+from mani_rain._dvbs2 import dvbs2
+from mani_rain.linkbudget import _link_budget
+from mani_rain.rain import itu_cache
+
+
+class sweep_result:
+    """Labelled N-D result of `link_sweep`, every array has the axes
+    `dims` with the grid values in `coords`."""
+
+    def __init__(self, dims: tuple, coords: dict, snr, shannon, rate,
+                 modcod):
+        self.dims = dims
+        self.coords = coords
+        self.snr = snr
+        """SNR in dB"""
+        self.shannon = shannon
+        """Shannon capacity in bps"""
+        self.rate = rate
+        """DVB-S2 rate in bps"""
+        self.modcod = modcod
+        """Index into `dvbs2._modcods`, -1 during outage"""
+
+    @property
+    def shape(self) -> tuple:
+        return self.snr.shape
+
+    def index(self, **values) -> tuple:
+        """Index of the grid points closest to `values`, e.g.
+        `result.snr[result.index(p=0.01)]`"""
+        index = [slice(None)]*len(self.dims)
+        for dim, value in values.items():
+            coord = self.coords[dim]
+            if coord.ndim > 1:
+                coord = coord.sum(axis=1)
+                value = np.sum(value)
+            index[self.dims.index(dim)] = int(np.argmin(np.abs(coord - value)))
+        return tuple(index)
+
+    def sel(self, name: str = "snr", **values) -> np.ndarray:
+        """Values of `name` at the grid points closest to `values`"""
+        return getattr(self, name)[self.index(**values)]
+
+
+def link_sweep(link: _link_budget, dist, p=None, bw=None, rolloff=0.1,
+               link_margin=None, constants=None, elevation=None,
+               rain_rate=None) -> sweep_result:
+    """Evaluate `link` over the Cartesian product of parameter grids
+
+    Parameters left as None take the value of `link`.
+
+    Parameters
+    -----
+    link : link_budget_itu | link_budget_markov
+      Link budget with the station, constants and rain model
+    dist : array_like
+      Distance from GS to SC in metres
+    p : None | array_like
+      Outage probabilities in %, the rain rate is the ITU-R P.837 rain
+      rate exceeded for p % of the time. Only one of `p` and
+      `rain_rate` may be given.
+    bw : None | array_like
+      Bandwidth in Hz
+    rolloff : array_like
+      DVB-S2 rolloff
+    link_margin : None | array_like
+      Link margin in dB
+    constants : None | list
+      Sets of link constants in dB, each summed like `mani_link`
+    elevation : None | float
+      Elevation in degree, if None the eqv. attenuation over the
+      elevation distribution of the station is used
+    rain_rate : None | array_like
+      Rain rates in mmhr⁻¹, defaults to the rain rate of an ITU rain
+      model. Markov links have no single rain rate, so either `p` or
+      `rain_rate` must be given for them.
+
+    Returns
+    -----
+    result : sweep_result
+      With dims (bw, rolloff, link_margin, constants, p | rain_rate,
+      dist)
+    """
+    if p is not None and rain_rate is not None:
+        raise ValueError("Only one of p and rain_rate can be given")
+    station = link.station
+    rain_model = link.rain_model
+
+    coords = {
+        "bw": np.atleast_1d(np.asarray(link.bw if bw is None else bw,
+                                       dtype=float)),
+        "rolloff": np.atleast_1d(np.asarray(rolloff, dtype=float)),
+        "link_margin": np.atleast_1d(np.asarray(
+            link.link_margin if link_margin is None else link_margin,
+            dtype=float)),
+    }
+    if constants is None:
+        coords["constants"] = np.atleast_1d(link.constant)
+        constant = coords["constants"]
+    else:
+        coords["constants"] = np.asarray(constants, dtype=float)
+        constant = np.atleast_1d(np.sum(coords["constants"], axis=-1))
+
+    if p is not None:
+        rain_axis = "p"
+        coords["p"] = np.atleast_1d(np.asarray(p, dtype=float))
+        rain_rate = itu_cache.rainfall_rate(station.lat, station.lon,
+                                            coords["p"])
+    else:
+        rain_axis = "rain_rate"
+        if rain_rate is None:
+            rain_rate = getattr(rain_model, "rain_rate", None)
+        if rain_rate is None:
+            raise ValueError("The rain model has no rain rate, give p or "
+                             "rain_rate, e.g. the rain rates of the "
+                             "markov states")
+    rain_rate = np.atleast_1d(np.asarray(rain_rate, dtype=float))
+    if rain_axis == "rain_rate":
+        coords["rain_rate"] = rain_rate
+    coords["dist"] = np.atleast_1d(np.asarray(dist, dtype=float))
+    dims = ("bw", "rolloff", "link_margin", "constants", rain_axis, "dist")
+
+    def axis(values, dim):
+        shape = [1]*len(dims)
+        shape[dims.index(dim)] = -1
+        return np.reshape(values, shape)
+
+    # Terms on their own axes
+    if elevation is None:
+        rain_att = rain_model.eqv_attenuation(rain_rate)
+    else:
+        rain_att = rain_model.attenuation_saunders(elevation, rain_rate)
+    gt = station.eff_gt(link._antenna_temperature(rain_att))
+    fspl = link._fspl(coords["dist"])
+    noise = 10*np.log10(k_boltz*coords["bw"])
+
+    snr = (axis(constant, "constants") - axis(coords["link_margin"],
+                                              "link_margin")
+           + axis(gt - rain_att, rain_axis) - axis(fspl, "dist")
+           - axis(noise, "bw"))
+    shape = tuple(len(coords[dim]) for dim in dims)
+    snr = np.ascontiguousarray(np.broadcast_to(snr, shape))
+
+    modcod = dvbs2.best_modcod_index(snr)
+    eff_bw = axis(coords["bw"], "bw") / (1 + axis(coords["rolloff"], "rolloff"))
+    rate = np.where(modcod < 0, 0.0, dvbs2._spectral_eff[modcod]*eff_bw)
+    shannon = axis(coords["bw"], "bw")*np.log2(1 + 10**(snr/10))
+    return sweep_result(dims, coords, snr, shannon, rate, modcod)
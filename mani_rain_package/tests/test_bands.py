@@ -0,0 +1,76 @@
+"""
+P.838 rain coefficients and multi-band SNR against itur and single band
+link budgets
+"""
+import numpy as np
+import pytest
+from itur.models import itu838
+from mani_rain import rain_itu, station_t
+from mani_rain.linkbudget import link_budget_itu
+from mani_rain.rain import itu_cache
+
+_bands = [2.2, 8.4, 26.5, 32]
+
+
+def _station(freq=8.4):
+    station = station_t(40.45, -4.37, 0.767, freq, 55.8, 35, 0.65)
+    station.gen_el_dist(np.linspace(5, 90, 2000), res=1)
+    return station
+
+
+def _link(station):
+    return link_budget_itu(station, 10e6,
+                           rain_model=rain_itu(station, 0.01, None, None))
+
+
+@pytest.mark.parametrize("tau", [0, 45, 90])
+def test_coefficients_match_itur(tau):
+    elevation = np.array([5, 30, 60, 90])
+    k, alpha = itu_cache.rain_coefficients(np.array(_bands)[:, None],
+                                           elevation, tau)
+    assert k.shape == alpha.shape == (len(_bands), len(elevation))
+    for i, freq in enumerate(_bands):
+        for j, el in enumerate(elevation):
+            expected = itu838.rain_specific_attenuation_coefficients(
+                freq, el, tau)
+            np.testing.assert_allclose((k[i, j], alpha[i, j]),
+                                       np.ravel(expected), rtol=1e-9)
+
+
+def test_bands_match_single_band_links():
+    base = _station()
+    link = _link(base)
+    rng = np.random.default_rng(0)
+    dist = rng.uniform(3.7e8, 4.1e8, 200)
+    elevation = rng.uniform(5, 90, 200)
+    rain_rate = rng.choice([0, 1, 10, 50], 200)
+    snr = link.snr_bands(dist, elevation, _bands, rain_rate)
+    assert snr.shape == (200, len(_bands))
+    for i, freq in enumerate(_bands):
+        # A station at the band frequency, with the same system noise
+        station = _station(freq)
+        station.t_sys = base.t_sys
+        single = _link(station).snr_batch(dist, elevation, rain_rate)
+        np.testing.assert_allclose(snr[:, i], single, rtol=0, atol=1e-9)
+
+
+def test_band_constants():
+    link = _link(_station())
+    snr = link.snr_bands(3.8e8, 30, _bands, 5)
+    shifted = link.snr_bands(3.8e8, 30, _bands, 5,
+                             constants=link.constant + np.arange(4))
+    np.testing.assert_allclose(shifted - snr, np.arange(4), atol=1e-9)
+
+
+def test_eqv_attenuation_bands():
+    station = _station()
+    model = rain_itu(station, 0.01, None, None, tau=0)
+    rain_rate = np.array([1.0, 10, 50])
+    att = model.eqv_attenuation(rain_rate, np.array(_bands)[:, None])
+    assert att.shape == (len(_bands), len(rain_rate))
+    elevations, prob = station.el_distribution
+    for i, freq in enumerate(_bands):
+        for j, rate in enumerate(rain_rate):
+            expected = np.sum(prob*model.attenuation_saunders(elevations,
+                                                              rate, freq))
+            assert att[i, j] == pytest.approx(expected, rel=1e-9)
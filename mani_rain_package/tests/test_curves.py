@@ -0,0 +1,76 @@
+"""
+Batched P.618 evaluation against one itur call per elevation bin
+"""
+import numpy as np
+import pytest
+from mani_rain import rain_itu, station_t
+from mani_rain.rain import itu_cache
+from mani_rain.rain.itu import eqv_attenuation_curves
+
+_p = np.array([0.001, 0.01, 0.1, 1, 3])
+
+
+def _station(lat, lon, el_range):
+    station = station_t(lat, lon, 0.767, 8.4, 55.8, 35, 0.65)
+    station.gen_el_dist(np.linspace(*el_range, 1000), res=5)
+    return station
+
+
+@pytest.fixture(scope="module")
+def stations():
+    return [_station(40.45, -4.37, (5, 90)),
+            _station(-35.78, -69.4, (10, 70)),
+            _station(57.01, 9.99, (20, 45))]
+
+
+def _per_bin(station, p):
+    """Eqv. attenuation as before the batching, from a P.618 call per
+    elevation bin"""
+    elevations, percentages = station.el_distribution
+    return sum(float(np.ravel(itu_cache.rain_attenuation(
+        station.lat, station.lon, station.freq, el, station.height, p))[0])*pct
+        for el, pct in zip(elevations, percentages))
+
+
+def test_curves_match_per_bin(stations):
+    curves = eqv_attenuation_curves(stations, _p, workers=1)
+    assert curves.shape == (len(stations), len(_p))
+    for station, curve in zip(stations, curves):
+        np.testing.assert_allclose(curve, [_per_bin(station, p) for p in _p],
+                                   rtol=1e-9)
+
+
+def test_eqv_attenuation_itu_matches_curves(stations):
+    curves = eqv_attenuation_curves(stations, _p, workers=1)
+    for station, curve in zip(stations, curves):
+        model = rain_itu(station, 0.01)
+        np.testing.assert_allclose(model.eqv_attenuation_itu(_p), curve,
+                                   rtol=1e-12)
+        assert model.eqv_attenuation_itu() == pytest.approx(curve[1],
+                                                            rel=1e-12)
+        assert np.shape(model.eqv_attenuation_itu(_p.reshape(5, 1))) == (5, 1)
+
+
+def test_process_pool(stations, monkeypatch):
+    import mani_rain.rain.itu as itu
+    monkeypatch.setattr(itu, "_P_BLOCK", 2)
+    np.testing.assert_allclose(eqv_attenuation_curves(stations, _p, workers=2),
+                               eqv_attenuation_curves(stations, _p, workers=1),
+                               rtol=1e-12)
+
+
+def test_missing_distribution():
+    with pytest.raises(ValueError):
+        eqv_attenuation_curves([station_t(40, -4, 0.7, 8.4, 55, 35)], _p)
+
+
+def test_surrogate_array_p(stations):
+    model = rain_itu(stations[0], 0.01)
+    approx = model.eqv_attenuation_itu(_p, exact=False)
+    assert approx.shape == _p.shape
+    # Percentages sum to at most one, so the error of the eqv.
+    # attenuation is within that of the surrogate
+    np.testing.assert_allclose(approx, model.eqv_attenuation_itu(_p),
+                               rtol=0, atol=model.surrogate.max_error)
+    assert model.eqv_attenuation_itu(0.01, exact=False) == pytest.approx(
+        approx[1], rel=1e-12)
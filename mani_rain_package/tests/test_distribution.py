@@ -0,0 +1,77 @@
+"""
+Analytic state distributions of markov_base against linear algebra and
+sampling
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, rain
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain import markov_base, markov_rain
+
+_model = np.array([[0.90, 0.08, 0.02, 0.00],
+                   [0.20, 0.70, 0.10, 0.00],
+                   [0.30, 0.30, 0.35, 0.05],
+                   [0.00, 0.00, 0.50, 0.50]])
+_states = np.array([0.0, 0.01, 0.1, 0.5])
+
+
+def test_distribution_matches_matrix_power():
+    model = markov_base(_model, _states)
+    for n in (0, 1, 2, 7, 100, 1025):
+        np.testing.assert_allclose(model.distribution(n, 2),
+                                   np.linalg.matrix_power(_model, n)[2],
+                                   rtol=0, atol=1e-12)
+    initial = np.array([0.25, 0.25, 0.5, 0])
+    np.testing.assert_allclose(model.distribution(5, initial),
+                               initial @ np.linalg.matrix_power(_model, 5),
+                               rtol=0, atol=1e-12)
+
+
+def test_stationary():
+    for model in (markov_base(_model, _states), rain.aau_model):
+        stationary = model.stationary()
+        assert stationary.sum() == pytest.approx(1)
+        np.testing.assert_allclose(stationary @ model.transition,
+                                   stationary, rtol=0, atol=1e-10)
+    model = markov_base(_model, _states)
+    np.testing.assert_allclose(model.distribution(10000, 0),
+                               model.stationary(), rtol=0, atol=1e-10)
+
+
+def test_stationary_matches_sampling():
+    model = markov_base(_model, _states)
+    n_chains = 2000
+    draws = model.draw_trajectory(500, n_chains, seed=1, initial_state=0)
+    states = np.searchsorted(_states*60, draws[:, -1])
+    freq = np.bincount(states, minlength=4)/n_chains
+    expected = model.stationary()
+    assert np.all(np.abs(freq - expected)
+                  < 5*np.sqrt(expected*(1 - expected)/n_chains) + 1e-12)
+
+
+def test_sojourn_and_first_passage():
+    model = markov_base(_model, _states)
+    np.testing.assert_allclose(model.mean_sojourn(),
+                               1/(1 - np.diag(_model)))
+    steps = model.mean_first_passage([3])
+    # One step analysis, h = 1 + P h outside the target
+    other = np.arange(3)
+    np.testing.assert_allclose(
+        steps[other], 1 + _model[np.ix_(other, other)] @ steps[other])
+    assert steps[3] == 0
+
+
+def test_expected_rate_matches_states():
+    link = link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                              10e6)
+    dist, elevation = np.array([3.7e8, 4e8]), np.array([15.0, 60.0])
+    rates = rain.aau_model.states*60
+    state_rate = link.dvb_s2_cap(link.snr_batch(dist[:, None],
+                                                elevation[:, None], rates))
+    np.testing.assert_allclose(link.expected_rate(dist, elevation),
+                               state_rate @ rain.aau_model.stationary())
+    outage = link.dvb.best_modcod_index(
+        link.snr_batch(dist[:, None], elevation[:, None], rates)) < 0
+    np.testing.assert_allclose(
+        link.outage_probability(dist, elevation, 3),
+        outage @ rain.aau_model.distribution(3, rain.aau_model.state))
@@ -0,0 +1,59 @@
+"""
+Equivalence of the ModCod table to a linear scan of `dvbs2._modcods`
+"""
+import numpy as np
+import pytest
+from mani_rain._dvbs2 import dvbs2
+
+
+def _linear_scan(esno: float) -> int:
+    """Index of the ModCod picked by scanning every ModCod, -1 below
+    the threshold of the slowest"""
+    modcods = dvbs2._modcods
+    best = modcods[0]
+    if best.esno > esno:
+        return -1
+    for modcod in modcods:
+        if esno > modcod.esno and best.spectral_eff < modcod.spectral_eff:
+            best = modcod
+    return modcods.index(best)
+
+
+def _esno():
+    thresholds = np.array([m.esno for m in dvbs2._modcods])
+    return np.concatenate([np.linspace(-5, 20, 1001), thresholds,
+                           thresholds - 1e-9, thresholds + 1e-9])
+
+
+def test_best_modcod_index_matches_scan():
+    esno = _esno()
+    expected = [_linear_scan(value) for value in esno]
+    assert np.array_equal(dvbs2.best_modcod_index(esno), expected)
+    assert [int(dvbs2.best_modcod_index(value)) for value in esno] == expected
+
+
+def test_rate_and_modcod():
+    dvb = dvbs2(10e6)
+    esno = _esno()
+    rate = dvb.rate_at_esno(esno)
+    for value, r in zip(esno, rate):
+        idx = _linear_scan(value)
+        if idx < 0:
+            assert r == 0
+            with pytest.raises(ValueError):
+                dvb.find_best_modcod(value)
+        else:
+            assert dvb.find_best_modcod(value) is dvbs2._modcods[idx]
+            assert r == pytest.approx(dvb.rate(dvbs2._modcods[idx]))
+
+
+def test_non_finite_esno():
+    best = _linear_scan(np.inf)
+    assert best == int(np.argmax([m.spectral_eff for m in dvbs2._modcods]))
+    esno = np.array([np.inf, -np.inf, np.nan])
+    assert dvbs2.best_modcod_index(esno).tolist() == [best, -1, -1]
+    assert [dvbs2.best_modcod_index(float(value))
+            for value in esno] == [best, -1, -1]
+    rate = dvbs2(10e6).rate_at_esno(esno)
+    assert rate[0] == pytest.approx(dvbs2(10e6).rate(dvbs2._modcods[best]))
+    assert np.array_equal(rate[1:], [0, 0])
@@ -0,0 +1,55 @@
+"""
+Stages recorded by the profile, and the functions restored after it
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, cebreros, instrument, rain
+from mani_rain.linkbudget import _link_budget, link_budget_itu, \
+    link_budget_markov
+from mani_rain.network import _link_stack, link_network
+from mani_rain.rain import markov_rain
+
+
+@pytest.fixture(scope="module")
+def network():
+    links = [link_budget_itu(cebreros, 10e6),
+             link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                                10e6)]
+    return link_network(links)
+
+
+def _schedule(n=500):
+    time = np.arange(n)
+    elevation = 60*np.sin(time/100 + np.array([0, 1])[:, None])
+    return np.full(elevation.shape, 3.8e8), elevation
+
+
+def test_link_network_stages(network):
+    with instrument.profile() as prof:
+        network.evaluate(*_schedule())
+    report = prof.report()
+    assert report["attenuation"]["functions"][
+        "_link_stack.attenuation"]["calls"] == 1
+    assert report["snr"]["functions"]["_link_stack.snr"]["calls"] == 1
+    assert report["markov"]["calls"] > 0
+    assert report["modcod"]["calls"] > 0
+
+
+def test_single_link_stages(network):
+    link = network.links[0]
+    dist, elevation = _schedule()
+    with instrument.profile() as prof:
+        link.snr_batch(dist[0], np.abs(elevation[0]) + 1)
+    report = prof.report()
+    for stage in ("attenuation", "gt", "snr"):
+        assert report[stage]["calls"] == 1
+    assert report["snr"]["seconds"] >= report["gt"]["seconds"]
+
+
+def test_functions_restored():
+    raw = [_link_stack.__dict__["snr"], _link_stack.__dict__["attenuation"],
+           _link_budget.__dict__["_snr"]]
+    with instrument.profile():
+        assert _link_stack.__dict__["snr"] is not raw[0]
+    assert [_link_stack.__dict__["snr"], _link_stack.__dict__["attenuation"],
+            _link_budget.__dict__["_snr"]] == raw
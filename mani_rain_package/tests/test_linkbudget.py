@@ -0,0 +1,106 @@
+"""
+Equivalence of the batch and scalar SNR of the link budgets
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, cebreros, rain, station_t
+from mani_rain._core import C, k_boltz
+from mani_rain.linkbudget import link_budget_itu, link_budget_markov
+from mani_rain.rain import markov_rain
+
+
+def _samples(n=50):
+    rng = np.random.default_rng(0)
+    dist = rng.uniform(3.6e8, 4.1e8, n)
+    elevation = rng.uniform(1, 90, n)
+    rain_rate = rng.choice([0, 0.5, 3, 20, 80], n)
+    return dist, elevation, rain_rate
+
+
+@pytest.fixture(scope="module")
+def links():
+    return [link_budget_itu(cebreros, 10e6),
+            link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                               10e6)]
+
+
+def test_snr_batch_matches_snr_at_t(links):
+    dist, elevation, rain_rate = _samples()
+    for link in links:
+        batch = link.snr_batch(dist, elevation, rain_rate)
+        scalar = [link.snr_at_t(d, e, r)
+                  for d, e, r in zip(dist, elevation, rain_rate)]
+        assert batch.shape == dist.shape
+        np.testing.assert_allclose(batch, scalar, rtol=0, atol=1e-9)
+
+
+def test_snr_batch_broadcasts(links):
+    dist, elevation, rain_rate = _samples(6)
+    for link in links:
+        batch = link.snr_batch(dist[:, None], elevation[None, :], 2.0)
+        assert batch.shape == (6, 6)
+        for i, d in enumerate(dist):
+            np.testing.assert_allclose(
+                batch[i], [link.snr_at_t(d, e, 2.0) for e in elevation],
+                rtol=0, atol=1e-9)
+
+
+def test_itu_default_rain_rate(links):
+    link = links[0]
+    dist, elevation, _ = _samples()
+    np.testing.assert_allclose(
+        link.snr_batch(dist, elevation),
+        link.snr_batch(dist, elevation, link.rain_model.rain_rate),
+        rtol=0, atol=0)
+
+
+def test_markov_draws_states(links):
+    link = links[1]
+    dist, elevation, _ = _samples()
+    snr = link.snr_batch(dist, elevation)
+    rates = rain.aau_model.states*60
+    # Every sample is the SNR of one of the states of the model
+    state_snr = link.snr_batch(dist[:, None], elevation[:, None], rates)
+    assert np.all(np.min(np.abs(state_snr - snr[:, None]), axis=1) < 1e-9)
+
+
+def _station():
+    return station_t(57.014, 9.986, 0.02, 32, 39.12, 5.6, 0.65)
+
+
+def test_eff_gt_follows_station():
+    station = _station()
+    gt = station.eff_gt(100)
+    station.gain += 1
+    assert station.eff_gt(100) != gt
+    station.gain -= 1
+    assert station.eff_gt(100) == pytest.approx(gt, abs=1e-12)
+    station.gt += 1
+    assert station.t_sys == pytest.approx(station._est_system_temp())
+
+
+def test_t_sys_setter():
+    station = _station()
+    station.t_sys = 50.0
+    assert station.t_sys == 50.0
+    assert station.eff_gt(100) == pytest.approx(
+        10*np.log10(10**(station.gain/10)/150))
+    # A change of the inputs estimates it again
+    station.tb += 10
+    assert station.t_sys == pytest.approx(station._est_system_temp())
+
+
+def test_snr_matches_linear_power(links):
+    # The received power over the noise power, in linear units
+    dist, elevation, rain_rate = _samples()
+    for link in links:
+        station = link.station
+        att = link.rain_model.attenuation_saunders(elevation, rain_rate)
+        att_lin = 10**(-att/10)
+        t_ant = link.tb*att_lin + 290*(1 - att_lin)
+        gt = 10**(station.gain/10)/(t_ant + station.t_sys)
+        fspl = ((4*np.pi*dist*station.freq*1e9)/C)**2
+        power = 10**((link.constant - link.link_margin)/10)*gt/fspl*att_lin
+        np.testing.assert_allclose(link.snr_batch(dist, elevation, rain_rate),
+                                   10*np.log10(power/(k_boltz*link.bw)),
+                                   rtol=0, atol=1e-9)
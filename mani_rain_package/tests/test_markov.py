@@ -0,0 +1,142 @@
+"""
+Statistical checks of the markov samplers and of fitted models
+
+Sampled frequencies are compared to the exact distributions within 5
+standard errors, with fixed seeds so the checks are repeatable.
+"""
+import numpy as np
+import pytest
+from mani_rain import rain
+from mani_rain.rain import markov_base
+
+_model = np.array([[0.90, 0.08, 0.02],
+                   [0.20, 0.70, 0.10],
+                   [0.30, 0.30, 0.40]])
+_states = np.array([0.0, 0.01, 0.1])
+
+
+def _tolerance(p, n):
+    """5 standard errors of frequencies `p` estimated from `n` samples"""
+    return 5*np.sqrt(p*(1 - p)/n) + 1e-12
+
+
+def _frequencies(states, n_states):
+    return np.bincount(states.ravel(), minlength=n_states) / states.size
+
+
+def _state_of(rain_rate):
+    return np.searchsorted(_states*60, rain_rate)
+
+
+def _transition_frequencies(states):
+    counts = np.zeros((3, 3))
+    np.add.at(counts, (states[:, :-1].ravel(), states[:, 1:].ravel()), 1)
+    visits = counts.sum(axis=1, keepdims=True)
+    return counts/visits, visits
+
+
+def test_trajectory_step_distribution():
+    model = markov_base(_model, _states)
+    n_chains, n_steps = 4000, 30
+    states = _state_of(model.draw_trajectory(n_steps, n_chains, seed=1,
+                                             initial_state=2))
+    assert states.shape == (n_chains, n_steps)
+    for step in (0, 1, 4, n_steps - 1):
+        # Column `step` holds the states after step + 1 transitions
+        exact = np.linalg.matrix_power(_model, step + 1)[2]
+        freq = _frequencies(states[:, step], 3)
+        assert np.all(np.abs(freq - exact) < _tolerance(exact, n_chains))
+
+
+def test_trajectory_transitions():
+    model = markov_base(_model, _states)
+    states = _state_of(model.draw_trajectory(400, 500, seed=2,
+                                             initial_state=0))
+    freq, visits = _transition_frequencies(states)
+    assert np.all(np.abs(freq - _model) < _tolerance(_model, visits))
+
+
+def test_trajectory_seed_and_state():
+    model = markov_base(_model, _states)
+    model.state = 1
+    first = model.draw_trajectory(50, 20, seed=3)
+    assert np.array_equal(first, model.draw_trajectory(50, 20, seed=3,
+                                                       initial_state=1))
+    assert model.state == 1
+
+
+def test_draw_rain_transitions():
+    model = markov_base(_model, _states)
+    model.rng = np.random.default_rng(4)
+    states = _state_of(model.draw_rain(200000))[None, :]
+    freq, visits = _transition_frequencies(states)
+    assert np.all(np.abs(freq - _model) < _tolerance(_model, visits))
+    # The chain continues from the last sample
+    assert model.state == states[0, -1]
+
+
+def _notebook_fit(val, w=6):
+    """The state counting loop of `create_markov.ipynb`"""
+    rm_data = np.round(np.convolve(val, np.ones(w)/w, mode="valid"), 2)
+    states_values = np.unique(rm_data)
+
+    def get_state(state_values, curr_value):
+        return np.where(np.isclose(state_values, curr_value))[0][0]
+
+    P = np.zeros((len(states_values), len(states_values)), dtype=np.float32)
+    prev_state = get_state(states_values, rm_data[0])
+    for i in range(1, len(rm_data)):
+        gcs = get_state(states_values, rm_data[i])
+        P[prev_state, gcs] += 1
+        prev_state = gcs
+    for i in range(len(states_values)):
+        state_sum = np.sum(P[i, :])
+        if state_sum > 0:
+            P[i, :] = P[i, :] / state_sum
+    return P, states_values
+
+
+def _gauge_series(n=20000):
+    """Minute rain in mm drawn from the bundled `aau_model`, with dry
+    minutes left out of the timestamps as DMI does"""
+    rain_mm = rain.aau_model.draw_states(n, 1, seed=6, initial_state=0)
+    values = rain.aau_model.states[rain_mm.ravel()]
+    time = 60.0*np.arange(n)
+    wet = values > 0
+    return values, time[wet], values[wet]
+
+
+def test_fit_matches_notebook():
+    values, time, wet = _gauge_series()
+    # Timestamps are filled from the first to the last one given
+    first, last = int(time[0]) // 60, int(time[-1]) // 60
+    for model, series in ((markov_base.fit(values), values),
+                          (markov_base.fit(wet, time=time),
+                           values[first:last + 1])):
+        P, states = _notebook_fit(series)
+        assert np.allclose(model.states, states, rtol=0, atol=1e-12)
+        assert np.allclose(model.transition, P, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("window", [1, 2, 6])
+def test_fit_chunks(window):
+    values, time, wet = _gauge_series(5000)
+    whole = markov_base.fit(values, window)
+    cuts = [0, 1, 3, 4, 9, 500, 2048, 2049, len(values)]
+    for chunks in ([values[a:b] for a, b in zip(cuts[:-1], cuts[1:])],
+                   [values[:3], values[3:]]):
+        model = markov_base.fit(chunks, window)
+        assert np.array_equal(model.states, whole.states)
+        assert np.array_equal(model.transition, whole.transition)
+    timed = markov_base.fit(wet, window, time=time)
+    for cut in (0, 1, 2, len(time) // 2):
+        model = markov_base.fit([(time[:cut], wet[:cut]),
+                                 (time[cut:], wet[cut:])], window)
+        assert np.array_equal(model.states, timed.states)
+        assert np.array_equal(model.transition, timed.transition)
+
+
+def test_fit_is_classmethod():
+    class sub(markov_base):
+        pass
+    assert isinstance(sub.fit(_gauge_series(200)[0]), sub)
@@ -0,0 +1,74 @@
+"""
+Worker count invariance of the Monte Carlo data volume
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, rain
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.montecarlo import data_volume_mc
+from mani_rain.rain import markov_rain
+from mani_rain.stats import link_stats
+
+
+@pytest.fixture(scope="module")
+def link():
+    return link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                              10e6)
+
+
+def _pass(n=600):
+    # Ends at the same geometry, so consecutive realisations often
+    # share the ModCod at their seam
+    arc = np.sin(np.arange(n)/(n - 1)*np.pi)
+    return 3.8e8 - 2e6*arc, 20 + 50*arc
+
+
+def _run(link, workers, **kwargs):
+    return data_volume_mc(link, *_pass(), 13, seed=42, steps_per_draw=10,
+                          initial_state=0, workers=workers, **kwargs)
+
+
+def test_worker_count_invariance(link):
+    single_stats = link_stats.for_link(link)
+    single = _run(link, 1, stats=single_stats)
+    assert np.ptp(single.data_volume) > 0
+    stats = link_stats.for_link(link)
+    result = _run(link, 3, stats=stats)
+    assert np.array_equal(result.data_volume, single.data_volume)
+    assert np.array_equal(result.outage_time, single.outage_time)
+    assert np.array_equal(result.modcod_time, single.modcod_time)
+    assert np.array_equal(stats.modcod.time, single_stats.modcod.time)
+    assert np.array_equal(stats.modcod.entries, single_stats.modcod.entries)
+    assert stats.data_volume == pytest.approx(single_stats.data_volume,
+                                              rel=1e-12)
+
+
+def test_stats_match_result(link):
+    stats = link_stats.for_link(link)
+    result = _run(link, 1, stats=stats)
+    # Every realisation enters its first ModCod, so there are at least
+    # as many entries as realisations
+    assert stats.modcod.entries.sum() >= len(result.data_volume)
+    assert np.array_equal(stats.modcod.time, result.modcod_time)
+    assert stats.data_volume == pytest.approx(np.sum(result.data_volume),
+                                              rel=1e-12)
+
+
+def test_realisations_match_direct_evaluation(link):
+    result = _run(link, 1)
+    dist, elevation = _pass()
+    seeds = np.random.SeedSequence(42).spawn(13)
+    for volume, seed in zip(result.data_volume, seeds):
+        rain_rate = link.rain_model.rain_model.draw_trajectory(
+            60, 1, seed=seed, initial_state=0)[0]
+        snr = link.snr_batch(dist, elevation, np.repeat(rain_rate, 10))
+        assert volume == pytest.approx(np.sum(link.dvb_s2_cap(snr)),
+                                       rel=1e-12)
+    assert np.sum(result.modcod_time) == 13*len(dist)
+
+
+def test_model_state_untouched(link):
+    markov = link.rain_model.rain_model
+    state = markov.state
+    _run(link, 1)
+    assert markov.state == state
@@ -0,0 +1,120 @@
+"""
+Equivalence of the network evaluation to independent single links
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, cebreros, malargue, rain
+from mani_rain.linkbudget import link_budget_itu, link_budget_markov
+from mani_rain.network import link_network
+from mani_rain.rain import markov_rain
+from mani_rain.rain.itu import rain_itu
+
+
+@pytest.fixture(scope="module")
+def network():
+    links = [link_budget_itu(cebreros, 10e6),
+             link_budget_itu(malargue, 5e6, link_margin=1),
+             link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                                10e6)]
+    return link_network(links, min_elevation=[5, 10, 5])
+
+
+def _schedule(n=3000):
+    time = np.arange(n)
+    phase = np.array([0, 2, 4])[:, None]
+    elevation = 60*np.sin(time/400 + phase)
+    dist = 3.8e8 + 2e6*np.cos(time/300 + phase)
+    rng = np.random.default_rng(0)
+    # Showers, so stations drop out while visible
+    rain_rate = np.where(rng.random((3, n//50)) < 0.3,
+                         rng.uniform(5, 30, (3, n//50)), 0)
+    return dist, elevation, np.repeat(rain_rate, 50, axis=1)
+
+
+def _reference_station(snr, rate):
+    station = np.full(snr.shape[1], -1)
+    for t in range(snr.shape[1]):
+        visible = np.flatnonzero(np.isfinite(snr[:, t]))
+        if len(visible):
+            key = [(rate[i, t], snr[i, t]) for i in visible]
+            station[t] = visible[max(range(len(visible)), key=key.__getitem__)]
+    return station
+
+
+def _reference_hysteresis(best, snr, rate, hysteresis):
+    station = np.empty_like(best)
+    current = best[0]
+    for t in range(len(best)):
+        if current < 0:
+            keep = best[t] < 0
+        else:
+            keep = (np.isfinite(snr[current, t])
+                    and snr[current, t] >= snr[best[t], t] - hysteresis
+                    and (rate[current, t] > 0 or rate[best[t], t] == 0))
+        if t and not keep or t == 0:
+            current = best[t]
+        station[t] = current
+    return station
+
+
+def test_snr_matches_single_links(network):
+    dist, elevation, rain_rate = _schedule()
+    snr = network.snr_batch(dist, elevation, rain_rate)
+    for i, link in enumerate(network.links):
+        visible = elevation[i] >= network.min_elevation[i]
+        single = link.snr_batch(dist[i, visible], elevation[i, visible],
+                                rain_rate[i, visible])
+        np.testing.assert_allclose(snr[i, visible], single, rtol=0, atol=1e-9)
+        assert np.all(snr[i, ~visible] == -np.inf)
+
+
+def test_rate_and_selection(network):
+    dist, elevation, rain_rate = _schedule()
+    result = network.evaluate(dist, elevation, rain_rate=rain_rate)
+    for i, link in enumerate(network.links):
+        visible = result.visible[i]
+        np.testing.assert_allclose(result.rate[i, visible],
+                                   link.dvb_s2_cap(result.snr[i, visible]))
+        assert np.all(result.rate[i, ~visible] == 0)
+    assert np.array_equal(result.station,
+                          _reference_station(result.snr, result.rate))
+    assert result.data_volume == pytest.approx(
+        np.sum(np.max(result.rate, axis=0)))
+
+
+@pytest.mark.parametrize("hysteresis", [0.5, 3, 20])
+def test_hysteresis_matches_reference(network, hysteresis):
+    dist, elevation, rain_rate = _schedule()
+    best = network.evaluate(dist, elevation, rain_rate=rain_rate)
+    held = network.evaluate(dist, elevation, rain_rate=rain_rate,
+                            hysteresis=hysteresis)
+    expected = _reference_hysteresis(best.station, best.snr, best.rate,
+                                     hysteresis)
+    assert np.array_equal(held.station, expected)
+    assert held.handovers <= best.handovers
+
+
+def test_hysteresis_releases_outage(network):
+    dist, elevation, rain_rate = _schedule()
+    held = network.evaluate(dist, elevation, rain_rate=rain_rate,
+                            hysteresis=20)
+    # The held station is dropped once it is in outage and another
+    # station has a link
+    assert np.all(held.selected_rate[np.max(held.rate, axis=0) > 0] > 0)
+
+
+def test_p838_coefficients_match_single_links():
+    # Horizontal polarisation makes the coefficients depend on the
+    # elevation, circular does not
+    links = [link_budget_itu(cebreros, 10e6, rain_model=rain_itu(
+                 cebreros, 0.01, a=None, b=None, tau=0)),
+             link_budget_itu(malargue, 5e6, rain_model=rain_itu(
+                 malargue, 0.01, a=None, b=None))]
+    network = link_network(links)
+    dist, elevation, rain_rate = (a[:2] for a in _schedule())
+    snr = network.snr_batch(dist, elevation, rain_rate)
+    for i, link in enumerate(links):
+        visible = elevation[i] >= 5
+        single = link.snr_batch(dist[i, visible], elevation[i, visible],
+                                rain_rate[i, visible])
+        np.testing.assert_allclose(snr[i, visible], single, rtol=0, atol=1e-9)
@@ -0,0 +1,98 @@
+"""
+Block size invariance of the streaming pipeline
+
+The results of `link_stream` must not depend on how the ephemeris is
+split into blocks. A markov chain cycling deterministically through its
+states makes the rain, and so every result, exactly comparable.
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.pipeline import link_stream, read_ephemeris, stream_data_volume
+from mani_rain.rain import markov_base, markov_rain
+from mani_rain.stats import link_stats
+
+_states = np.array([0.0, 0.05, 0.5, 0.2])
+
+
+def _cyclic_link():
+    model = np.roll(np.eye(len(_states)), 1, axis=1)
+    return link_budget_markov(aalborg, markov_rain(aalborg,
+                                                   markov_base(model, _states)),
+                              10e6)
+
+
+def _ephemeris(n=1000):
+    time = np.arange(n, dtype=float)
+    dist = np.full(n, 3.8e8) + 1e6*np.sin(time/50)
+    elevation = 5 + 80*np.abs(np.sin(time/300))
+    return time, dist, elevation
+
+
+def _stream(block_size, steps_per_draw):
+    link = _cyclic_link()
+    stats = link_stats.for_link(link)
+    blocks = read_ephemeris(_ephemeris(), block_size)
+    results = list(link_stream(link, blocks, 2, steps_per_draw,
+                               stats=stats))
+    columns = {name: np.concatenate([getattr(block, name)
+                                     for block in results])
+               for name in ("time", "rain_rate", "attenuation", "snr",
+                            "modcod", "rate")}
+    return columns, results[-1].data_volume, stats
+
+
+@pytest.mark.parametrize("steps_per_draw", [1, 3, 60])
+def test_block_size_invariance(steps_per_draw):
+    reference, volume, stats = _stream(1000, steps_per_draw)
+    # Rain is held for `steps_per_draw` samples from the start of the
+    # stream, cycling through the states
+    draws = np.arange(1, 1 + -(-1000 // steps_per_draw)) % len(_states)
+    expected = np.repeat(_states[draws]*60, steps_per_draw)[:1000]
+    assert np.array_equal(reference["rain_rate"], expected)
+
+    for block_size in (1, 7, 64, 999):
+        columns, other_volume, other_stats = _stream(block_size,
+                                                     steps_per_draw)
+        for name, values in reference.items():
+            assert np.array_equal(columns[name], values), name
+        assert other_volume == pytest.approx(volume, rel=1e-12)
+        assert np.array_equal(other_stats.modcod.entries,
+                              stats.modcod.entries)
+        assert np.array_equal(other_stats.modcod.time, stats.modcod.time)
+        assert np.array_equal(other_stats.snr_hist.counts,
+                              stats.snr_hist.counts)
+        assert other_stats.data_volume == pytest.approx(stats.data_volume,
+                                                        rel=1e-12)
+
+
+def test_stream_matches_snr_batch():
+    columns, volume, stats = _stream(64, 3)
+    link = _cyclic_link()
+    _, dist, elevation = _ephemeris()
+    snr = link.snr_batch(dist, elevation, columns["rain_rate"])
+    np.testing.assert_allclose(columns["snr"], snr, rtol=0, atol=1e-9)
+    assert volume == pytest.approx(2*np.sum(link.dvb_s2_cap(snr)),
+                                   rel=1e-12)
+    assert stats.data_volume == pytest.approx(volume, rel=1e-12)
+    assert stats.time == 2*len(snr)
+    assert np.array_equal(stats.modcod.time,
+                          2*np.bincount(columns["modcod"] + 1,
+                                        minlength=len(stats.modcod.time)))
+
+
+def test_ephemeris_sources(tmp_path):
+    ephemeris = np.stack(_ephemeris(), axis=1)
+    np.save(tmp_path / "eph.npy", ephemeris)
+    np.savetxt(tmp_path / "eph.csv", ephemeris, delimiter=",",
+               header="time,dist,elevation", comments="")
+    volumes = [stream_data_volume(_cyclic_link(), source, 2, 3,
+                                  block_size=97, **kwargs)
+               for source, kwargs in ((ephemeris, {}),
+                                      (str(tmp_path / "eph.npy"), {}),
+                                      (str(tmp_path / "eph.csv"),
+                                       {"skiprows": 1}))]
+    assert volumes[1] == volumes[0]
+    assert volumes[2] == pytest.approx(volumes[0], rel=1e-12)
+    assert volumes[0] == pytest.approx(_stream(1000, 3)[1], rel=1e-12)
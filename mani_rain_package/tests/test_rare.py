@@ -0,0 +1,76 @@
+"""
+Unbiasedness of the rare event estimator against the exact expectations
+and plain Monte Carlo
+"""
+import numpy as np
+import pytest
+from mani_rain import rain, station_t
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain import markov_rain
+from mani_rain.rare import rare_outage
+
+# Confidence level of 5 standard errors
+_confidence = 1 - 5.7e-7
+
+
+@pytest.fixture(scope="module")
+def link():
+    station = station_t(57.014, 9.986, 0.02, 32, 39.12, 5.6, 0.65)
+    return link_budget_markov(station, markov_rain(station, rain.aau_model),
+                              10e6, link_margin=6)
+
+
+def _pass(n=300):
+    arc = np.sin(np.arange(n)/(n - 1)*np.pi)
+    return 3.8e8 - 2e6*arc, 8 + 40*arc
+
+
+def _exact(link, dist, elevation):
+    """Expected outage time and data volume of a pass started in the
+    stationary distribution"""
+    stationary = rain.aau_model.stationary()
+    rate = link.dvb.rate_at_esno(link.state_snr(dist, elevation))
+    return np.sum((rate == 0) @ stationary), np.sum(rate @ stationary)
+
+
+def _contains(estimate, value):
+    return estimate[1] <= value <= estimate[2]
+
+
+@pytest.mark.parametrize("pilot_rounds", [0, 3])
+def test_matches_exact_expectations(link, pilot_rounds):
+    dist, elevation = _pass()
+    outage_time, volume = _exact(link, dist, elevation)
+    assert 0 < outage_time / len(dist) < 0.01
+    result = rare_outage(link, dist, elevation, 4000, seed=1,
+                         pilot_rounds=pilot_rounds, confidence=_confidence)
+    assert _contains(result.outage_probability(), outage_time / len(dist))
+    assert _contains(result._mean(result.data_volume), volume)
+
+
+def test_matches_plain_monte_carlo(link):
+    dist, elevation = _pass()
+    split = rare_outage(link, dist, elevation, 4000, seed=2,
+                        confidence=_confidence)
+    plain = rare_outage(link, dist, elevation, 40000, seed=3, pilot_rounds=0,
+                        confidence=_confidence)
+    for estimate in (split.probability_of_outage(),
+                     split.cdf(np.median(plain.data_volume))):
+        assert estimate[2] > estimate[1]
+    p_split, p_plain = (r.probability_of_outage() for r in (split, plain))
+    # Sum of the half widths, each at 5 standard errors, bounds the
+    # difference at 5 standard errors of the difference
+    assert abs(p_split[0] - p_plain[0]) <= (p_split[2] - p_split[1]
+                                            + p_plain[2] - p_plain[1])/2
+    # Splitting only adds copies, every realisation keeps one path
+    assert np.all(np.bincount(split.root, minlength=split.n) >= 1)
+
+
+def test_initial_state(link):
+    dist, elevation = _pass()
+    result = rare_outage(link, dist, elevation, 500, seed=4,
+                         initial_state=0)
+    per_root = np.bincount(result.root, result.weights, minlength=result.n)
+    # Without importance sampling of the start, the weights of every
+    # realisation sum to one in expectation
+    assert np.mean(per_root) == pytest.approx(1, abs=0.2)
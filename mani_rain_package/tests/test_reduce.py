@@ -0,0 +1,56 @@
+"""
+Error bounds of the markov state reduction
+"""
+import numpy as np
+import pytest
+from mani_rain import rain, station_t
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain import markov_rain
+
+
+@pytest.fixture(scope="module")
+def link():
+    station = station_t(57.014, 9.986, 0.02, 32, 39.12, 5.6, 0.65)
+    return link_budget_markov(station, markov_rain(station, rain.aau_model),
+                              10e6)
+
+
+@pytest.mark.parametrize("tol", [5, 20, 60])
+def test_attenuation_within_tolerance(link, tol):
+    model = rain.aau_model
+    reduced, report = model.reduce(link, elevation=30, tol=tol)
+    assert report["states"] == len(model.states)
+    assert report["reduced_states"] == len(reduced.states)
+    assert len(reduced.states) <= len(model.states)
+    assert report["max_attenuation_error"] <= tol
+    assert report["stationary_error"] < 1e-9
+    assert report["sojourn_error"] < 1e-6
+
+    attenuation = link.rain_model.attenuation_saunders(30, model.states*60)
+    reduced_att = link.rain_model.attenuation_saunders(30, reduced.states*60)
+    groups = np.argmin(np.abs(attenuation[:, None] - reduced_att), axis=1)
+    assert np.all(np.abs(attenuation - reduced_att[groups]) <= tol)
+
+
+def test_lump_keeps_stationary_and_sojourn():
+    model = rain.aau_model
+    groups = np.minimum(np.arange(len(model.states)) // 3, 5)
+    lumped = model.lump(groups)
+    stationary = model.stationary()
+    np.testing.assert_allclose(lumped.stationary(),
+                               np.bincount(groups, stationary), atol=1e-12)
+    np.testing.assert_allclose(lumped.model.sum(axis=1), 1)
+    np.testing.assert_allclose(
+        lumped.states, np.bincount(groups, stationary*model.states)
+        / np.bincount(groups, stationary))
+
+
+def test_modcod_reduction_keeps_rate(link):
+    reduced, report = rain.aau_model.reduce(link, 30, dist=3.8e8, by="modcod")
+    assert len(reduced.states) < len(rain.aau_model.states)
+    assert report["reduced_outage_probability"] == pytest.approx(
+        report["outage_probability"], abs=1e-12)
+    assert report["reduced_expected_rate"] == pytest.approx(
+        report["expected_rate"], rel=1e-9)
+    with pytest.raises(ValueError):
+        rain.aau_model.reduce(link, by="modcod")
@@ -0,0 +1,121 @@
+"""
+Statistical checks of the run length sampler against the lockstep
+sampler and the exact distributions, and equivalence of the event
+driven simulation to per step evaluation
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, rain
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain import markov_base, markov_rain
+
+_model = np.array([[0.90, 0.08, 0.02],
+                   [0.20, 0.70, 0.10],
+                   [0.30, 0.30, 0.40]])
+_states = np.array([0.0, 0.01, 0.1])
+
+
+def _tolerance(p, n):
+    """5 standard errors of frequencies `p` estimated from `n` samples"""
+    return 5*np.sqrt(p*(1 - p)/n) + 1e-12
+
+
+def _frequencies(states, n_states):
+    return np.bincount(states.ravel(), minlength=n_states) / states.size
+
+
+def _run_length(model):
+    """`model` drawing every chain with the run length sampler"""
+    model._LOCKSTEP_STEPS = -1
+    return model
+
+
+@pytest.mark.parametrize("sampler", ["lockstep", "run_length"])
+def test_step_distribution(sampler):
+    model = markov_base(_model, _states)
+    if sampler == "run_length":
+        model = _run_length(model)
+    n_chains, n_steps = 4000, 30
+    states = model.draw_states(n_steps, n_chains, seed=1, initial_state=2)
+    for step in (0, 1, 4, n_steps - 1):
+        # Column `step` holds the states after step + 1 transitions
+        exact = model.distribution(step + 1, 2)
+        freq = _frequencies(states[:, step], 3)
+        assert np.all(np.abs(freq - exact) < _tolerance(exact, n_chains))
+
+
+def test_samplers_agree_on_transitions():
+    n = 200000
+    lockstep = markov_base(_model, _states).draw_states(
+        n // 500, 500, seed=2, initial_state=0)
+    run_length = markov_base(_model, _states).draw_states(
+        n, 1, seed=3, initial_state=0)
+    for states in (lockstep, run_length):
+        counts = np.zeros((3, 3))
+        np.add.at(counts, (states[:, :-1].ravel(), states[:, 1:].ravel()), 1)
+        visits = counts.sum(axis=1, keepdims=True)
+        assert np.all(np.abs(counts/visits - _model)
+                      < _tolerance(_model, visits))
+
+
+def test_run_length_stationary():
+    model = rain.aau_model
+    n = 2_000_000
+    states = model.draw_states(n, 1, seed=4, initial_state=0)
+    stationary = model.stationary()
+    freq = _frequencies(states, len(model.states))
+    # Consecutive samples are correlated, the error grows with the
+    # longest mean sojourn
+    sojourn = np.max(model.mean_sojourn()[stationary > 1e-3])
+    assert np.all(np.abs(freq - stationary)
+                  < _tolerance(stationary, n/(2*sojourn)))
+
+
+def test_run_length_sojourn():
+    model = markov_base(_model, _states)
+    model.rng = np.random.default_rng(5)
+    states, lengths = model.draw_runs(300000)
+    assert np.all(states[1:] != states[:-1])
+    assert lengths.sum() == 300000
+    assert model.state == states[-1]
+    # The first and last runs are cut short
+    states, lengths = states[1:-1], lengths[1:-1]
+    for state, expected in enumerate(model.mean_sojourn()):
+        run = lengths[states == state]
+        error = 5*np.std(run)/np.sqrt(len(run))
+        assert abs(np.mean(run) - expected) < error
+
+
+def _link(seed):
+    markov = markov_base(_model, _states)
+    markov.rng = np.random.default_rng(seed)
+    return link_budget_markov(aalborg, markov_rain(aalborg, markov), 10e6)
+
+
+def test_simulate_runs_matches_steps():
+    n = 5000
+    time = np.arange(n)
+    dist = 3.8e8 + 1e6*np.round(np.sin(time/400), 1)
+    elevation = np.round(10 + 70*np.abs(np.sin(time/900)))
+    link = _link(6)
+    runs = link.simulate_runs(dist, elevation)
+    assert runs.duration.sum() == n
+    assert np.all(runs.start == np.cumsum(runs.duration) - runs.duration)
+
+    snr = link.snr_batch(dist, elevation, runs.expand(runs.rain_rate))
+    np.testing.assert_allclose(runs.expand(runs.snr), snr, rtol=0, atol=1e-9)
+    assert runs.data_volume(60) == pytest.approx(
+        60*np.sum(link.dvb_s2_cap(snr)), rel=1e-12)
+    assert runs.outage_time(60) == 60*np.sum(link.dvb_s2_cap(snr) == 0)
+
+
+def test_simulate_runs_ephemeris_start():
+    link = _link(7)
+    dist, elevation = np.array([3.7e8, 3.9e8, 4e8]), np.array([20., 45., 70.])
+    runs = link.simulate_runs(dist, elevation, 1000, [0, 300, 700])
+    segment = np.searchsorted([0, 300, 700], np.arange(1000), side="right") - 1
+    snr = link.snr_batch(dist[segment], elevation[segment],
+                         runs.expand(runs.rain_rate))
+    np.testing.assert_allclose(runs.expand(runs.snr), snr, rtol=0, atol=1e-9)
+    with pytest.raises(ValueError):
+        link.simulate_runs(dist, elevation, ephemeris_start=[0, 300, 700])
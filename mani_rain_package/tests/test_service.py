@@ -0,0 +1,58 @@
+"""
+Answers of the query service, also when an evaluation fails
+"""
+import asyncio
+import logging
+import numpy as np
+import pytest
+from mani_rain import cebreros
+from mani_rain.linkbudget import link_budget_itu
+from mani_rain.service import link_service, query
+
+
+def _failing_link():
+    link = link_budget_itu(cebreros, 10e6)
+
+    def snr_batch(*args):
+        raise RuntimeError("broken link")
+    link.snr_batch = snr_batch
+    return link
+
+
+def _serve(path, requests):
+    """Answers of the `query` client, run in a thread while the service
+    listens on the Unix socket `path`"""
+    service = link_service({"cebreros": link_budget_itu(cebreros, 10e6),
+                            "broken": _failing_link()})
+
+    def client():
+        answers = []
+        for link in requests:
+            try:
+                answers.append(query(path, link, [3.8e8], [30], timeout=10))
+            except ValueError as err:
+                answers.append(str(err))
+        return answers
+
+    async def run():
+        server = await service.start(path=path)
+        async with server:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, client)
+
+    return asyncio.run(run())
+
+
+def test_internal_error(tmp_path, caplog):
+    with caplog.at_level(logging.ERROR, logger="mani_rain.service"):
+        answers = _serve(str(tmp_path / "socket"),
+                         ["cebreros", "broken", "unknown", "cebreros"])
+    good = link_budget_itu(cebreros, 10e6)
+    snr = good.snr_batch(3.8e8, 30)
+    assert answers[0]["snr"] == pytest.approx([snr])
+    assert answers[0]["rate"] == pytest.approx([good.dvb_s2_cap(snr)])
+    assert answers[1] == "Internal error"
+    assert answers[2] == "Unknown link 'unknown'"
+    assert answers[3] == answers[0]
+    assert any("broken link" in record.exc_text for record in caplog.records
+               if record.exc_text)
@@ -0,0 +1,50 @@
+"""
+Equivalence of the SNR lookup tables to the link budget
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg, rain
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.rain import markov_rain
+
+
+@pytest.fixture
+def link():
+    return link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                              10e6)
+
+
+def _queries(n=2000):
+    rng = np.random.default_rng(0)
+    dist = rng.uniform(3.5e8, 4.2e8, n)
+    elevation = rng.uniform(5, 90, n)
+    state = rng.integers(0, len(rain.aau_model.states), n)
+    return dist, elevation, state
+
+
+@pytest.mark.parametrize("elevations", [np.arange(5, 90, 0.1),
+                                        np.geomspace(5, 89, 57)])
+def test_lookup_snr_matches_snr(link, elevations):
+    table = link.lookup_table(np.geomspace(3.5e8, 4.2e8, 5), elevations)
+    dist, elevation, state = _queries()
+    idx = np.searchsorted(elevations, elevation, side="right") - 1
+    assert np.array_equal(table.el_index(elevation), idx)
+
+    rain_rate = rain.aau_model.states[state]*60
+    attenuation = link.rain_model.attenuation_saunders(elevations[idx],
+                                                       rain_rate)
+    expected = link._snr(dist, attenuation)
+    np.testing.assert_allclose(table.lookup_snr(dist, elevation, state),
+                               expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(table.lookup_rate(dist, elevation, state),
+                               link.dvb_s2_cap(expected), rtol=1e-12)
+
+
+def test_table_rebuilt_on_change(link):
+    grid, elevations = np.geomspace(3.5e8, 4.2e8, 5), np.arange(5, 90, 1.0)
+    table = link.lookup_table(grid, elevations)
+    assert link.lookup_table(grid, elevations) is table
+    link.link_margin += 1
+    rebuilt = link.lookup_table(grid, elevations)
+    assert rebuilt is not table
+    np.testing.assert_allclose(rebuilt.snr, table.snr - 1, atol=1e-9)
@@ -0,0 +1,77 @@
+"""
+Equivalence of the sparse, memory mapped transition tables to the
+dense models they are converted from
+"""
+import numpy as np
+import pytest
+from mani_rain import rain
+from mani_rain.rain import markov_base
+
+
+@pytest.fixture(scope="module")
+def sparse_model(tmp_path_factory):
+    """`aau_model` written with `save_sparse` and loaded memory mapped"""
+    prefix = str(tmp_path_factory.mktemp("sparse") / "aau")
+    rain.aau_model.save_sparse(prefix)
+    states_path = prefix + "_states.npy"
+    np.save(states_path, rain.aau_model.states)
+    return markov_base.from_sparse(prefix, states_path)
+
+
+def _normalised(model):
+    model = np.asarray(model, dtype=float)
+    total = model.sum(axis=1, keepdims=True)
+    return np.divide(model, total, out=np.eye(len(model)), where=total > 0)
+
+
+def test_sparse_tables(sparse_model):
+    np.testing.assert_allclose(sparse_model.model,
+                               _normalised(rain.aau_model.model),
+                               rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("n_steps, n_chains", [(1000, 1), (50, 200),
+                                               (2000, 3)])
+def test_sparse_draws_match_dense(sparse_model, n_steps, n_chains):
+    dense = rain.aau_model
+    for seed in range(3):
+        assert np.array_equal(
+            sparse_model.draw_trajectory(n_steps, n_chains, seed, 0),
+            dense.draw_trajectory(n_steps, n_chains, seed, 0))
+
+
+def test_sparse_draw_rain_matches_dense(sparse_model):
+    dense = markov_base.from_file(
+        f"{rain.__path__[0]}/models/aau_model.npy",
+        f"{rain.__path__[0]}/models/aau_states.npy")
+    for model in (sparse_model, dense):
+        model.state = 0
+        model.rng = np.random.default_rng(8)
+    assert [sparse_model.draw_rain() for _ in range(500)] == \
+           [dense.draw_rain() for _ in range(500)]
+    assert np.array_equal(sparse_model.draw_rain(5000), dense.draw_rain(5000))
+
+
+def test_sparse_transitions(tmp_path):
+    model = np.array([[0.0, 0.5, 0.5, 0.0],
+                      [0.1, 0.0, 0.0, 0.9],
+                      [0.0, 0.0, 0.0, 0.0],
+                      [0.0, 0.3, 0.0, 0.7]])
+    states = np.arange(4)/100
+    markov_base(model, states).save_sparse(str(tmp_path / "m"))
+    np.save(tmp_path / "states.npy", states)
+    sparse = markov_base.from_sparse(str(tmp_path / "m"),
+                                     str(tmp_path / "states.npy"))
+    draws = np.searchsorted(states*60, sparse.draw_trajectory(
+        500, 400, seed=9, initial_state=0))
+    counts = np.zeros((4, 4))
+    np.add.at(counts, (draws[:, :-1].ravel(), draws[:, 1:].ravel()), 1)
+    visits = counts.sum(axis=1, keepdims=True)
+    expected = _normalised(model)
+    freq = np.divide(counts, visits, out=np.zeros_like(counts),
+                     where=visits > 0)
+    # Only the non-zero entries are ever drawn, the empty row absorbs
+    assert np.all(counts[expected == 0] == 0)
+    tolerance = 5*np.sqrt(expected*(1 - expected)/np.maximum(visits, 1))
+    assert np.all(np.abs(freq - expected)[visits[:, 0] > 0] <=
+                  tolerance[visits[:, 0] > 0] + 1e-12)
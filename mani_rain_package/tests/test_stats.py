@@ -0,0 +1,115 @@
+"""
+Streaming statistics against the same statistics of all samples at once
+"""
+import numpy as np
+import pytest
+from mani_rain.stats import (histogram, link_stats, modcod_counter,
+                             quantile_digest, running_moments)
+
+
+def _samples(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([rng.normal(5, 3, n//2), rng.exponential(4, n//2)])
+    return values, rng.uniform(0.5, 2, n)
+
+
+def _blocks(n, sizes=(1, 17, 500, 3001)):
+    edges = np.cumsum(np.resize(sizes, n))
+    edges = np.concatenate([[0], edges[edges < n], [n]])
+    return [slice(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def test_running_moments():
+    values, weights = _samples()
+    parts = [running_moments().update(values[s], weights[s])
+             for s in _blocks(len(values))]
+    merged = running_moments()
+    for part in parts:
+        merged.merge(part)
+    mean = np.average(values, weights=weights)
+    assert merged.weight == pytest.approx(np.sum(weights))
+    assert merged.mean == pytest.approx(mean, rel=1e-12)
+    assert merged.var == pytest.approx(
+        np.average((values - mean)**2, weights=weights), rel=1e-10)
+    assert (merged.min, merged.max) == (values.min(), values.max())
+
+
+def test_histogram():
+    values, weights = _samples()
+    edges = np.linspace(-5, 20, 26)
+    hist = histogram(edges)
+    for s in _blocks(len(values)):
+        hist.update(values[s], weights[s])
+    inner = np.histogram(values, edges, weights=weights)[0]
+    np.testing.assert_allclose(hist.counts[1:-1][:-1], inner[:-1])
+    assert hist.counts[0] == pytest.approx(np.sum(weights[values < -5]))
+    assert hist.counts[-1] == pytest.approx(np.sum(weights[values >= 20]))
+    np.testing.assert_allclose(
+        hist.exceedance(),
+        [np.sum(weights[values >= edge]) / np.sum(weights) for edge in edges])
+    with pytest.raises(ValueError):
+        hist.merge(histogram(edges[1:]))
+
+
+def test_quantile_digest_merge():
+    values, weights = _samples(200000)
+    parts = []
+    for s in _blocks(len(values), (997, 5000)):
+        parts.append(quantile_digest().update(values[s], weights[s]))
+    merged = quantile_digest()
+    for part in parts:
+        merged.merge(part)
+    assert merged.weight == pytest.approx(np.sum(weights))
+
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order]) / np.sum(weights)
+    q = np.array([1e-3, 0.01, 0.1, 0.5, 0.9, 0.99, 0.999])
+    # Rank of each estimate, within a percent of the quantile
+    rank = np.interp(merged.quantile(q), values[order], cumulative)
+    assert np.all(np.abs(rank - q) <= 0.01*np.minimum(q, 1 - q) + 1e-4)
+    np.testing.assert_allclose(merged.cdf(merged.quantile(q)), q, atol=1e-3)
+
+
+def test_modcod_counter():
+    rng = np.random.default_rng(1)
+    # Runs of random ModCods, -1 being outage
+    modcod = np.repeat(rng.integers(-1, 5, 400), rng.integers(1, 30, 400))
+    counter = modcod_counter(5)
+    for s in _blocks(len(modcod)):
+        counter.update(modcod[s], dt=2)
+    np.testing.assert_array_equal(
+        counter.time, 2*np.bincount(modcod + 1, minlength=6))
+    start = np.concatenate([[True], modcod[1:] != modcod[:-1]])
+    np.testing.assert_array_equal(
+        counter.entries, np.bincount(modcod[start] + 1, minlength=6))
+    np.testing.assert_allclose(counter.mean_sojourn()[counter.entries > 0],
+                               (counter.time/counter.entries)[
+                                   counter.entries > 0])
+
+
+def test_link_stats_merge():
+    snr, _ = _samples()
+    rate = np.where(snr > 0, 1e6*np.floor(snr), 0.0)
+    modcod = np.where(snr > 0, np.minimum(snr, 5).astype(int), -1)
+    whole = link_stats(np.arange(0, 3e7, 1e6), n_modcods=6)
+    whole.update(snr, rate, modcod, dt=0.5)
+    half = len(snr) // 2
+    merged = whole.empty().update(snr[:half], rate[:half], modcod[:half], 0.5)
+    merged.merge(whole.empty().update(snr[half:], rate[half:], modcod[half:],
+                                      0.5))
+    assert merged.time == whole.time == pytest.approx(0.5*len(snr))
+    assert merged.data_volume == pytest.approx(0.5*np.sum(rate))
+    assert merged.snr.mean == pytest.approx(whole.snr.mean, rel=1e-12)
+    np.testing.assert_allclose(merged.snr_hist.counts, whole.snr_hist.counts)
+    np.testing.assert_allclose(merged.modcod.time, whole.modcod.time)
+    np.testing.assert_allclose(merged.availability([0, 5]),
+                               [np.mean(snr >= 0), np.mean(snr >= 5)])
+
+
+def test_modcod_counter_new_series():
+    counter = modcod_counter(5)
+    counter.update([2, 2, 3])
+    counter.update([3, 3, 1])
+    counter.update([1, 4], continued=False)
+    # The third series enters ModCod 1 again, the second continues in 3
+    np.testing.assert_array_equal(counter.entries, [0, 0, 2, 1, 1, 1])
@@ -0,0 +1,135 @@
+"""
+Round trip of the columnar result store, alone and fed by the pipeline
+"""
+import numpy as np
+import pytest
+from mani_rain import aalborg
+from mani_rain.linkbudget import link_budget_markov
+from mani_rain.pipeline import link_stream, read_ephemeris
+from mani_rain.rain import markov_base, markov_rain
+from mani_rain.store import (MISSING, default_columns, link_columns, missing,
+                             result_store, state_dtype)
+
+_states = np.array([0.0, 0.05, 0.5, 0.2])
+
+
+def _rows(n, start=0):
+    rng = np.random.default_rng(start)
+    return {"time": start + np.arange(n, dtype=float), "station": 1,
+            "dist": rng.uniform(3.7e8, 4.1e8, n),
+            "elevation": rng.uniform(5, 90, n),
+            "rain_rate": rng.uniform(0, 30, n),
+            "attenuation": rng.uniform(0, 10, n),
+            "snr": rng.uniform(-5, 20, n),
+            "modcod": rng.integers(-1, 28, n),
+            "state": rng.integers(0, 4, n),
+            "rate": rng.uniform(0, 2e7, n)}
+
+
+def _stored(values, dtype):
+    values = np.broadcast_to(values, np.shape(values) or (1,))
+    if dtype.kind == "u":
+        values = np.where(values == -1, missing(dtype), values)
+    return np.asarray(values, dtype=dtype)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "store")
+    chunks = [_rows(100), _rows(37, 100)]
+    with result_store(path, "w", attrs={"dt": 1}) as store:
+        for rows in chunks:
+            store.append(**rows)
+
+    store = result_store(path)
+    assert len(store) == 137
+    assert store.chunks == [100, 37]
+    assert store.attrs == {"dt": 1}
+    assert store.columns == {name: np.dtype(dtype)
+                             for name, dtype in default_columns.items()}
+    for name, dtype in store.columns.items():
+        column = store[name]
+        assert column.dtype == dtype
+        for rows, rows_slice in zip(chunks, store.chunk_slices()):
+            expected = np.broadcast_to(_stored(rows[name], dtype),
+                                       (rows_slice.stop - rows_slice.start,))
+            assert np.array_equal(column[rows_slice], expected), name
+    assert np.all(store["modcod"][:100][chunks[0]["modcod"] == -1] == MISSING)
+    with pytest.raises(ValueError):
+        store["snr"][0] = 0
+    with pytest.raises(ValueError):
+        store.append(**_rows(1))
+
+
+def test_append_mode(tmp_path):
+    path = str(tmp_path / "store")
+    with result_store(path, "a") as store:
+        store.append(**_rows(10))
+    with result_store(path, "a") as store:
+        store.append(**_rows(5, 10))
+    store = result_store(path)
+    assert store.chunks == [10, 5]
+    assert np.array_equal(store["time"], np.arange(15))
+
+
+def test_checks_columns(tmp_path):
+    store = result_store(str(tmp_path / "store"), "w")
+    rows = _rows(3)
+    with pytest.raises(ValueError):
+        store.append(**{name: rows[name] for name in list(rows)[1:]})
+    with pytest.raises(ValueError):
+        store.append(**rows, extra=0)
+    with pytest.raises(ValueError):
+        store.append(**dict(rows, modcod=300))
+    assert len(store) == 0
+
+
+def _cyclic_link():
+    model = np.roll(np.eye(len(_states)), 1, axis=1)
+    return link_budget_markov(aalborg, markov_rain(aalborg,
+                                                   markov_base(model, _states)),
+                              10e6)
+
+
+def _stream(path, block_size, n=1000):
+    time = np.arange(n, dtype=float)
+    dist = 3.8e8 + 1e6*np.sin(time/50)
+    elevation = 5 + 80*np.abs(np.sin(time/300))
+    blocks = read_ephemeris((time, dist, elevation), block_size)
+    link = _cyclic_link()
+    with result_store(path, "w", link_columns(link)) as store:
+        rain_rate = np.concatenate([block.rain_rate for block in
+                                    link_stream(link, blocks, 2, 3,
+                                                store=store)])
+    return rain_rate
+
+
+def test_pipeline_block_size_invariance(tmp_path):
+    rain_rate = _stream(str(tmp_path / "whole"), 1000)
+    _stream(str(tmp_path / "blocks"), 7)
+    whole = result_store(str(tmp_path / "whole"))
+    blocks = result_store(str(tmp_path / "blocks"))
+    assert len(whole) == len(blocks) == 1000
+    assert blocks.chunks == [7]*142 + [6]
+    for name in whole.columns:
+        assert np.array_equal(whole[name], blocks[name]), name
+    # The state is recovered from the rain rate
+    assert np.array_equal(_states[whole["state"]]*60, rain_rate)
+
+
+def test_state_dtype():
+    assert state_dtype(4) == np.dtype("u1")
+    assert state_dtype(255) == np.dtype("u1")
+    assert state_dtype(256) == np.dtype("u2")
+    assert state_dtype(70000) == np.dtype("u4")
+    assert link_columns(_cyclic_link())["state"] == np.dtype("u1").str
+
+
+def test_missing_only_for_minus_one(tmp_path):
+    columns = dict(default_columns, state="u2")
+    store = result_store(str(tmp_path / "store"), "w", columns)
+    store.append(**dict(_rows(3), state=[-1, 255, 300]))
+    assert store["state"].tolist() == [missing("u2"), 255, 300]
+    for state in (-2, missing("u2")):
+        with pytest.raises(ValueError):
+            store.append(**dict(_rows(1), state=state))
+    assert len(store) == 3
@@ -0,0 +1,105 @@
+"""
+Accuracy of the ITU-R P.618 interpolation surrogate
+"""
+import numpy as np
+import pytest
+from mani_rain import cebreros, station_t
+from mani_rain.rain import itu_cache
+from mani_rain.rain.itu import itu_surrogate, rain_itu
+
+
+def _exact(elevation, p):
+    return np.ravel(itu_cache.rain_attenuation(
+        cebreros.lat, cebreros.lon, cebreros.freq, elevation,
+        cebreros.height, p))
+
+
+@pytest.fixture(scope="module")
+def surrogate():
+    return itu_surrogate(cebreros, el_range=(5, 89.5))
+
+
+def test_grid_nodes_exact(surrogate):
+    for p in surrogate.ps[::9]:
+        np.testing.assert_allclose(surrogate(surrogate.elevations, p),
+                                   _exact(surrogate.elevations, p),
+                                   rtol=1e-9)
+
+
+def test_midpoints_within_max_error(surrogate):
+    assert 0 < surrogate.max_error < 0.2
+    el = ((surrogate._x[1:] + surrogate._x[:-1])/2)**2
+    for p in np.sqrt(surrogate.ps[1:]*surrogate.ps[:-1])[::7]:
+        error = np.abs(surrogate(el, p) - _exact(el, p))
+        assert np.all(error <= surrogate.max_error*(1 + 1e-9))
+
+
+def test_monotone_in_p(surrogate):
+    p = np.geomspace(1e-3, 5, 2000)
+    for el in (5, 30, 89.5):
+        assert np.all(np.diff(surrogate(el, p)) <= 0)
+
+
+def test_outside_grid_exact(surrogate):
+    el = np.array([1.0, 3.0, 30.0, 89.9])
+    for p in (1e-4, 0.01, 10.0):
+        outside = (el < 5) | (el > 89.5) | (p < 1e-3) | (p > 5)
+        np.testing.assert_allclose(surrogate(el, p)[outside],
+                                   _exact(el, p)[outside], rtol=1e-12)
+
+
+def test_range_of_el_distribution():
+    station = station_t(cebreros.lat, cebreros.lon, cebreros.height,
+                        cebreros.freq, cebreros.gt, cebreros.diameter)
+    station.gen_el_dist(np.linspace(0.2, 90, 1000), res=1)
+    # Low bins are covered from 0.5°, not clamped to 5°
+    assert itu_surrogate(station, shape=(9, 5)).el_range == pytest.approx(
+        (0.5, np.max(station.el_distribution[0])))
+    station.gen_el_dist(np.linspace(12, 40, 1000), res=1)
+    assert itu_surrogate(station, shape=(9, 5)).el_range == pytest.approx(
+        (12, 39))
+
+
+def test_random_points_within_max_error(surrogate):
+    rng = np.random.default_rng(0)
+    el = rng.uniform(5, 89.5, 500)
+    p = np.exp(rng.uniform(np.log(1e-3), np.log(5), 500))
+    exact = np.array([_exact(e, q)[0] for e, q in zip(el, p)])
+    error = np.abs(surrogate(el, p) - exact)
+    assert np.all(error <= surrogate.max_error)
+    assert np.all(error/exact <= surrogate.max_rel_error)
+
+
+def _itu_model():
+    station = station_t(cebreros.lat, cebreros.lon, cebreros.height,
+                        cebreros.freq, cebreros.gt, cebreros.diameter)
+    station.gen_el_dist(np.linspace(10, 80, 1000), res=1)
+    return rain_itu(station, 0.01)
+
+
+def test_attenuation_itu_shapes():
+    model = _itu_model()
+    el = np.array([10.0, 30.0, 60.0])
+    p = np.array([[0.01], [0.1]])
+    for exact in (True, False):
+        att = model.attenuation_itu(el, p, exact=exact)
+        assert att.shape == (2, 3)
+        assert model.attenuation_itu(el, exact=exact).shape == (3,)
+        assert isinstance(model.attenuation_itu(30.0, exact=exact), float)
+        np.testing.assert_allclose(att, model.attenuation_itu(el, p),
+                                   rtol=model.surrogate.max_rel_error)
+    np.testing.assert_allclose(model.attenuation_itu(el, p)[1],
+                               _exact(el, 0.1), rtol=1e-12)
+
+
+def test_surrogate_follows_station():
+    model = _itu_model()
+    surrogate = model.surrogate
+    assert model.surrogate is surrogate
+    model.station.gen_el_dist(np.linspace(20, 60, 1000), res=1)
+    assert model.surrogate.el_range == pytest.approx((20, 59))
+    surrogate = model.surrogate
+    model.station.freq = 8.4
+    assert model.surrogate is not surrogate
+    assert model.attenuation_itu(30.0, exact=False) == pytest.approx(
+        model.attenuation_itu(30.0), rel=model.surrogate.max_rel_error)
@@ -0,0 +1,84 @@
+"""
+Equivalence of the parameter sweep to the link budget at every grid point
+"""
+import itertools
+import numpy as np
+import pytest
+from mani_rain import mani_link, rain, rain_itu, station_t
+from mani_rain._dvbs2 import dvbs2
+from mani_rain.linkbudget import link_budget_itu, link_budget_markov
+from mani_rain.rain import markov_rain
+from mani_rain.sweep import link_sweep
+
+_dist = np.linspace(3.7e8, 4.1e8, 5)
+
+
+def _station(*args):
+    station = station_t(*args)
+    station.gen_el_dist(np.linspace(5, 90, 2000), res=1)
+    return station
+
+
+@pytest.fixture(scope="module")
+def cebreros():
+    return _station(40.45, -4.37, 0.767, 32, 55.8, 35, 0.65)
+
+
+@pytest.fixture(scope="module")
+def aalborg():
+    return _station(57.014, 9.986, 0.02, 32, 39.12, 5.6, 0.65)
+
+
+@pytest.mark.parametrize("elevation", [None, 30])
+def test_itu_sweep_matches_link(cebreros, elevation):
+    link = link_budget_itu(cebreros, 10e6)
+    bws, rolloffs, margins, ps = [5e6, 10e6], [0.1, 0.35], [1, 3], [0.01, 1]
+    constants = [list(mani_link), [c - 0.5 for c in mani_link]]
+    result = link_sweep(link, _dist, p=ps, bw=bws, rolloff=rolloffs,
+                        link_margin=margins, constants=constants,
+                        elevation=elevation)
+    assert result.dims == ("bw", "rolloff", "link_margin", "constants", "p",
+                           "dist")
+    assert result.shape == (2, 2, 2, 2, 2, len(_dist))
+
+    for (i, bw), (j, rolloff), (k, margin), (m, const), (n, p) in \
+            itertools.product(*map(enumerate, (bws, rolloffs, margins,
+                                               constants, ps))):
+        single = link_budget_itu(cebreros, bw, const, link_margin=margin,
+                                 rain_model=rain_itu(cebreros, p))
+        if elevation is None:
+            snr = single.snr_eqv(_dist)
+        else:
+            snr = single.snr_at_t(_dist, elevation)
+        index = (i, j, k, m, n)
+        np.testing.assert_allclose(result.snr[index], snr, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(result.shannon[index],
+                                   single.shannon_cap(snr))
+        np.testing.assert_allclose(result.rate[index],
+                                   dvbs2(bw, rolloff).rate_at_esno(snr))
+
+
+def test_markov_sweep_matches_link(aalborg):
+    link = link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                              10e6)
+    states = link.rain_model.rain_model.states*60
+    result = link_sweep(link, _dist, rain_rate=states)
+    assert result.dims[4] == "rain_rate"
+    for n, rate in enumerate(states):
+        np.testing.assert_allclose(result.snr[0, 0, 0, 0, n],
+                                   link.snr_eqv(_dist, rate),
+                                   rtol=0, atol=1e-9)
+
+
+def test_sel(cebreros):
+    link = link_budget_itu(cebreros, 10e6)
+    result = link_sweep(link, _dist, p=[0.01, 0.1, 1])
+    np.testing.assert_allclose(result.sel(p=0.1, dist=_dist[2]).ravel(),
+                               result.snr[0, 0, 0, 0, 1, 2])
+
+
+def test_markov_sweep_needs_rain(aalborg):
+    link = link_budget_markov(aalborg, markov_rain(aalborg, rain.aau_model),
+                              10e6)
+    with pytest.raises(ValueError):
+        link_sweep(link, _dist)